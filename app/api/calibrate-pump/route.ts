@@ -1,10 +1,14 @@
 import { type NextRequest, NextResponse } from "next/server"
-import { calibratePumpAction } from "@/lib/cocktail-machine-server"
+import { calibratePumpAction, recordCalibrationPointAction } from "@/lib/cocktail-machine-server"
 
 export async function POST(request: NextRequest) {
   try {
-    const { pumpId, durationMs } = await request.json()
-    const result = await calibratePumpAction(pumpId, durationMs)
+    const { pumpId, durationMs, measuredMl } = await request.json()
+    // Mit gemessener Menge: nur den Kalibrierpunkt speichern, die Pumpe lief bereits
+    const result =
+      measuredMl !== undefined
+        ? await recordCalibrationPointAction(pumpId, durationMs, measuredMl)
+        : await calibratePumpAction(pumpId, durationMs)
     return NextResponse.json(result)
   } catch (error) {
     console.error("Error calibrating pump:", error)
@@ -1,6 +1,7 @@
 import { type NextRequest, NextResponse } from "next/server"
 import fs from "fs/promises"
 import path from "path"
+import { flushPumpLevelsAction } from "@/lib/cocktail-machine-server"
 
 const LEVELS_FILE = path.join(process.cwd(), "data", "ingredient-levels.json")
 
@@ -19,6 +20,8 @@ const getDefaultLevels = () => {
 // GET - Load ingredient levels from file
 export async function GET() {
   try {
+    // Offene Abzüge des Pump-Servers zuerst schreiben
+    await flushPumpLevelsAction()
     const data = await fs.readFile(LEVELS_FILE, "utf-8")
     const levels = JSON.parse(data)
 
@@ -64,6 +67,7 @@ export async function POST(request: NextRequest) {
       )
     }
 
+    await flushPumpLevelsAction()
     await fs.mkdir(path.dirname(LEVELS_FILE), { recursive: true })
     await fs.writeFile(LEVELS_FILE, JSON.stringify(levels, null, 2))
 
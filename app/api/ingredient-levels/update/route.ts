@@ -1,6 +1,7 @@
 import { type NextRequest, NextResponse } from "next/server"
 import fs from "fs/promises"
 import path from "path"
+import { flushPumpLevelsAction } from "@/lib/cocktail-machine-server"
 
 interface IngredientLevel {
   pumpId: number
@@ -16,6 +17,8 @@ const LEVELS_FILE = path.join(process.cwd(), "data", "ingredient-levels.json")
 export async function POST(request: NextRequest) {
   try {
     const { ingredients } = await request.json()
+    // Offene Abzüge des Pump-Servers zuerst schreiben, sonst würden sie überschrieben
+    await flushPumpLevelsAction()
 
     let ingredientLevels: IngredientLevel[] = []
 
@@ -1,5 +1,6 @@
 import { NextResponse } from "next/server"
 import { exec } from "child_process"
+import net from "net"
 import { promisify } from "util"
 import fs from "fs"
 import path from "path"
@@ -7,6 +8,41 @@ import path from "path"
 const execAsync = promisify(exec)
 
 const LED_PYTHON_SCRIPT = path.join(process.cwd(), "scripts/led_controller.py")
+const LED_SOCKET_PATH = process.env.LED_SOCKET || "/tmp/cocktailbot-led.sock"
+const LED_SERVICE_TIMEOUT_MS = 5000
+
+// Anfrage an den LED-Dienst (led_controller.py serve); null, wenn keiner läuft
+function sendLedServiceRequest(request: Record<string, unknown>): Promise<any | null> {
+  return new Promise((resolve, reject) => {
+    const socket = net.createConnection(LED_SOCKET_PATH)
+    let buffer = ""
+
+    socket.setTimeout(LED_SERVICE_TIMEOUT_MS)
+    socket.on("connect", () => socket.write(JSON.stringify(request) + "\n"))
+    socket.on("data", (chunk: Buffer) => {
+      buffer += chunk.toString()
+      const newline = buffer.indexOf("\n")
+      if (newline === -1) return
+      socket.end()
+      try {
+        resolve(JSON.parse(buffer.slice(0, newline)))
+      } catch (error) {
+        reject(error)
+      }
+    })
+    socket.on("timeout", () => {
+      socket.destroy()
+      reject(new Error(`LED-Dienst antwortet nicht (${LED_SOCKET_PATH})`))
+    })
+    socket.on("error", (error: NodeJS.ErrnoException) => {
+      if (error.code === "ENOENT" || error.code === "ECONNREFUSED") {
+        resolve(null)
+      } else {
+        reject(error)
+      }
+    })
+  })
+}
 
 export async function GET(request: Request) {
   try {
@@ -55,10 +91,17 @@ export async function POST(request: Request) {
           }
 
           console.log(`Führe LED-Befehl aus: ${command}`)
+          // Der LED-Dienst hält den Pico-Port offen – ohne Suche und Prozessstart
+          const serviceResult = await sendLedServiceRequest({ command, data: ledData || {} })
+          if (serviceResult) {
+            return NextResponse.json(serviceResult)
+          }
+
           const ledCmd = `python3 ${LED_PYTHON_SCRIPT} ${command} '${JSON.stringify(ledData)}'`
           console.log(`Befehl: ${ledCmd}`)
           const ledResult = await execAsync(ledCmd)
-          cmdOutput = ledResult.stdout.trim()
+          // Das Skript gibt vor dem Ergebnis Statuszeilen aus – das JSON steht in der letzten Zeile
+          cmdOutput = ledResult.stdout.trim().split("\n").pop() || ""
           console.log(`LED-Ausgabe: ${cmdOutput}`)
           break
 
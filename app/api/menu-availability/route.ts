@@ -0,0 +1,15 @@
+import { type NextRequest, NextResponse } from "next/server"
+import { menuAvailabilityAction } from "@/lib/cocktail-machine-server"
+
+// GET ?size=300[&cocktail=id] - machbare Cocktails bzw. Verfügbarkeit eines Cocktails
+export async function GET(request: NextRequest) {
+  try {
+    const size = Number(request.nextUrl.searchParams.get("size") || 300)
+    const cocktailId = request.nextUrl.searchParams.get("cocktail") || undefined
+    const result = await menuAvailabilityAction(size, cocktailId)
+    return NextResponse.json(result)
+  } catch (error) {
+    console.error("Error checking menu availability:", error)
+    return NextResponse.json({ success: false, error: "Failed to check menu availability" }, { status: 500 })
+  }
+}
@@ -0,0 +1,40 @@
+import { type NextRequest, NextResponse } from "next/server"
+import { enqueueCocktailAction, orderQueueAction } from "@/lib/cocktail-machine-server"
+
+// GET - Warteschlange, laufende Bestellung und Kennzahlen (Getränke/Stunde, Warte- und Dosierzeit)
+export async function GET() {
+  try {
+    const result = await orderQueueAction("queue")
+    return NextResponse.json(result)
+  } catch (error) {
+    console.error("Error loading order queue:", error)
+    return NextResponse.json({ success: false, error: "Failed to load order queue" }, { status: 500 })
+  }
+}
+
+// POST - { action: "enqueue", cocktail, pumpConfig, size, ingredientLevels } | { action: "confirm" } | { action: "cancel", orderId? }
+export async function POST(request: NextRequest) {
+  try {
+    const { action, cocktail, pumpConfig, size, ingredientLevels, orderId } = await request.json()
+
+    if (action === "enqueue") {
+      const result = await enqueueCocktailAction(cocktail, pumpConfig, size, ingredientLevels)
+      return NextResponse.json(result)
+    }
+    if (action === "confirm" || action === "cancel") {
+      const result = await orderQueueAction(action, orderId)
+      return NextResponse.json(result)
+    }
+
+    return NextResponse.json({ success: false, error: `Unknown action: ${action}` }, { status: 400 })
+  } catch (error) {
+    console.error("Error handling order queue request:", error)
+    return NextResponse.json(
+      {
+        success: false,
+        error: error instanceof Error ? error.message : "Failed to handle order queue request",
+      },
+      { status: 500 },
+    )
+  }
+}
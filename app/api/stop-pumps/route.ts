@@ -0,0 +1,22 @@
+import { type NextRequest, NextResponse } from "next/server"
+import { stopPumpsAction } from "@/lib/cocktail-machine-server"
+
+export async function POST(request: NextRequest) {
+  try {
+    const { pin } = await request.json().catch(() => ({}))
+
+    console.log(`[v0] Stop pumps request: pin=${pin ?? "all"}`)
+
+    const result = await stopPumpsAction(pin === undefined || pin === null ? undefined : Number(pin))
+    return NextResponse.json(result)
+  } catch (error) {
+    console.error("Error stopping pumps:", error)
+    return NextResponse.json(
+      {
+        success: false,
+        error: error instanceof Error ? error.message : "Failed to stop pumps",
+      },
+      { status: 500 },
+    )
+  }
+}
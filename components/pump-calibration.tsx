@@ -7,7 +7,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from "@/components/ui/card"
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from "@/components/ui/dialog"
 import type { PumpConfig } from "@/types/pump"
-import { savePumpConfig, calibratePump, getPumpConfig } from "@/lib/cocktail-machine"
+import { savePumpConfig, calibratePump, getPumpConfig, recordCalibrationPoint } from "@/lib/cocktail-machine"
 import { getAllIngredients } from "@/lib/ingredients"
 import { Loader2, Beaker, Save, RefreshCw } from 'lucide-react'
 import { Alert, AlertDescription } from "@/components/ui/alert"
@@ -190,6 +190,13 @@ export default function PumpCalibration({ pumpConfig: initialConfig, onConfigUpd
     try {
       await savePumpConfig(updatedConfig)
 
+      // Messpunkt zusätzlich in der Kalibrierkurve ablegen (Totzeit/Nichtlinearität bei kurzen Dosierungen)
+      try {
+        await recordCalibrationPoint(currentPumpId, currentCalibrationTime * 1000, amount)
+      } catch (error) {
+        console.error("Fehler beim Speichern des Kalibrierpunkts:", error)
+      }
+
       const pump = updatedConfig.find((p) => p.id === currentPumpId)
       if (pump) {
         console.log(`Kalibrierung für Pumpe ${pump.id} (${pump.ingredient}) aktualisiert: ${flowRate} ml/s (${currentCalibrationTime}s)`)
@@ -12,6 +12,14 @@ Beispiele:
 Optional:
   python3 led_client.py --port /dev/ttyACM0 COLOR 0 120 0
   LED_PORT=/dev/ttyACM1 python3 led_client.py OFF
+  python3 led_client.py --force READY   # auch senden, wenn der Pico schon so steht
+
+Beherrscht die Firmware das Binärprotokoll (led_protocol.py), gehen die
+Befehle als Rahmen hinaus. Welche Opcodes sie kennt, wird einmal pro
+USB-Enumeration per HELLO erfragt und zwischengespeichert.
+
+Befehle, die den Zustand nicht ändern, und von schnellen Folgen derselben
+Art alle bis auf den neuesten werden nicht gesendet (siehe led_state.py).
 """
 
 import os
@@ -21,6 +29,12 @@ import argparse
 import serial
 from typing import Optional
 
+# Hilfsmodule des LED-Clients (pico_port.py, led_state.py, led_protocol.py) liegen in scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+import led_protocol
+from led_state import send_coalesced
+from pico_port import find_port, forget_cache
+
 PORT_CANDIDATES = [
     "/dev/ttyLED",   # udev-Symlink (falls vorhanden)
     "/dev/ttyACM0", "/dev/ttyACM1", "/dev/ttyACM2",
@@ -44,11 +58,16 @@ def open_port(explicit_port: Optional[str], baud: int) -> serial.Serial:
             return serial.Serial(env_port, baud, timeout=TIMEOUT)
         except Exception as e:
             last_err = e
-    # 3) Kandidatenliste
-    for p in PORT_CANDIDATES:
+    # 3) Cache, by-id per USB-ID, dann Kandidatenliste (siehe pico_port.py)
+    def probe(p: str) -> bool:
+        serial.Serial(p, baud, timeout=TIMEOUT).close()
+        return True
+    port = find_port(PORT_CANDIDATES, probe)
+    if port:
         try:
-            return serial.Serial(p, baud, timeout=TIMEOUT)
+            return serial.Serial(port, baud, timeout=TIMEOUT)
         except Exception as e:
+            forget_cache()
             last_err = e
     raise last_err or RuntimeError("Kein serieller Pico-Port gefunden")
 
@@ -56,6 +75,7 @@ def main():
     ap = argparse.ArgumentParser(add_help=True)
     ap.add_argument("--port", dest="port", default=None, help="serieller Port (optional)")
     ap.add_argument("--baud", dest="baud", type=int, default=DEFAULT_BAUD, help="Baudrate (Default 115200)")
+    ap.add_argument("--force", action="store_true", help="Zustands-Spiegel umgehen und immer senden")
     ap.add_argument("cmd", nargs=argparse.REMAINDER, help="Befehl(e) an den Pico (z.B. COLOR 0 255 0)")
     args = ap.parse_args()
 
@@ -66,12 +86,29 @@ def main():
     baud = int(args.baud) if args.baud else DEFAULT_BAUD
     cmd = " ".join(args.cmd).strip() + "\n"
 
-    try:
+    def send(line: str) -> None:
         with open_port(args.port, baud) as ser:
             # kurzer Moment, falls der Pico gerade (neu) enumeriert hat
             time.sleep(0.1)
-            ser.write(cmd.encode("ascii"))
+            caps = led_protocol.load_caps(ser.port)
+            if caps is None:
+                caps = led_protocol.handshake(ser)
+                led_protocol.save_caps(ser.port, caps)
+            encoded = led_protocol.encode_text(line)
+            if caps and encoded and encoded[0] in caps["opcodes"]:
+                ser.reset_input_buffer()
+                ser.write(led_protocol.encode_frame(encoded[0], 1, encoded[1]))
+                ser.flush()
+                if led_protocol.read_reply(ser, encoded[0], 1) is not None:
+                    return
+                # keine Antwort: Firmware getauscht oder neu gestartet – Fähigkeiten beim
+                # nächsten Aufruf neu erfragen, diesen Befehl als Textzeile nachschicken
+                led_protocol.forget_caps()
+            ser.write(line.encode("ascii"))
             ser.flush()
+
+    try:
+        send_coalesced(cmd, send, force=args.force)
     except Exception as e:
         print(f"[led_client] Fehler: {e}", file=sys.stderr)
         sys.exit(1)
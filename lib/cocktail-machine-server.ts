@@ -272,30 +272,214 @@ export async function deleteRecipe(cocktailId: string) {
   }
 }
 
-// Diese Funktion aktiviert eine Pumpe für eine bestimmte Zeit
-async function activatePump(pin: number, durationMs: number) {
+// Socket des residenten Pump-Servers (python3 pump_control.py serve)
+const PUMP_SOCKET_PATH = process.env.PUMP_SOCKET || "/tmp/cocktailbot-pump.sock"
+
+// Schickt eine Anfrage an den Pump-Server. Gibt null zurück, wenn kein Server läuft,
+// damit der Aufrufer auf einen eigenen python3-Prozess zurückfallen kann.
+async function sendPumpServerRequest(request: Record<string, unknown>, timeoutMs: number): Promise<any | null> {
+  const net = require("net")
+
+  return new Promise((resolve, reject) => {
+    const socket = net.createConnection(PUMP_SOCKET_PATH)
+    let buffer = ""
+
+    socket.setTimeout(timeoutMs)
+    socket.on("connect", () => socket.write(JSON.stringify(request) + "\n"))
+    socket.on("data", (chunk: Buffer) => {
+      buffer += chunk.toString()
+      const newline = buffer.indexOf("\n")
+      if (newline === -1) return
+      socket.end()
+      try {
+        resolve(JSON.parse(buffer.slice(0, newline)))
+      } catch (error) {
+        reject(error)
+      }
+    })
+    socket.on("timeout", () => {
+      socket.destroy()
+      reject(new Error(`Pump-Server antwortet nicht (${PUMP_SOCKET_PATH})`))
+    })
+    socket.on("error", (error: NodeJS.ErrnoException) => {
+      if (error.code === "ENOENT" || error.code === "ECONNREFUSED") {
+        resolve(null)
+      } else {
+        reject(error)
+      }
+    })
+  })
+}
+
+// Aktiviert einen Pin über den Pump-Server oder – falls keiner läuft – über pump_control.py
+async function runPumpControl(pin: number, durationMs: number, logPrefix: string) {
+  const { fsSync, path, execPromise } = await getNodeModules()
+  const roundedDuration = Math.round(durationMs)
+
+  const response = await sendPumpServerRequest(
+    { command: "activate", pin, duration_ms: roundedDuration },
+    roundedDuration + 5000,
+  )
+  if (response) {
+    console.log(`${logPrefix} Pump-Server Antwort: ${JSON.stringify(response)}`)
+    if (!response.success) {
+      throw new Error(response.error || `Pump-Server Fehler an Pin ${pin}`)
+    }
+    return { stdout: "", stderr: "" }
+  }
+
+  // Verwende das Python-Skript zur Steuerung der Pumpe
+  const PUMP_CONTROL_SCRIPT = path!.join(process.cwd(), "pump_control.py")
+
+  if (!fsSync!.existsSync(PUMP_CONTROL_SCRIPT)) {
+    console.error(`${logPrefix} ❌ Python-Skript nicht gefunden: ${PUMP_CONTROL_SCRIPT}`)
+    throw new Error(`Python-Skript nicht gefunden: ${PUMP_CONTROL_SCRIPT}`)
+  }
+
+  const command = `python3 ${PUMP_CONTROL_SCRIPT} activate ${pin} ${roundedDuration}`
+  console.log(`${logPrefix} Kein Pump-Server aktiv, führe Befehl aus: ${command}`)
+
+  return execPromise(command)
+}
+
+// Schreibt offene Füllstands-Abzüge des Pump-Servers sofort in data/ingredient-levels.json,
+// damit die Datei vor dem Lesen oder Überschreiben durch die App aktuell ist
+export async function flushPumpLevelsAction() {
   try {
-    const { fsSync, path, execPromise } = await getNodeModules()
+    await sendPumpServerRequest({ command: "levels", flush: true }, 2000)
+  } catch (error) {
+    console.error("[v0] Füllstände des Pump-Servers konnten nicht geschrieben werden:", error)
+  }
+}
 
-    console.log(`[PUMP DEBUG] ==========================================`)
-    console.log(`[PUMP DEBUG] Aktiviere Pumpe an GPIO Pin ${pin} für ${durationMs}ms`)
-    console.log(`[PUMP DEBUG] Aktueller Arbeitsordner: ${process.cwd()}`)
+// Bucht Füllstände über die API ab – nur noch nötig, wenn pump_control.py sie nicht selbst verbucht hat
+async function postLevelUpdates(levelUpdates: { pumpId: number; amount: number }[]) {
+  if (levelUpdates.length === 0) return
+
+  try {
+    const response = await fetch(
+      `${process.env.NEXT_PUBLIC_BASE_URL || "http://localhost:3000"}/api/ingredient-levels/update`,
+      {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ ingredients: levelUpdates }),
+      },
+    )
+
+    if (response.ok) {
+      const data = await response.json()
+      console.log("[v0] Füllstände erfolgreich aktualisiert:", data.levels?.length || 0, "Levels")
+    } else {
+      console.error("Fehler beim Aktualisieren der Füllstände:", response.statusText)
+    }
+  } catch (error) {
+    console.error("Error updating levels:", error)
+  }
+}
+
+type PumpPlanEntry = {
+  pumpId: number
+  pin: number
+  amount: number
+  flowRate: number
+  pulse?: { onMs: number; offMs: number }
+}
 
-    // Verwende das Python-Skript zur Steuerung der Pumpe
+// Gleiche Pins zusammenfassen – pump_control.py erwartet jeden Pin nur einmal
+function mergeByPin(entries: PumpPlanEntry[]) {
+  const byPin = new Map<number, PumpPlanEntry>()
+  for (const entry of entries) {
+    const existing = byPin.get(entry.pin)
+    byPin.set(entry.pin, existing ? { ...existing, amount: existing.amount + entry.amount } : entry)
+  }
+  return Array.from(byPin.values())
+}
+
+function toServerPlan(entries: PumpPlanEntry[]) {
+  return mergeByPin(entries).map((entry) => ({
+    pin: entry.pin,
+    pump_id: entry.pumpId,
+    ml: entry.amount,
+    flow_rate: entry.flowRate,
+    ...(entry.pulse ? { pulse: { on_ms: entry.pulse.onMs, off_ms: entry.pulse.offMs } } : {}),
+  }))
+}
+
+// JSON als einzelnes Shell-Argument (Zutatennamen dürfen Apostrophe enthalten)
+function shellQuote(value: string) {
+  return `'${value.replace(/'/g, "'\\''")}'`
+}
+
+// Schickt einen Dosierplan bzw. eine Zeitleiste an den Pump-Server oder führt pump_control.py plan aus
+async function sendPumpPlan(plan: unknown, logPrefix: string) {
+  console.log(`${logPrefix} Dosierplan: ${JSON.stringify(plan)}`)
+
+  // Die Gesamtdauer rechnet der Pump-Server selbst (Kalibrierkurve, Strombudget – Pumpen laufen
+  // ggf. nacheinander); der vorbereitete Plan landet dabei im Cache und wird gleich wiederverwendet
+  let response = null
+  const dryRun = await sendPumpServerRequest({ command: "plan", plan, dry_run: true }, 5000)
+  if (dryRun) {
+    if (!dryRun.success) {
+      throw new Error(dryRun.error || "Dosierplan fehlgeschlagen")
+    }
+    response = await sendPumpServerRequest({ command: "plan", plan }, dryRun.planned_total_ms + 5000)
+  }
+  if (!response) {
+    const { fsSync, path, execPromise } = await getNodeModules()
     const PUMP_CONTROL_SCRIPT = path!.join(process.cwd(), "pump_control.py")
-    const roundedDuration = Math.round(durationMs)
 
     if (!fsSync!.existsSync(PUMP_CONTROL_SCRIPT)) {
-      console.error(`[PUMP DEBUG] ❌ Python-Skript nicht gefunden: ${PUMP_CONTROL_SCRIPT}`)
+      console.error(`${logPrefix} ❌ Python-Skript nicht gefunden: ${PUMP_CONTROL_SCRIPT}`)
       throw new Error(`Python-Skript nicht gefunden: ${PUMP_CONTROL_SCRIPT}`)
     }
 
-    console.log(`[PUMP DEBUG] Python-Skript gefunden: ${PUMP_CONTROL_SCRIPT}`)
+    const command = `python3 ${PUMP_CONTROL_SCRIPT} plan ${shellQuote(JSON.stringify(plan))}`
+    console.log(`${logPrefix} Kein Pump-Server aktiv, führe Befehl aus: ${command}`)
+    const { stdout } = await execPromise(command)
+    const lines = stdout.trim().split("\n")
+    response = JSON.parse(lines[lines.length - 1])
+  }
 
-    const command = `python3 ${PUMP_CONTROL_SCRIPT} activate ${pin} ${roundedDuration}`
-    console.log(`[PUMP DEBUG] Führe Befehl aus: ${command}`)
+  console.log(`${logPrefix} Dosierplan Ergebnis: ${JSON.stringify(response)}`)
+  if (!response.success) {
+    throw new Error(response.error || "Dosierplan fehlgeschlagen")
+  }
+  return response
+}
+
+// Führt einen ganzen Dosierplan in einem Aufruf aus: alle Relais starten gemeinsam,
+// jedes schaltet zu seiner eigenen Deadline ab (eine gemeinsame Zeitschleife in pump_control.py).
+// Die Dauer berechnet pump_control.py aus der Kalibrierkurve der Pumpe (Fallback: ml / flowRate).
+// Mit levels_accounted: true hat pump_control.py die Mengen bereits von den Füllständen abgezogen.
+async function runPumpPlan(entries: PumpPlanEntry[], logPrefix: string) {
+  const plan = toServerPlan(entries)
+  if (plan.length === 0) return null
+  return sendPumpPlan(plan, logPrefix)
+}
+
+// Geschichtete Drinks als eine Zeitleiste (pump_timeline.py): die verzögerten Zutaten starten
+// layerGapMs nach dem Ende der sofortigen Pumpen, alles gegen eine gemeinsame Uhr
+function buildPourTimeline(immediatePlan: PumpPlanEntry[], delayedPlan: PumpPlanEntry[], layerGapMs: number) {
+  const immediateSteps = toServerPlan(immediatePlan)
+  const immediatePins = immediateSteps.map((step) => step.pin)
+  const delayedSteps = toServerPlan(delayedPlan).map((step) => ({ ...step, after: immediatePins, offset_ms: layerGapMs }))
+  return { steps: [...immediateSteps, ...delayedSteps] }
+}
+
+async function runPourTimeline(immediatePlan: PumpPlanEntry[], delayedPlan: PumpPlanEntry[], layerGapMs: number, logPrefix: string) {
+  const timeline = buildPourTimeline(immediatePlan, delayedPlan, layerGapMs)
+  if (timeline.steps.length === 0) return null
+  return sendPumpPlan(timeline, logPrefix)
+}
+
+// Diese Funktion aktiviert eine Pumpe für eine bestimmte Zeit
+async function activatePump(pin: number, durationMs: number) {
+  try {
+    console.log(`[PUMP DEBUG] ==========================================`)
+    console.log(`[PUMP DEBUG] Aktiviere Pumpe an GPIO Pin ${pin} für ${durationMs}ms`)
+    console.log(`[PUMP DEBUG] Aktueller Arbeitsordner: ${process.cwd()}`)
 
-    const { stdout, stderr } = await execPromise(command)
+    const { stdout, stderr } = await runPumpControl(pin, durationMs, "[PUMP DEBUG]")
 
     console.log(`[PUMP DEBUG] ✅ Befehl erfolgreich ausgeführt`)
     if (stdout) {
@@ -318,183 +502,198 @@ async function activatePump(pin: number, durationMs: number) {
   }
 }
 
-// Hilfsfunktion: Finde alle Pumpen für eine Zutat, sortiert nach Priorität
-function getPumpsForIngredient(ingredientId: string, pumpConfig: PumpConfig[]): PumpConfig[] {
-  return pumpConfig
-    .filter((p) => p.ingredient === ingredientId && p.enabled)
-    .sort((a, b) => (a.priority || 999) - (b.priority || 999))
-}
+// Pause zwischen dem Ende der sofortigen Zutaten und dem Einschichten der verzögerten
+const LAYER_GAP_MS = 2000
 
-// Hilfsfunktion: Verteile die benötigte Menge auf mehrere Pumpen basierend auf Füllstand
-async function distributeToPumps(
-  ingredientId: string,
-  amountNeeded: number,
-  pumpConfig: PumpConfig[],
-  ingredientLevels: Map<number, number>
-): Promise<{ pumpId: number; pin: number; amount: number; flowRate: number }[]> {
-  const pumps = getPumpsForIngredient(ingredientId, pumpConfig)
-  
-  if (pumps.length === 0) {
-    console.error(`Keine Pumpe für Zutat ${ingredientId} konfiguriert!`)
-    return []
-  }
-
-  const distribution: { pumpId: number; pin: number; amount: number; flowRate: number }[] = []
-  let remainingAmount = amountNeeded
-
-  for (const pump of pumps) {
-    if (remainingAmount <= 0) break
-
-    const currentLevel = ingredientLevels.get(pump.id) || 0
-    
-    if (currentLevel <= 0) {
-      console.log(`[v0] Pumpe ${pump.id} (${pump.ingredient}) ist leer, überspringe...`)
-      continue
-    }
+type PlannedPour = { pin: number; pump_id: number; ml: number; flow_rate: number; pulse?: { on_ms: number; off_ms: number } }
 
-    const amountFromThisPump = Math.min(remainingAmount, currentLevel)
-    
-    distribution.push({
-      pumpId: pump.id,
-      pin: pump.pin,
-      amount: amountFromThisPump,
-      flowRate: pump.flowRate
-    })
+// Skaliert das Rezept und verteilt jede Zutat auf ihre Pumpen (sofortige und verzögerte Zutaten getrennt).
+// Die Verteilung übernimmt pump_planner.py: bei mehreren Pumpen pro Zutat nach Priorität nacheinander
+// oder – mit PUMP_SPLIT_MODE=parallel – gleichzeitig, anteilig zur kalibrierten Förderrate.
+async function planCocktail(
+  cocktail: Cocktail,
+  pumpConfig: PumpConfig[],
+  size: number,
+  ingredientLevelsData?: { pumpId: number; currentLevel: number }[],
+) {
+  // Manuelle Zutaten haben keine Pumpe
+  const recipe = cocktail.recipe
+    .filter((item) => item.type !== "manual" && !item.manual)
+    .map(({ ingredientId, amount, delayed, pulse }) => ({ ingredientId, amount, delayed, pulse }))
+  // Ohne übergebene Füllstände verwendet pump_planner.py die aktuellen aus data/ingredient-levels.json
+  // cocktail_id ist Teil des Schlüssels im Plan-Cache des Pump-Servers
+  const request = {
+    cocktail_id: cocktail.id,
+    recipe,
+    size,
+    pumps: pumpConfig,
+    ...(ingredientLevelsData ? { levels: ingredientLevelsData } : {}),
+  }
 
-    console.log(`[v0] Pumpe ${pump.id} (Priorität ${pump.priority || 999}): ${amountFromThisPump}ml von ${currentLevel}ml verfügbar`)
-    
-    remainingAmount -= amountFromThisPump
+  let planned = await sendPumpServerRequest({ command: "plan_recipe", ...request }, 5000)
+  if (!planned) {
+    const { path, execPromise } = await getNodeModules()
+    const PLANNER_SCRIPT = path!.join(process.cwd(), "pump_planner.py")
+    const { stdout } = await execPromise(`python3 ${PLANNER_SCRIPT} recipe ${shellQuote(JSON.stringify(request))}`)
+    const lines = stdout.trim().split("\n")
+    planned = JSON.parse(lines[lines.length - 1])
+  }
+  if (!planned.success) {
+    throw new Error(planned.error || "Rezept konnte nicht auf die Pumpen verteilt werden")
   }
 
-  if (remainingAmount > 0) {
-    console.warn(`[v0] WARNUNG: ${remainingAmount}ml von ${ingredientId} konnten nicht verteilt werden!`)
+  for (const [ingredientId, missingMl] of Object.entries(planned.short || {})) {
+    console.warn(`[v0] WARNUNG: ${missingMl}ml von ${ingredientId} konnten nicht verteilt werden!`)
+  }
+  for (const [pumpId, overSeconds] of Object.entries(planned.over_duty || {})) {
+    console.warn(`[v0] WARNUNG: Pumpe ${pumpId} überschreitet ihre Einschaltdauer-Grenze um ${overSeconds}s`)
   }
 
-  return distribution
+  const toPlan = (pours: PlannedPour[], label: string): PumpPlanEntry[] =>
+    pours.map((pour) => {
+      console.log(`[v0] ${label}: Pumpe ${pour.pump_id}: ${pour.ml}ml aktivieren`)
+      return {
+        pumpId: pour.pump_id,
+        pin: pour.pin,
+        amount: pour.ml,
+        flowRate: pour.flow_rate,
+        pulse: pour.pulse ? { onMs: pour.pulse.on_ms, offMs: pour.pulse.off_ms } : undefined,
+      }
+    })
+
+  const immediatePlan = toPlan(planned.immediate, "Sofort")
+  const delayedPlan = toPlan(planned.delayed, "Verzögert")
+  // Sammle Pumpen-Updates für Level-Reduktion
+  const levelUpdates = [...immediatePlan, ...delayedPlan].map((entry) => ({ pumpId: entry.pumpId, amount: entry.amount }))
+  return { immediatePlan, delayedPlan, levelUpdates }
+}
+
+function toIngredientUsage(levelUpdates: { pumpId: number; amount: number }[], pumpConfig: PumpConfig[]) {
+  return levelUpdates.map((update) => {
+    const pump = pumpConfig.find((p) => p.id === update.pumpId)
+    return {
+      ingredientId: pump?.ingredient || `pump-${update.pumpId}`,
+      amount: update.amount,
+    }
+  })
+}
+
+// Zählt Not-Aus-Aufrufe, damit ein laufender Drink einen Stopp auch zwischen zwei Dosierplänen bemerkt
+let pumpStopCount = 0
+
+// Hat der Pump-Server eine Pumpe dieses Plans per Not-Aus abgebrochen?
+function wasStopped(result: any) {
+  return Boolean(result?.pumps?.some((pump: { stopped?: boolean }) => pump.stopped))
+}
+
+// Tatsächlich dosierte Mengen: gestoppte Pumpen anteilig (gemessene / geplante Zeit), nicht gelaufene gar nicht
+function pouredUpdates(entries: PumpPlanEntry[], result: any) {
+  const pumps = new Map<number, any>((result?.pumps ?? []).map((pump: any) => [pump.pin, pump]))
+  return entries.map((entry) => {
+    const pump = pumps.get(entry.pin)
+    let ratio = pump && pump.measured_ms > 0 ? 1 : 0
+    if (pump?.stopped && pump.duration_ms) ratio = Math.min(1, pump.measured_ms / pump.duration_ms)
+    return { pumpId: entry.pumpId, amount: entry.amount * ratio }
+  })
 }
 
 export async function makeCocktailAction(cocktail: Cocktail, pumpConfig: PumpConfig[], size = 300, ingredientLevelsData?: { pumpId: number; currentLevel: number }[]) {
   console.log(`Bereite Cocktail zu: ${cocktail.name} (${size}ml)`)
 
-  // Erstelle eine Map der Füllstände für schnellen Zugriff
-  const ingredientLevels = new Map<number, number>()
-  if (ingredientLevelsData) {
-    for (const level of ingredientLevelsData) {
-      ingredientLevels.set(level.pumpId, level.currentLevel)
+  const { immediatePlan, delayedPlan, levelUpdates } = await planCocktail(cocktail, pumpConfig, size, ingredientLevelsData)
+
+  // Eine Zeitleiste für den ganzen Drink: sofortige Pumpen gemeinsam, verzögerte Zutaten
+  // LAYER_GAP_MS nach deren Ende (ebenfalls gemeinsam, ggf. mit Impulsmuster)
+  const pinsUsedTwice = delayedPlan.some((entry) => immediatePlan.some((other) => other.pin === entry.pin))
+  const stopsBefore = pumpStopCount
+  let accounted: boolean
+  let stopped: boolean
+  let pouredLevelUpdates = levelUpdates
+  if (pinsUsedTwice) {
+    // Dieselbe Pumpe sofort und verzögert: nacheinander als zwei Dosierpläne
+    const immediateResult = await runPumpPlan(immediatePlan, "[PUMP DEBUG]")
+    let delayedResult = null
+    stopped = wasStopped(immediateResult)
+    if (!stopped) {
+      await new Promise((resolve) => setTimeout(resolve, LAYER_GAP_MS))
+      // Ein Not-Aus während der Pause bricht den Drink ebenfalls ab
+      stopped = pumpStopCount !== stopsBefore
+    }
+    if (!stopped) {
+      delayedResult = await runPumpPlan(delayedPlan, "[PUMP DEBUG]")
+      stopped = wasStopped(delayedResult)
+    }
+    accounted = (!immediateResult || immediateResult.levels_accounted) && (!delayedResult || delayedResult.levels_accounted)
+    if (stopped) {
+      pouredLevelUpdates = [...pouredUpdates(immediatePlan, immediateResult), ...pouredUpdates(delayedPlan, delayedResult)]
     }
   } else {
-    // Fallback: Setze alle Pumpen auf "genug" wenn keine Levels übergeben werden
-    for (const pump of pumpConfig) {
-      ingredientLevels.set(pump.id, 10000)
+    const result = await runPourTimeline(immediatePlan, delayedPlan, LAYER_GAP_MS, "[PUMP DEBUG]")
+    accounted = !result || result.levels_accounted
+    stopped = wasStopped(result)
+    if (stopped) {
+      pouredLevelUpdates = pouredUpdates([...immediatePlan, ...delayedPlan], result)
     }
   }
 
-  // Skaliere das Rezept auf die gewünschte Größe
-  const currentTotal = cocktail.recipe.reduce((total, item) => total + item.amount, 0)
-  const scaleFactor = currentTotal === 0 ? 1 : size / currentTotal
-  const scaledRecipe = cocktail.recipe.map((item) => ({
-    ...item,
-    amount: Math.round(item.amount * scaleFactor),
-  }))
-
-  const delayedItems = scaledRecipe.filter((item) => item.delayed === true)
-  const immediateItems = scaledRecipe.filter((item) => item.delayed !== true)
-
-  console.log(`[v0] Sofortige Zutaten: ${immediateItems.length}, Verzögerte Zutaten: ${delayedItems.length}`)
-
-  // Sammle Pumpen-Updates für Level-Reduktion
-  const levelUpdates: { pumpId: number; amount: number }[] = []
-
-  // Verarbeite sofortige Zutaten mit Multi-Pumpen-Unterstützung
-  const immediatePumpPromises: Promise<void>[] = []
-  
-  for (const item of immediateItems) {
-    const distribution = await distributeToPumps(
-      item.ingredientId,
-      item.amount,
-      pumpConfig,
-      ingredientLevels
-    )
+  // Aktualisiere die Füllstände über API nur, wenn pump_control.py sie nicht selbst verbucht hat
+  if (!accounted) {
+    await postLevelUpdates(pouredLevelUpdates.filter((update) => update.amount > 0))
+  }
 
-    for (const dist of distribution) {
-      const pumpTimeMs = (dist.amount / dist.flowRate) * 1000
-      
-      console.log(`[v0] Sofort: Pumpe ${dist.pumpId}: ${dist.amount}ml für ${pumpTimeMs}ms aktivieren`)
-      
-      levelUpdates.push({ pumpId: dist.pumpId, amount: dist.amount })
-      
-      // Aktualisiere den lokalen Füllstand für weitere Berechnungen
-      const currentLevel = ingredientLevels.get(dist.pumpId) || 0
-      ingredientLevels.set(dist.pumpId, currentLevel - dist.amount)
-      
-      immediatePumpPromises.push(activatePump(dist.pin, pumpTimeMs).then(() => {}))
-    }
+  if (stopped) {
+    console.log(`Cocktail ${cocktail.name} per Not-Aus abgebrochen`)
+    return { success: false, cancelled: true, error: "Zubereitung abgebrochen (Pumpen gestoppt)" }
   }
 
-  // Warte, bis alle sofortigen Pumpen aktiviert wurden
-  await Promise.all(immediatePumpPromises)
+  // Return ingredient usage data so client can save statistics
+  return {
+    success: true,
+    ingredientUsage: toIngredientUsage(levelUpdates, pumpConfig),
+  }
+}
 
-  if (delayedItems.length > 0) {
-    console.log(`[v0] Warte 2 Sekunden vor dem Hinzufügen von ${delayedItems.length} verzögerten Zutaten...`)
-    await new Promise((resolve) => setTimeout(resolve, 2000))
+// Reiht einen Cocktail in die Bestellwarteschlange des Pump-Servers ein (pump_queue.py).
+// Der Dosierplan wird dort sofort vorbereitet und startet nach der Glaswechsel-Bestätigung.
+export async function enqueueCocktailAction(cocktail: Cocktail, pumpConfig: PumpConfig[], size = 300, ingredientLevelsData?: { pumpId: number; currentLevel: number }[]) {
+  console.log(`Reihe Cocktail ein: ${cocktail.name} (${size}ml)`)
 
-    // Füge verzögerte Zutaten mit Multi-Pumpen-Unterstützung hinzu
-    for (const item of delayedItems) {
-      const distribution = await distributeToPumps(
-        item.ingredientId,
-        item.amount,
-        pumpConfig,
-        ingredientLevels
-      )
-
-      for (const dist of distribution) {
-        const pumpTimeMs = (dist.amount / dist.flowRate) * 1000
-        
-        console.log(`[v0] Verzögert: Pumpe ${dist.pumpId}: ${dist.amount}ml für ${pumpTimeMs}ms aktivieren`)
-        
-        levelUpdates.push({ pumpId: dist.pumpId, amount: dist.amount })
-        
-        // Aktualisiere den lokalen Füllstand
-        const currentLevel = ingredientLevels.get(dist.pumpId) || 0
-        ingredientLevels.set(dist.pumpId, currentLevel - dist.amount)
-        
-        await activatePump(dist.pin, pumpTimeMs)
-      }
-    }
+  const { immediatePlan, delayedPlan, levelUpdates } = await planCocktail(cocktail, pumpConfig, size, ingredientLevelsData)
+  const response = await sendPumpServerRequest(
+    { command: "enqueue", name: cocktail.name, plan: buildPourTimeline(immediatePlan, delayedPlan, LAYER_GAP_MS) },
+    5000,
+  )
+  if (!response) {
+    throw new Error("Pump-Server läuft nicht – Warteschlange nicht verfügbar")
+  }
+  if (!response.success) {
+    throw new Error(response.error || "Bestellung konnte nicht eingereiht werden")
   }
 
-  // Aktualisiere die Füllstände über API
-  try {
-    const response = await fetch(
-      `${process.env.NEXT_PUBLIC_BASE_URL || "http://localhost:3000"}/api/ingredient-levels/update`,
-      {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ ingredients: levelUpdates }),
-      },
-    )
+  return { ...response, ingredientUsage: toIngredientUsage(levelUpdates, pumpConfig) }
+}
 
-    if (response.ok) {
-      const data = await response.json()
-      console.log("[v0] Füllstände erfolgreich aktualisiert:", data.levels?.length || 0, "Levels")
-    } else {
-      console.error("Fehler beim Aktualisieren der Füllstände:", response.statusText)
-    }
-  } catch (error) {
-    console.error("Error updating levels:", error)
+// Befehle an die Bestellwarteschlange: "queue" (Status + Kennzahlen), "confirm" (Glas gewechselt), "cancel"
+export async function orderQueueAction(command: "queue" | "confirm" | "cancel", orderId?: string) {
+  const response = await sendPumpServerRequest(orderId === undefined ? { command } : { command, order_id: orderId }, 5000)
+  if (!response) {
+    return { success: false, error: "Pump-Server läuft nicht" }
   }
+  return response
+}
 
-  // Return ingredient usage data so client can save statistics
-  return {
-    success: true,
-    ingredientUsage: levelUpdates.map((update) => {
-      const pump = pumpConfig.find((p) => p.id === update.pumpId)
-      return {
-        ingredientId: pump?.ingredient || `pump-${update.pumpId}`,
-        amount: update.amount,
-      }
-    }),
-  }
+// Machbare Cocktails bei size ml per Bitmaske (pump_menu.py); mit cocktailId die Verfügbarkeit eines Cocktails
+export async function menuAvailabilityAction(size = 300, cocktailId?: string) {
+  const request = cocktailId ? { command: "menu", size, cocktail: cocktailId } : { command: "menu", size }
+  const response = await sendPumpServerRequest(request, 5000)
+  if (response) return response
+
+  const { path, execPromise } = await getNodeModules()
+  const MENU_SCRIPT = path!.join(process.cwd(), "pump_menu.py")
+  const args = cocktailId ? `check ${shellQuote(cocktailId)}` : "pourable"
+  const { stdout } = await execPromise(`python3 ${MENU_SCRIPT} ${args} --size ${Number(size)}`)
+  const lines = stdout.trim().split("\n")
+  return JSON.parse(lines[lines.length - 1])
 }
 
 export async function makeSingleShotAction(ingredientId: string, amount = 40, pumpConfig: PumpConfig[]) {
@@ -507,33 +706,14 @@ export async function makeSingleShotAction(ingredientId: string, amount = 40, pu
     throw new Error(`Keine Pumpe für Zutat ${ingredientId} konfiguriert!`)
   }
 
-  // Berechne, wie lange die Pumpe laufen muss
-  const pumpTimeMs = (amount / pump.flowRate) * 1000
-
-  console.log(`Pumpe ${pump.id} (${pump.ingredient}): ${amount}ml für ${pumpTimeMs}ms aktivieren`)
+  console.log(`Pumpe ${pump.id} (${pump.ingredient}): ${amount}ml aktivieren`)
 
-  // Aktiviere die Pumpe
-  await activatePump(pump.pin, pumpTimeMs)
-
-  // Aktualisiere den Füllstand über API
-  try {
-    const response = await fetch(
-      `${process.env.NEXT_PUBLIC_BASE_URL || "http://localhost:3000"}/api/ingredient-levels/update`,
-      {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ ingredients: [{ pumpId: pump.id, amount }] }),
-      },
-    )
+  // Aktiviere die Pumpe (pump_control.py verbucht den Füllstand, sobald das Relais schließt)
+  const result = await runPumpPlan([{ pumpId: pump.id, pin: pump.pin, amount, flowRate: pump.flowRate }], "[PUMP DEBUG]")
 
-    if (response.ok) {
-      const data = await response.json()
-      console.log("[v0] Füllstände erfolgreich aktualisiert:", data.levels?.length || 0, "Levels")
-    } else {
-      console.error("Fehler beim Aktualisieren der Füllstände:", response.statusText)
-    }
-  } catch (error) {
-    console.error("Error updating levels:", error)
+  // Aktualisiere den Füllstand über API, falls pump_control.py ihn nicht verbucht hat
+  if (!result?.levels_accounted) {
+    await postLevelUpdates([{ pumpId: pump.id, amount }])
   }
 
   return { success: true }
@@ -561,19 +741,7 @@ export async function calibratePumpAction(pumpId: number, durationMs: number) {
       console.warn(`[CALIBRATE DEBUG] ⚠️  Pumpe ${pumpId} ist deaktiviert (enabled: false)`)
     }
 
-    const { fsSync, path, execPromise } = await getNodeModules()
-    const PUMP_CONTROL_SCRIPT = path!.join(process.cwd(), "pump_control.py")
-    const roundedDuration = Math.round(durationMs)
-
-    if (!fsSync!.existsSync(PUMP_CONTROL_SCRIPT)) {
-      console.error(`[CALIBRATE DEBUG] ❌ Python-Skript nicht gefunden: ${PUMP_CONTROL_SCRIPT}`)
-      throw new Error(`Python-Skript nicht gefunden: ${PUMP_CONTROL_SCRIPT}`)
-    }
-
-    const command = `python3 ${PUMP_CONTROL_SCRIPT} activate ${pump.pin} ${roundedDuration}`
-    console.log(`[CALIBRATE DEBUG] Führe Befehl aus: ${command}`)
-
-    const { stdout, stderr } = await execPromise(command)
+    const { stdout, stderr } = await runPumpControl(pump.pin, durationMs, "[CALIBRATE DEBUG]")
 
     if (stdout) {
       console.log(`[CALIBRATE DEBUG] Python stdout: ${stdout}`)
@@ -597,6 +765,24 @@ export async function calibratePumpAction(pumpId: number, durationMs: number) {
   }
 }
 
+// Speichert einen gemessenen (Dauer, ml)-Punkt in der Kalibrierkurve der Pumpe (pump_calibration.py)
+export async function recordCalibrationPointAction(pumpId: number, durationMs: number, measuredMl: number) {
+  const pumpConfig = await getPumpConfig()
+  const pump = pumpConfig.find((p) => p.id === pumpId)
+
+  if (!pump) {
+    throw new Error(`Pumpe mit ID ${pumpId} nicht gefunden`)
+  }
+
+  const { path, execPromise } = await getNodeModules()
+  const CALIBRATION_SCRIPT = path!.join(process.cwd(), "pump_calibration.py")
+  const command = `python3 ${CALIBRATION_SCRIPT} record ${pump.id} ${Math.round(durationMs)} ${Number(measuredMl)} ${pump.pin}`
+  console.log(`[CALIBRATE DEBUG] Speichere Kalibrierpunkt: ${command}`)
+
+  const { stdout } = await execPromise(command)
+  return JSON.parse(stdout.trim())
+}
+
 export async function cleanPumpAction(pumpId: number, durationMs: number) {
   try {
     console.log(`Reinige Pumpe ${pumpId} für ${durationMs}ms`)
@@ -609,12 +795,8 @@ export async function cleanPumpAction(pumpId: number, durationMs: number) {
       throw new Error(`Pumpe mit ID ${pumpId} nicht gefunden`)
     }
 
-    // Aktiviere die Pumpe über das Python-Skript
-    const { fsSync, path, execPromise } = await getNodeModules()
-    const PUMP_CONTROL_SCRIPT = path!.join(process.cwd(), "pump_control.py")
-    const roundedDuration = Math.round(durationMs)
-
-    await execPromise(`python3 ${PUMP_CONTROL_SCRIPT} activate ${pump.pin} ${roundedDuration}`)
+    // Aktiviere die Pumpe über den Pump-Server bzw. das Python-Skript
+    await runPumpControl(pump.pin, durationMs, "[PUMP DEBUG]")
 
     console.log(`Pumpe ${pumpId} erfolgreich gereinigt`)
 
@@ -641,6 +823,23 @@ export async function activatePumpForDurationAction(
   console.log(`Pumpe ${pump.id} deaktiviert.`)
 }
 
+// Not-Aus: schaltet alle (oder eine) laufenden Pumpen innerhalb weniger Millisekunden ab.
+// Ohne Pump-Server setzt pump_control.py die Pins direkt auf HIGH.
+export async function stopPumpsAction(pin?: number) {
+  pumpStopCount++
+  const response = await sendPumpServerRequest(pin === undefined ? { command: "stop" } : { command: "stop", pin }, 2000)
+  if (response) {
+    console.log(`[PUMP DEBUG] Pumpen gestoppt: ${JSON.stringify(response)}`)
+    return response
+  }
+
+  const { path, execPromise } = await getNodeModules()
+  const PUMP_CONTROL_SCRIPT = path!.join(process.cwd(), "pump_control.py")
+  const { stdout } = await execPromise(`python3 ${PUMP_CONTROL_SCRIPT} stop${pin === undefined ? "" : ` ${pin}`}`)
+  const lines = stdout.trim().split("\n")
+  return JSON.parse(lines[lines.length - 1])
+}
+
 export async function ventPumpAction(pumpId: number, durationMs: number) {
   try {
     const pumpConfig = await getPumpConfig()
@@ -650,12 +849,8 @@ export async function ventPumpAction(pumpId: number, durationMs: number) {
       throw new Error(`Pumpe mit ID ${pumpId} nicht gefunden`)
     }
 
-    // Aktiviere die Pumpe über das Python-Skript
-    const { fsSync, path, execPromise } = await getNodeModules()
-    const PUMP_CONTROL_SCRIPT = path!.join(process.cwd(), "pump_control.py")
-    const roundedDuration = Math.round(durationMs)
-
-    await execPromise(`python3 ${PUMP_CONTROL_SCRIPT} activate ${pump.pin} ${roundedDuration}`)
+    // Aktiviere die Pumpe über den Pump-Server bzw. das Python-Skript
+    await runPumpControl(pump.pin, durationMs, "[PUMP DEBUG]")
 
     console.log(`Pumpe ${pumpId} erfolgreich entlüftet`)
 
@@ -676,31 +871,13 @@ export async function makeShotAction(ingredient: string, pumpConfig: PumpConfig[
     throw new Error(`Keine Pumpe für Zutat ${ingredient} konfiguriert!`)
   }
 
-  // Berechne, wie lange die Pumpe laufen muss
-  const pumpTimeMs = (size / pump.flowRate) * 1000
-
-  console.log(`Pumpe ${pump.id} (${pump.ingredient}): ${size}ml für ${pumpTimeMs}ms aktivieren`)
+  console.log(`Pumpe ${pump.id} (${pump.ingredient}): ${size}ml aktivieren`)
 
-  // Aktiviere die Pumpe
-  await activatePump(pump.pin, pumpTimeMs)
+  // Aktiviere die Pumpe (pump_control.py verbucht den Füllstand, sobald das Relais schließt)
+  const result = await runPumpPlan([{ pumpId: pump.id, pin: pump.pin, amount: size, flowRate: pump.flowRate }], "[PUMP DEBUG]")
 
-  try {
-    const response = await fetch(
-      `${process.env.NEXT_PUBLIC_BASE_URL || "http://localhost:3000"}/api/ingredient-levels/update`,
-      {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ ingredients: [{ pumpId: pump.id, amount: size }] }),
-      },
-    )
-    if (!response.ok) {
-      console.error("Failed to update levels after shot:", response.statusText)
-    } else {
-      const data = await response.json()
-      console.log("[v0] Füllstände erfolgreich aktualisiert:", data.levels?.length || 0, "Levels")
-    }
-  } catch (error) {
-    console.error("Error updating levels after shot:", error)
+  if (!result?.levels_accounted) {
+    await postLevelUpdates([{ pumpId: pump.id, amount: size }])
   }
 
   return {
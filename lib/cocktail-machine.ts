@@ -34,6 +34,51 @@ function saveStatistics(
   }
 }
 
+// Eingereihte Bestellungen, deren Statistik erst nach dem Ausschank gespeichert wird
+const PENDING_ORDERS_KEY = "cocktailbot-pending-orders"
+
+type PendingOrder = {
+  cocktail: Cocktail
+  size: number
+  ingredientUsage: Array<{ ingredientId: string; amount: number }>
+  category: "cocktails" | "virgin" | "shots"
+}
+
+function loadPendingOrders(): Record<string, PendingOrder> {
+  try {
+    return JSON.parse(localStorage.getItem(PENDING_ORDERS_KEY) || "{}")
+  } catch {
+    return {}
+  }
+}
+
+function savePendingOrders(pending: Record<string, PendingOrder>) {
+  try {
+    localStorage.setItem(PENDING_ORDERS_KEY, JSON.stringify(pending))
+  } catch (error) {
+    console.error("[v0] Error saving pending orders:", error)
+  }
+}
+
+// Speichert die Statistik fertig ausgeschenkter Bestellungen; abgebrochene, fehlgeschlagene und
+// nicht mehr gemeldete (Server neu gestartet, aus "recent" gefallen) verfallen
+function settlePendingOrders(queue: { current?: { id: string } | null; pending?: { id: string }[]; recent?: { id: string; state: string }[] }) {
+  const pending = loadPendingOrders()
+  const ids = Object.keys(pending)
+  if (ids.length === 0) return
+  const open = new Set([queue.current?.id, ...(queue.pending ?? []).map((order) => order.id)])
+  const finished = new Map((queue.recent ?? []).map((order) => [order.id, order.state]))
+  for (const id of ids) {
+    if (open.has(id)) continue
+    const order = pending[id]
+    if (finished.get(id) === "done") {
+      saveStatistics(order.cocktail, order.size, order.ingredientUsage, order.category)
+    }
+    delete pending[id]
+  }
+  savePendingOrders(pending)
+}
+
 // Client-compatible functions that call API endpoints instead of server actions
 export async function makeCocktail(
   cocktail: Cocktail,
@@ -114,6 +159,20 @@ export async function calibratePump(pumpId: number, durationMs: number) {
   return await response.json()
 }
 
+export async function recordCalibrationPoint(pumpId: number, durationMs: number, measuredMl: number) {
+  const response = await fetch("/api/calibrate-pump", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ pumpId, durationMs, measuredMl }),
+  })
+
+  if (!response.ok) {
+    throw new Error(`Failed to record calibration point: ${response.statusText}`)
+  }
+
+  return await response.json()
+}
+
 export async function cleanPump(pumpId: number, durationMs: number) {
   const response = await fetch("/api/vent-pump", {
     method: "POST",
@@ -128,6 +187,89 @@ export async function cleanPump(pumpId: number, durationMs: number) {
   return await response.json()
 }
 
+export async function enqueueCocktail(
+  cocktail: Cocktail,
+  pumpConfig: PumpConfig[],
+  size = 300,
+  category: "cocktails" | "virgin" | "shots" = "cocktails",
+  ingredientLevels?: { pumpId: number; currentLevel: number }[],
+) {
+  const response = await fetch("/api/order-queue", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ action: "enqueue", cocktail, pumpConfig, size, ingredientLevels }),
+  })
+
+  if (!response.ok) {
+    throw new Error(`Failed to enqueue cocktail: ${response.statusText}`)
+  }
+
+  const result = await response.json()
+
+  // Statistik erst, wenn die Warteschlange die Bestellung als fertig meldet (getOrderQueue)
+  if (result.success && result.ingredientUsage) {
+    savePendingOrders({ ...loadPendingOrders(), [result.order_id]: { cocktail, size, ingredientUsage: result.ingredientUsage, category } })
+  }
+
+  return result
+}
+
+export async function getOrderQueue() {
+  const response = await fetch("/api/order-queue")
+
+  if (!response.ok) {
+    throw new Error(`Failed to load order queue: ${response.statusText}`)
+  }
+
+  const result = await response.json()
+  if (result.success) {
+    settlePendingOrders(result)
+  }
+  return result
+}
+
+export async function confirmGlassSwap() {
+  const response = await fetch("/api/order-queue", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ action: "confirm" }),
+  })
+
+  if (!response.ok) {
+    throw new Error(`Failed to confirm glass swap: ${response.statusText}`)
+  }
+
+  return await response.json()
+}
+
+export async function cancelOrder(orderId?: string) {
+  const response = await fetch("/api/order-queue", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ action: "cancel", orderId }),
+  })
+
+  if (!response.ok) {
+    throw new Error(`Failed to cancel order: ${response.statusText}`)
+  }
+
+  return await response.json()
+}
+
+export async function stopPumps(pin?: number) {
+  const response = await fetch("/api/stop-pumps", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ pin }),
+  })
+
+  if (!response.ok) {
+    throw new Error(`Failed to stop pumps: ${response.statusText}`)
+  }
+
+  return await response.json()
+}
+
 export async function getPumpConfig(): Promise<PumpConfig[]> {
   const response = await fetch("/api/pump-config")
 
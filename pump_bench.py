@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+pump_bench.py — misst die Dosier-Pfade von pump_control.py mit dem simulierten GPIO-Backend
+
+Läuft auf jedem Linux-Rechner (kein Raspberry Pi nötig):
+  python3 pump_bench.py
+  python3 pump_bench.py --runs 50 --pins 6 --duration-ms 150 --path plan --path socket
+
+Gemessen werden pro Pfad
+  dispatch_ms      Aufruf bis zum ersten Relais-Einschalten
+  start_skew_ms    erstes bis letztes Relais-Einschalten innerhalb eines Laufs
+  on_time_error_ms gemessene minus angeforderte Einschaltzeit pro Pin
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pump_control
+from pump_gpio import SimulatedBackend
+from pump_timing import summarize
+
+BENCH_PINS = [17, 18, 27, 22, 23, 24, 25, 5, 6, 12, 13, 16, 19, 20, 21, 26, 4, 15]
+
+def _path_activate(backend, plan):
+    # Einzelpin-Pfad der CLI (ohne Interpreter-Start)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for pin, duration_ms in plan:
+            pump_control.activate_pump(pin, duration_ms)
+
+def _path_threads(backend, plan):
+    # Nachbildung des alten Promise.all: ein Thread (früher Prozess) pro Pumpe
+    threads = [
+        threading.Thread(target=pump_control.activate_pump, args=(pin, duration_ms))
+        for pin, duration_ms in plan
+    ]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+def _path_plan(backend, plan):
+    pump_control.run_plan(plan)
+
+def _path_server(server):
+    def run(backend, plan):
+        server.handle_request({"command": "plan", "plan": plan})
+    return run
+
+def _path_socket(socket_path):
+    def run(backend, plan):
+        pump_control.send_request({"command": "plan", "plan": plan}, socket_path=socket_path)
+    return run
+
+def measure(backend, runner, plan, runs):
+    """Führt ``runner`` ``runs``-mal aus und wertet die aufgezeichneten Pegelwechsel aus"""
+    dispatch_ms, skew_ms, error_ms = [], [], []
+    requested = dict(plan)
+    for _ in range(runs):
+        backend.reset()
+        called_at = time.monotonic()
+        runner(backend, plan)
+        intervals = backend.intervals(active=backend.LOW)
+        on_times = [spans[0][0] for pin, spans in intervals.items() if pin in requested]
+        if not on_times:
+            continue
+        dispatch_ms.append((min(on_times) - called_at) * 1000)
+        skew_ms.append((max(on_times) - min(on_times)) * 1000)
+        for pin, spans in intervals.items():
+            if pin in requested:
+                on_at, off_at = spans[0]
+                error_ms.append((off_at - on_at) * 1000 - requested[pin])
+    return {
+        "dispatch_ms": summarize(dispatch_ms),
+        "start_skew_ms": summarize(skew_ms),
+        "on_time_error_ms": summarize(error_ms),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark der Dosier-Pfade mit simuliertem GPIO")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--pins", type=int, default=6, help="Anzahl gleichzeitiger Pumpen")
+    parser.add_argument("--duration-ms", type=int, default=100, help="Dauer der längsten Pumpe")
+    parser.add_argument("--output-delay-us", type=float, default=0.0, help="simulierte Dauer eines GPIO-Aufrufs")
+    parser.add_argument("--path", action="append", choices=["activate", "threads", "plan", "server", "socket"])
+    args = parser.parse_args()
+
+    backend = SimulatedBackend(output_delay_s=args.output_delay_us / 1e6)
+    pins = BENCH_PINS[:max(1, min(args.pins, len(BENCH_PINS)))]
+    # Gestaffelte Dauern, damit die Pumpen zu unterschiedlichen Deadlines abschalten
+    plan = [(pin, max(1, args.duration_ms * (len(pins) - i) // len(pins))) for i, pin in enumerate(pins)]
+
+    # Benchmark-Läufe gehören nicht ins Journal
+    server = pump_control.PumpServer(pins=pins, backend=backend, journal_path=None)
+    paths = args.path or ["activate", "threads", "plan", "server", "socket"]
+    results = {"backend": backend.name, "runs": args.runs, "dispense_plan": plan}
+
+    socket_dir = tempfile.mkdtemp(prefix="pump-bench-")
+    socket_path = os.path.join(socket_dir, "pump.sock")
+    if "socket" in paths:
+        threading.Thread(target=pump_control.serve_socket, args=(server, socket_path), daemon=True).start()
+        while not os.path.exists(socket_path):
+            time.sleep(0.01)
+
+    runners = {
+        "activate": _path_activate,
+        "threads": _path_threads,
+        "plan": _path_plan,
+        "server": _path_server(server),
+        "socket": _path_socket(socket_path),
+    }
+    with contextlib.redirect_stderr(io.StringIO()):
+        for name in paths:
+            results[name] = measure(backend, runners[name], plan if name != "activate" else plan[:1], args.runs)
+
+    shutil.rmtree(socket_dir, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
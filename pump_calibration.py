@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+pump_calibration.py — nichtlineare Kalibrierkurven pro Pumpe
+
+Peristaltikpumpen brauchen eine Anlaufzeit und fördern bei kurzen Impulsen
+weniger als ``flowRate`` verspricht. Statt ml/flowRate wird deshalb aus
+gemessenen (Dauer, ml)-Punkten interpoliert; unterhalb des ersten Punktes
+läuft die Kurve auf die geschätzte Totzeit (0 ml) zu, oberhalb des letzten
+wird mit der gefitteten Förderrate extrapoliert.
+
+Die Punkte stehen in data/pump-calibration.json (Schlüssel = Pumpen-ID).
+
+  python3 pump_calibration.py calibrate 3 500 1000 2000 4000   # Läufe + Eingabe der ml
+  python3 pump_calibration.py record 3 2000 47.5               # einzelnen Messpunkt speichern
+  python3 pump_calibration.py duration 3 10                    # ml -> ms
+  python3 pump_calibration.py show [3]
+  python3 pump_calibration.py reset 3
+"""
+
+import bisect
+import json
+import os
+import sys
+import time
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CALIBRATION_PATH = os.path.join(DATA_DIR, "pump-calibration.json")
+PUMP_CONFIG_PATH = os.path.join(DATA_DIR, "pump-config.json")
+MAX_POINTS = 20
+
+_cache = {"path": None, "mtime": None, "table": {}}
+
+def load_calibration(path=CALIBRATION_PATH):
+    """{pump_id: {"pin": int, "points": [[duration_ms, ml], ...]}} – gecacht bis sich die Datei ändert"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    if _cache["path"] != path or _cache["mtime"] != mtime:
+        with open(path, "r") as calibration_file:
+            raw = json.load(calibration_file)
+        _cache.update(path=path, mtime=mtime, table={int(pump_id): entry for pump_id, entry in raw.items()})
+    return _cache["table"]
+
+def save_calibration(table, path=CALIBRATION_PATH):
+    # Temp-Datei + rename, damit ein Stromausfall nie eine halbe Datei hinterlässt
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as calibration_file:
+        json.dump({str(pump_id): entry for pump_id, entry in sorted(table.items())}, calibration_file, indent=2)
+    os.replace(tmp_path, path)
+
+def fit_line(points):
+    """Kleinste Quadrate ml = a * ms + b; liefert Förderrate und Totzeit (Schnitt mit 0 ml)"""
+    n = len(points)
+    if n == 0:
+        return None
+    mean_t = sum(t for t, _ in points) / n
+    mean_ml = sum(ml for _, ml in points) / n
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    if var_t == 0:
+        # Nur eine Dauer gemessen: Gerade durch den Ursprung
+        slope = mean_ml / mean_t if mean_t else 0.0
+        intercept = 0.0
+    else:
+        slope = sum((t - mean_t) * (ml - mean_ml) for t, ml in points) / var_t
+        intercept = mean_ml - slope * mean_t
+    if slope <= 0:
+        return None
+    return {
+        "flow_ml_per_s": round(slope * 1000, 4),
+        "dead_time_ms": round(max(0.0, -intercept / slope), 1),
+    }
+
+class CalibrationCurve:
+    """Stückweise lineare Abbildung ml -> Dauer aus gemessenen Punkten"""
+
+    def __init__(self, points):
+        # Mehrfachmessungen derselben Dauer mitteln
+        grouped = {}
+        for duration_ms, ml in points:
+            grouped.setdefault(float(duration_ms), []).append(float(ml))
+        measured = sorted((t, sum(mls) / len(mls)) for t, mls in grouped.items())
+
+        self.fit = fit_line(measured)
+        if self.fit is None:
+            raise ValueError("Kalibrierpunkte ergeben keine positive Förderrate")
+        dead_time_ms = min(self.fit["dead_time_ms"], measured[0][0])
+
+        # Stützstellen müssen in ml streng steigen, sonst ist die Umkehrung nicht eindeutig
+        self.knots = [(dead_time_ms, 0.0)]
+        for t, ml in measured:
+            if t > self.knots[-1][0] and ml > self.knots[-1][1]:
+                self.knots.append((t, ml))
+        self.knot_ml = [ml for _, ml in self.knots]
+        self.slope_ml_per_ms = self.fit["flow_ml_per_s"] / 1000
+
+    def duration_ms(self, ml):
+        if ml <= 0:
+            return 0.0
+        last_t, last_ml = self.knots[-1]
+        if ml >= last_ml:
+            return last_t + (ml - last_ml) / self.slope_ml_per_ms
+        i = bisect.bisect_left(self.knot_ml, ml)
+        (t0, ml0), (t1, ml1) = self.knots[i - 1], self.knots[i]
+        return t0 + (ml - ml0) * (t1 - t0) / (ml1 - ml0)
+
+def duration_for(pump_id, ml, flow_rate, table=None):
+    """Dauer in ms für ``ml``: Kalibrierkurve, falls vorhanden, sonst ml / flowRate"""
+    table = load_calibration() if table is None else table
+    entry = table.get(int(pump_id)) if pump_id is not None else None
+    if entry and entry.get("points"):
+        try:
+            return CalibrationCurve(entry["points"]).duration_ms(ml)
+        except ValueError:
+            pass
+    return ml / flow_rate * 1000
+
+def record_point(pump_id, duration_ms, ml, pin=None, path=CALIBRATION_PATH):
+    """Fügt einen Messpunkt hinzu (die ältesten fallen nach MAX_POINTS heraus) und gibt den Fit zurück"""
+    table = dict(load_calibration(path))
+    entry = dict(table.get(pump_id, {"points": []}))
+    if pin is not None:
+        entry["pin"] = pin
+    entry["points"] = (entry.get("points", []) + [[int(duration_ms), float(ml)]])[-MAX_POINTS:]
+    entry["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    table[pump_id] = entry
+    save_calibration(table, path)
+    return {"pump_id": pump_id, **entry, "fit": fit_line(entry["points"])}
+
+def find_pump(pump_id, config_path=PUMP_CONFIG_PATH):
+    with open(config_path, "r") as config_file:
+        for pump in json.load(config_file):
+            if pump["id"] == pump_id:
+                return pump
+    raise ValueError(f"Pumpe mit ID {pump_id} nicht gefunden")
+
+def calibrate(pump_id, durations_ms):
+    """Lässt die Pumpe nacheinander für jede Dauer laufen und fragt die gemessene Menge ab"""
+    import pump_control
+
+    pump = find_pump(pump_id)
+    points = []
+    for duration_ms in durations_ms:
+        input(f"Glas unter Pumpe {pump_id} ({pump['ingredient']}) stellen, Enter für {duration_ms}ms ... ")
+        response = pump_control.send_request({"command": "activate", "pin": pump["pin"], "duration_ms": duration_ms},
+                                             timeout=pump_control.CLIENT_TIMEOUT + duration_ms / 1000)
+        if response is None:
+            pump_control.init_gpio()
+            pump_control.init_journal()
+            pump_control.setup_pin(pump["pin"])
+            try:
+                response = pump_control.activate_pump(pump["pin"], duration_ms)
+            finally:
+                # Relais aus und Pins freigeben, auch bei Abbruch (Strg+C) während der Messung
+                pump_control.GPIO.output(pump["pin"], pump_control.GPIO.HIGH)
+                pump_control.GPIO.cleanup()
+        if not response.get("success", True):
+            # z. B. Pumpe läuft bereits oder muss abkühlen – ohne Lauf keine Messung
+            raise ValueError(response.get("error") or f"Pumpe {pump_id} wurde nicht aktiviert")
+        measured_ms = response.get("measured_ms", duration_ms)
+        ml = float(input("Gemessene Menge in ml: ").replace(",", "."))
+        # Die tatsächlich gemessene Einschaltzeit ist genauer als die angeforderte
+        points.append([round(measured_ms), ml])
+
+    table = dict(load_calibration())
+    table[pump_id] = {"pin": pump["pin"], "points": points, "updated": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    save_calibration(table)
+    return {"pump_id": pump_id, "points": points, "fit": fit_line(points)}
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    command = sys.argv[1]
+    try:
+        if command == "calibrate" and len(sys.argv) >= 4:
+            result = calibrate(int(sys.argv[2]), [int(d) for d in sys.argv[3:]])
+        elif command == "record" and len(sys.argv) in (5, 6):
+            pin = int(sys.argv[5]) if len(sys.argv) == 6 else None
+            result = record_point(int(sys.argv[2]), int(sys.argv[3]), float(sys.argv[4]), pin)
+        elif command == "duration" and len(sys.argv) == 4:
+            pump = find_pump(int(sys.argv[2]))
+            ml = float(sys.argv[3])
+            result = {"pump_id": pump["id"], "ml": ml, "duration_ms": round(duration_for(pump["id"], ml, pump["flowRate"]))}
+        elif command == "show":
+            table = load_calibration()
+            if len(sys.argv) == 3:
+                table = {int(sys.argv[2]): table.get(int(sys.argv[2]), {})}
+            result = {str(pump_id): {**entry, "fit": fit_line(entry.get("points", []))} for pump_id, entry in table.items()}
+        elif command == "reset" and len(sys.argv) == 3:
+            table = dict(load_calibration())
+            table.pop(int(sys.argv[2]), None)
+            save_calibration(table)
+            result = {"pump_id": int(sys.argv[2]), "reset": True}
+        else:
+            print(__doc__)
+            sys.exit(1)
+    except (ValueError, OSError) as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
+
+    print(json.dumps({"success": True, **result}))
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,131 @@
 #!/usr/bin/env python3
-import RPi.GPIO as GPIO
+"""
+pump_control.py — steuert die Pumpen-Relais der Cocktailmaschine
+
+Direkt (ein Prozess pro Dosierung):
+  python3 pump_control.py activate <pin> <duration_ms>
+  python3 pump_control.py plan '[[17, 1200], [18, 800]]'   # alle Relais gemeinsam
+  python3 pump_control.py plan '{"steps": [...]}'          # Zeitleiste, siehe pump_timeline.py
+
+Als residenter Dienst (Pins werden einmal initialisiert und gehalten):
+  python3 pump_control.py serve                  # Unix-Socket (PUMP_SOCKET)
+  python3 pump_control.py serve --stdio          # JSON-Zeilen über stdin/stdout
+
+Läuft der Dienst, leitet die CLI ihre Befehle nur noch an ihn weiter:
+  python3 pump_control.py activate 17 1200
+  python3 pump_control.py plan '[[17, 1200], [18, 800]]'
+  python3 pump_control.py stop [pin]            # Not-Aus, ohne Server direkt über GPIO
+  python3 pump_control.py status
+  python3 pump_control.py timing                 # Dosierfehler min/mean/p99 über alle Läufe
+  python3 pump_control.py levels                 # Füllstände inkl. noch nicht geschriebener Abzüge
+  python3 pump_control.py queue                  # Bestellwarteschlange und Getränke/Stunde
+  python3 pump_control.py confirm                # Glas gewechselt, nächste Bestellung starten
+  python3 pump_control.py metrics                # Zähler/Histogramme im Prometheus-Format
+  python3 pump_control.py duty [--size 300] [--split-mode parallel]
+                                                 # Pumpen-Auslastung und machbare Getränke/Stunde
+  python3 pump_control.py menu [cocktail] [--size 300]
+                                                 # gerade machbare Cocktails (siehe pump_menu.py)
+  python3 pump_control.py forecast [cocktail]   # verbleibende Ausschänke pro Cocktail (pump_forecast.py)
+
+Dosierpläne mit ml-Angaben werden direkt von data/ingredient-levels.json
+abgezogen, sobald das Relais schließt (siehe pump_levels.py).
+"""
+
+import argparse
+import heapq
+import json
+import os
+import select
+import signal
+import socket
+import socketserver
 import sys
+import threading
 import time
 
-# Setze den GPIO-Modus
-GPIO.setmode(GPIO.BCM)
-GPIO.setwarnings(False)
+from pump_calibration import CALIBRATION_PATH, duration_for
+from pump_duty import DutyTracker, forecast, load_duty_config, load_menu
+from pump_gpio import get_backend
+from pump_journal import JOURNAL_PATH, PumpJournal
+from pump_levels import LevelStore
+from pump_menu import MenuIndex, menu_signature
+from pump_metrics import MetricsExporter, PumpMetrics
+from pump_planner import SPLIT_MODES, PlanCache, digest, file_signature, levels_by_pump, load_pump_config, plan_recipe_cached
+from pump_queue import OrderQueue
+from pump_scheduler import POWER_CONFIG_PATH, PowerBudget, load_power_config, schedule_jobs
+from pump_timeline import compile_timeline, wall_ms
+from pump_timing import TimingStats, measurement, sleep_until, summarize
+from pump_trace import process_start, save_trace, start_trace
+
+PUMP_SOCKET_PATH = os.environ.get("PUMP_SOCKET", "/tmp/cocktailbot-pump.sock")
+PUMP_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "pump-config.json")
+CLIENT_TIMEOUT = 5.0  # s, zusätzlich zur Pumpdauer
+
+GPIO = None
+
+def init_gpio(backend=None):
+    # Backend erst bei Bedarf laden, damit der Thin-Client ohne RPi.GPIO auskommt
+    global GPIO
+    if backend is not None:
+        GPIO = backend
+    elif GPIO is None:
+        GPIO = get_backend()
+    return GPIO
+
+JOURNAL = None
+PIN_PUMP_IDS = {}
+
+def init_journal(path=JOURNAL_PATH):
+    # Ringpuffer-Journal aller Aktivierungen (PUMP_JOURNAL="" schaltet es ab)
+    global JOURNAL
+    if JOURNAL is None and path:
+        try:
+            JOURNAL = PumpJournal(path)
+            PIN_PUMP_IDS.update(load_pin_pump_ids())
+        except OSError as e:
+            print(f"Pump-Journal nicht verfügbar: {e}", file=sys.stderr)
+    return JOURNAL
+
+def record_activation(result, on_at, off_at):
+    """Schreibt eine beendete Aktivierung (measurement-dict) ins Journal"""
+    if JOURNAL is None:
+        return
+    # monotone Zeitstempel in Wanduhrzeit umrechnen
+    offset_ns = time.time_ns() - time.monotonic_ns()
+    JOURNAL.append(
+        result["pin"], result["duration_ms"], result["measured_ms"],
+        int(on_at * 1e9) + offset_ns, int(off_at * 1e9) + offset_ns,
+        pump_id=PIN_PUMP_IDS.get(result["pin"], -1), stopped=result["stopped"],
+    )
 
 def setup_pin(pin):
     # Konfiguriere den Pin als Ausgang und setze ihn auf HIGH (Relais aus)
-    GPIO.setup(pin, GPIO.OUT)
-    GPIO.output(pin, GPIO.HIGH)
+    GPIO.setup([pin], GPIO.HIGH)
+
+# Abbruch im lokalen Betrieb ohne Server: SIGTERM/SIGINT/SIGHUP schalten die Relais
+# noch im Signal-Handler ab und wecken die Zeitschleife, statt den Prozess mit
+# eingeschalteten Pumpen zu beenden
+CANCEL = threading.Event()
+CANCELLED_PINS = set()
+
+def install_stop_handlers(pins):
+    def handle(signum, frame):
+        # Setze alle Pins sofort auf HIGH (Relais aus)
+        GPIO.output_many(pins, GPIO.HIGH)
+        CANCELLED_PINS.update(pins)
+        CANCEL.set()
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, handle)
 
 def activate_pump(pin, duration_ms):
     try:
-        # Setze den Pin auf LOW (Relais an)
-        GPIO.output(pin, GPIO.LOW)
+        # Setze den Pin auf LOW (Relais an) und warte bis zur Deadline oder zum Abbruch
         print(f"Pumpe an Pin {pin} aktiviert für {duration_ms}ms")
-        
-        # Warte für die angegebene Dauer
-        time.sleep(duration_ms / 1000)
-        
-        # Setze den Pin zurück auf HIGH (Relais aus)
-        GPIO.output(pin, GPIO.HIGH)
-        print(f"Pumpe an Pin {pin} deaktiviert")
-        
+        response = run_plan([(pin, duration_ms)], wake=CANCEL, stopped_pins=CANCELLED_PINS)
+        result = {key: response["pumps"][0][key] for key in ("pin", "duration_ms", "measured_ms", "error_ms", "stopped")}
+        print(f"Pumpe an Pin {pin} deaktiviert nach {result['measured_ms']}ms")
+        return result
+
     except Exception as e:
         print(f"Fehler: {e}")
         # Stelle sicher, dass der Pin auf HIGH gesetzt wird, auch wenn ein Fehler auftritt
@@ -32,23 +133,855 @@ def activate_pump(pin, duration_ms):
         GPIO.cleanup()
         sys.exit(1)
 
+def load_pin_pump_ids(config_path=PUMP_CONFIG_PATH):
+    """pin -> Pumpen-ID aus data/pump-config.json"""
+    try:
+        with open(config_path, "r") as config_file:
+            return {int(pump["pin"]): int(pump["id"]) for pump in json.load(config_file)}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+def load_configured_pins(config_path=PUMP_CONFIG_PATH):
+    """Liest die Pins aus data/pump-config.json (leer, wenn keine Konfiguration existiert)"""
+    try:
+        with open(config_path, "r") as config_file:
+            return sorted({int(pump["pin"]) for pump in json.load(config_file)})
+    except (OSError, ValueError, KeyError, TypeError):
+        return []
+
+def parse_plan(raw_plan, doses=None):
+    """Wandelt [[pin, ms], ...] bzw. [{"pin": .., "duration_ms": ..}, ...] in [(pin, ms), ...] um
+
+    Einträge der Form {"pin", "pump_id", "ml", "flow_rate"} werden über die
+    Kalibrierkurve der Pumpe (Fallback: ml / flow_rate) in eine Dauer umgerechnet;
+    ist ``doses`` ein dict, landet dort pin -> (pump_id, ml) für die Füllstände.
+    Impulsmuster kennt nur die Zeitleiste (prepare_plan leitet solche Pläne dorthin).
+    """
+    if isinstance(raw_plan, str):
+        raw_plan = json.loads(raw_plan)
+    plan = []
+    for entry in raw_plan:
+        if isinstance(entry, dict) and entry.get("pulse"):
+            raise ValueError(f"Impulsmuster an Pin {entry.get('pin')} nur in einer Zeitleiste möglich")
+        if isinstance(entry, dict) and "ml" in entry:
+            pin = entry["pin"]
+            duration_ms = duration_for(entry.get("pump_id"), float(entry["ml"]), float(entry["flow_rate"]))
+            if doses is not None and entry.get("pump_id") is not None:
+                doses[int(pin)] = (int(entry["pump_id"]), float(entry["ml"]))
+        elif isinstance(entry, dict):
+            pin, duration_ms = entry["pin"], entry["duration_ms"]
+        else:
+            pin, duration_ms = entry
+        plan.append((int(pin), int(round(float(duration_ms)))))
+    pins = [pin for pin, _ in plan]
+    if len(pins) != len(set(pins)):
+        raise ValueError("Jeder Pin darf im Dosierplan nur einmal vorkommen")
+    return plan
+
+def positive_size(size):
+    size = float(size)
+    if size <= 0:
+        raise ValueError(f"size muss größer als 0 sein, nicht {size}")
+    return size
+
+def prepare_plan(raw_plan, doses=None, limits=None):
+    """Dosierplan oder Zeitleiste ({"steps": [...]}) -> {"schedule", "planned_total_ms", "lower_bound_ms"}"""
+    if isinstance(raw_plan, str):
+        raw_plan = json.loads(raw_plan)
+    if isinstance(raw_plan, dict):
+        return compile_timeline(raw_plan, doses, limits)
+    if any(isinstance(entry, dict) and entry.get("pulse") for entry in raw_plan):
+        # Liste mit Impulsmustern = Zeitleiste, in der alle Schritte ab Planstart bereit sind
+        return compile_timeline({"steps": raw_plan}, doses, limits)
+    # Strom-/Parallelitätsgrenzen aus data/pump-power.json, pro Anfrage überschreibbar
+    return schedule_jobs(parse_plan(raw_plan, doses), **(load_power_config() if limits is None else limits))
+
+def level_charger(levels, doses, trace=None):
+    """Callback für run_schedule: zieht die Dosis ab, sobald das Relais schließt
+
+    Vorzeitig gestoppte Pumpen werden anteilig (gemessene / geplante Zeit) belastet.
+    """
+    def charge(result):
+        dose = doses.get(result["pin"])
+        if dose is None:
+            return
+        pump_id, ml = dose
+        if result["stopped"] and result["duration_ms"]:
+            ml *= min(1.0, result["measured_ms"] / result["duration_ms"])
+        if trace is None:
+            levels.consume(pump_id, ml)
+            return
+        with trace.span("Füllstand verbuchen", "levels", pump_id=pump_id, ml=round(ml, 1)):
+            levels.consume(pump_id, ml)
+    return charge
+
+def run_plan(plan, wake=None, stopped_pins=()):
+    """Schaltet alle Relais gemeinsam ein und jedes zu seiner eigenen Deadline wieder aus"""
+    return run_schedule([(pin, 0, duration_ms) for pin, duration_ms in plan], wake, stopped_pins)
+
+def run_schedule(schedule, wake=None, stopped_pins=(), on_finished=None, trace=None,
+                 limits=None, clock=None):
+    """Führt [(pin, start_ms, duration_ms[, pulse]), ...] gegen eine gemeinsame monotone Uhr aus
+
+    Pins mit gleichem Schaltzeitpunkt werden mit einem Aufruf geschaltet, jede
+    Abschalt-Deadline hängt am tatsächlichen Einschaltzeitpunkt des Pins. Mit
+    ``pulse`` = (on_ms, off_ms) wird die Einschaltzeit in Impulse mit Pausen
+    aufgeteilt (siehe pump_timeline.py). Mit ``wake`` und ``stopped_pins`` kann
+    ein anderer Thread Pins vorzeitig beenden. ``on_finished`` wird mit dem
+    measurement-dict jedes gelaufenen Pins aufgerufen. Mit ``trace`` (pump_trace.Trace)
+    wird jede Einschaltphase als Span festgehalten.
+
+    ``limits`` (Keyword-Argumente von schedule_jobs) macht ``start_ms`` zum
+    frühesten Start: ein fälliger Pin wartet, bis laufende Pumpen ihr Budget
+    tatsächlich freigegeben haben. Impulszüge halten ihr Budget auch in den Pausen.
+    In ``clock`` (dict) steht pin -> (Einschaltzeit in s, Beginn des laufenden Impulses oder None).
+    """
+    requested = {entry[0]: entry[2] for entry in schedule}
+    pulses = {entry[0]: tuple(entry[3]) for entry in schedule if len(entry) > 3 and entry[3]}
+    budget = PowerBudget(**limits) if limits else None
+    dispatch = time.monotonic()
+    # Heap aus (deadline, order, pin): order 0 = aus, 1 = an – zum selben Zeitpunkt
+    # wird zuerst abgeschaltet, damit frei gewordenes Budget sofort weitergegeben wird
+    events = [(dispatch + entry[1] / 1000, 1, entry[0]) for entry in schedule]
+    heapq.heapify(events)
+    # fällige Pins, die noch auf Budget warten – in Planreihenfolge
+    plan_order = {entry[0]: index for index, entry in enumerate(sorted(schedule, key=lambda entry: entry[1]))}
+    held = []
+    on_at = {}     # erster Einschaltzeitpunkt
+    on_since = {}  # Beginn des laufenden Impulses
+    on_time = {}   # bisherige Einschaltzeit in s (Summe aller Impulse)
+    off_at = {}    # letzter Ausschaltzeitpunkt
+    clock = {} if clock is None else clock
+    intervals = [] if trace is not None else None
+    results = {}
+
+    def relays_off(pins):
+        # Setze die Pins zurück auf HIGH (Relais aus)
+        running = [pin for pin in pins if pin in on_since]
+        if running:
+            GPIO.output_many(running, GPIO.HIGH)
+        now = time.monotonic()
+        for pin in running:
+            if intervals is not None:
+                intervals.append((pin, on_since[pin], now))
+            on_time[pin] += now - on_since.pop(pin)
+            off_at[pin] = now
+            clock[pin] = (on_time[pin], None)
+        return now
+
+    def relays_on(pins):
+        # Setze alle Pins mit einem Aufruf auf LOW (Relais an)
+        GPIO.output_many(pins, GPIO.LOW)
+        started = time.monotonic()
+        for pin in pins:
+            on_at.setdefault(pin, started)
+            on_since[pin] = started
+            remaining_ms = requested[pin] - on_time.setdefault(pin, 0.0) * 1000
+            clock[pin] = (on_time[pin], started)
+            if pin in pulses:
+                remaining_ms = min(remaining_ms, pulses[pin][0])
+            heapq.heappush(events, (started + remaining_ms / 1000, 0, pin))
+
+    def start_held():
+        # Erst einschalten, wenn das Budget wirklich frei ist – nicht nach dem Plan,
+        # denn die Abschalt-Deadlines hängen am tatsächlichen Einschalten
+        startable = []
+        for pin in sorted(held, key=plan_order.get):
+            if budget is None or not budget.running or budget.fits(pin):
+                if budget is not None:
+                    budget.acquire(pin)
+                startable.append(pin)
+                held.remove(pin)
+        if startable:
+            relays_on(startable)
+
+    def finish(pins, stopped=False):
+        pins = [pin for pin in pins if pin not in results]
+        now = relays_off(pins)
+        for pin in pins:
+            if pin in held:
+                held.remove(pin)
+            if budget is not None:
+                budget.release(pin)
+            if pin not in on_at:
+                results[pin] = measurement(pin, requested[pin], now, now, stopped)
+                continue
+            results[pin] = measurement(pin, requested[pin], 0.0, on_time[pin], stopped)
+            record_activation(results[pin], on_at[pin], off_at[pin])
+            if on_finished is not None:
+                on_finished(results[pin])
+
+    try:
+        while events:
+            if sleep_until(events[0][0], wake):
+                wake.clear()
+                finish([pin for pin in stopped_pins if pin in requested], stopped=True)
+                # Deadlines gestoppter Pins verwerfen, damit der Plan nicht auf sie wartet
+                events[:] = [event for event in events if event[2] not in results]
+                heapq.heapify(events)
+                start_held()
+                continue
+            now = time.monotonic()
+            due_off, due_on = [], []
+            while events and events[0][0] <= now:
+                _, order, pin = heapq.heappop(events)
+                if pin not in results:
+                    (due_on if order else due_off).append(pin)
+            if due_off:
+                pause_from = relays_off(due_off)
+                done = []
+                for pin in due_off:
+                    # Impulszug: nach der Pause den nächsten Impuls einplanen
+                    if pin in pulses and requested[pin] - on_time[pin] * 1000 > 0.5:
+                        heapq.heappush(events, (pause_from + pulses[pin][1] / 1000, 1, pin))
+                    else:
+                        done.append(pin)
+                finish(done)
+            # Nächster Impuls eines laufenden Impulszugs: dessen Budget ist noch belegt
+            resumed = [pin for pin in due_on if pin in on_at]
+            if resumed:
+                relays_on(resumed)
+            held.extend(pin for pin in due_on if pin not in on_at)
+            if held:
+                start_held()
+    finally:
+        # Stelle sicher, dass kein Relais an bleibt, auch wenn ein Fehler auftritt
+        finish(list(requested))
+        if trace is not None:
+            trace.complete("Zeitleiste", "plan", dispatch, time.monotonic(), args={"pins": sorted(requested)})
+            trace.relays(intervals)
+
+    pumps = []
+    for entry in schedule:
+        pin = entry[0]
+        pump = dict(results[pin], start_ms=entry[1])
+        if pin in on_at:
+            pump["started_ms"] = round((on_at[pin] - dispatch) * 1000, 3)
+        if pin in pulses:
+            pump["pulse"] = {"on_ms": pulses[pin][0], "off_ms": pulses[pin][1]}
+        pumps.append(pump)
+    return {
+        "success": True,
+        "dispatch_ms": round((min(on_at.values(), default=dispatch) - dispatch) * 1000, 3),
+        "planned_total_ms": max((entry[1] + wall_ms(entry[2], pulses.get(entry[0])) for entry in schedule), default=0),
+        "achieved_total_ms": round((max(off_at.values(), default=dispatch) - dispatch) * 1000, 3),
+        "pumps": pumps,
+        "timing": summarize([pump["error_ms"] for pump in pumps if not pump["stopped"]]),
+    }
+
+class PumpServer:
+    """Hält die GPIO-Pins dauerhaft und führt Aktivierungen nebenläufig aus"""
+
+    def __init__(self, pins=None, backend=None, journal_path=JOURNAL_PATH, levels=None):
+        init_gpio(backend)
+        init_journal(journal_path)
+        # Füllstände im Speicher, geschrieben wird gebündelt im Hintergrund
+        self.levels = levels if levels is not None else LevelStore()
+        self.queue = OrderQueue(self)
+        self.lock = threading.Lock()
+        self.configured_pins = set()
+        self.timing = TimingStats()
+        # Prometheus-Metriken, nur nach jedem Plan aktualisiert (siehe pump_metrics.py)
+        self.pump_ids = load_pin_pump_ids()
+        self.metrics = PumpMetrics(self.pump_ids, self.queue.depth)
+        try:
+            self.exporter = MetricsExporter(self.metrics)
+        except OSError as e:
+            # z. B. Port belegt – die Pumpen laufen auch ohne Metriken
+            print(f"Metriken-Export nicht verfügbar: {e}", file=sys.stderr)
+            self.exporter = None
+        # Wärmemodell pro Pumpe gegen Überhitzen im Dauerbetrieb (data/pump-duty.json)
+        self.duty = DutyTracker(**load_duty_config())
+        # Machbare Cocktails per Bitmaske, inkrementell nachgeführt (siehe pump_menu.py)
+        self.menu = None
+        self.menu_signature = None
+        self.menu_lock = threading.Lock()
+        # Stammgetränke starten ohne Planungsarbeit: Rezeptverteilung und vorbereitete Pläne im LRU-Cache
+        self.recipe_cache = PlanCache()
+        self.prepare_cache = PlanCache()
+        self.forecast = None
+        self.forecast_signature = None
+        # pin -> {"started": monotonic, "duration_ms": int, "wake": Event, "stopped": set, "clock": dict}
+        self.active = {}
+        # Threads, deren Client die Verbindung geschlossen hat (siehe _RequestHandler)
+        self.abandoned = set()
+        pins = pins if pins is not None else load_configured_pins()
+        if pins:
+            GPIO.setup(pins, GPIO.HIGH)
+            self.configured_pins.update(pins)
+        print(f"Pump-Server bereit, Pins: {sorted(self.configured_pins)}", file=sys.stderr)
+
+    def ensure_pin(self, pin):
+        if pin not in self.configured_pins:
+            setup_pin(pin)
+            self.configured_pins.add(pin)
+
+    def activate(self, pin, duration_ms, received_at=None):
+        response = self.dispense([(pin, duration_ms)], received_at=received_at)
+        if not response.get("success"):
+            return response
+        return {"success": True, **response["pumps"][0]}
+
+    def prepare(self, raw_plan, limits=None, trace=None):
+        """Rechnet einen Dosierplan vorab durch (Kalibrierkurve, Strombudget) – ohne GPIO
+
+        Das Ergebnis kommt aus dem Cache, solange Plan, Grenzen, Kalibrierung und
+        data/pump-power.json gleich bleiben; es darf nicht verändert werden.
+        """
+        def compute():
+            doses = {}
+            power_limits = {**load_power_config(), **(limits or {})}
+            planned = prepare_plan(raw_plan, doses, power_limits)
+            return {**planned, "doses": doses, "limits": power_limits}
+
+        started = time.monotonic()
+        signature = (file_signature(CALIBRATION_PATH), file_signature(POWER_CONFIG_PATH))
+        planned, cached = self.prepare_cache.get(signature, digest([raw_plan, limits or {}]), compute)
+        if trace is not None:
+            trace.complete("Plan berechnen", "plan", started, time.monotonic(),
+                           args={"pumps": len(planned["schedule"]), "cached": cached})
+        return planned
+
+    def dispense(self, plan, limits=None, doses=None, received_at=None):
+        power_limits = {**load_power_config(), **(limits or {})}
+        planned = schedule_jobs(plan, **power_limits)
+        return self.run_prepared({**planned, "doses": doses, "limits": power_limits}, received_at)
+
+    def run_prepared(self, planned, received_at=None, trace=None):
+        """Führt einen mit prepare() bzw. schedule_jobs() vorbereiteten Plan aus
+
+        ``received_at`` (monoton) ist der Eingang der Anfrage – für die Latenz bis zum ersten Relais.
+        """
+        doses = planned.get("doses")
+        pins = [entry[0] for entry in planned["schedule"]]
+        # Heiße Pumpen: sofort ablehnen statt im Server zu warten – kein Client-Timeout
+        # rechnet mit der Abkühlzeit; die Bestellwarteschlange wartet sie selbst ab
+        cooldown_s = self.cooldown_s(planned)
+        if cooldown_s > 0:
+            self.metrics.record_failure()
+            return {
+                "success": False,
+                "error": f"Pumpen müssen noch {cooldown_s:.0f} s abkühlen",
+                "cooldown_ms": round(cooldown_s * 1000),
+            }
+        # Ein gemeinsames Wake-Event pro Plan, damit "stop" die Zeitschleife sofort weckt
+        wake = threading.Event()
+        stopped_pins = set()
+        clock = {}
+        owner = threading.get_ident()
+        with self.lock:
+            if owner in self.abandoned:
+                return {"success": False, "error": "Client hat die Verbindung geschlossen"}
+            busy = [pin for pin in pins if pin in self.active]
+            if busy:
+                self.metrics.record_failure()
+                return {"success": False, "error": f"Pumpen an Pin {busy} laufen bereits"}
+            now = time.monotonic()
+            for pin, start_ms, duration_ms, *_ in planned["schedule"]:
+                self.ensure_pin(pin)
+                self.active[pin] = {"started": now + start_ms / 1000, "duration_ms": duration_ms,
+                                    "wake": wake, "stopped": stopped_pins, "clock": clock, "owner": owner}
+        try:
+            on_finished = level_charger(self.levels, doses, trace) if doses else None
+            scheduled_at = time.monotonic()
+            result = run_schedule(planned["schedule"], wake=wake, stopped_pins=stopped_pins,
+                                  on_finished=on_finished, trace=trace, limits=planned.get("limits"), clock=clock)
+            result["lower_bound_ms"] = planned["lower_bound_ms"]
+            result["levels_accounted"] = bool(doses) and self.levels.available
+            self.timing.record(result["pumps"])
+            for pump in result["pumps"]:
+                if "started_ms" in pump and pump["pin"] in self.pump_ids:
+                    self.duty.record(self.pump_ids[pump["pin"]], pump["measured_ms"] / 1000)
+            latency_s = None
+            if received_at is not None and any("started_ms" in pump for pump in result["pumps"]):
+                latency_s = scheduled_at - received_at + result["dispatch_ms"] / 1000
+            self.metrics.record_plan(result, latency_s)
+            return result
+        finally:
+            with self.lock:
+                for pin in pins:
+                    self.active.pop(pin, None)
+
+    def missing_ml(self, stages):
+        """Fehlmenge pro Pumpe, wenn die Füllstände für die vorbereiteten Pläne nicht reichen"""
+        if not self.levels.available:
+            return {}
+        levels = levels_by_pump(self.levels.snapshot())
+        needed = {}
+        for stage in stages:
+            for pump_id, ml in (stage.get("doses") or {}).values():
+                needed[pump_id] = needed.get(pump_id, 0) + ml
+        missing = {pump_id: round(ml - levels[pump_id], 1) for pump_id, ml in needed.items() if pump_id in levels}
+        return {pump_id: ml for pump_id, ml in missing.items() if ml > 0}
+
+    def abandon(self, owner):
+        """Client des Threads ``owner`` ist weg: dessen Plan stoppen bzw. gar nicht erst starten"""
+        with self.lock:
+            self.abandoned.add(owner)
+            pins = [pin for pin, entry in self.active.items() if entry["owner"] == owner]
+        for pin in pins:
+            self.stop(pin)
+        if pins:
+            print(f"Client getrennt, Pumpen an Pin {pins} gestoppt", file=sys.stderr)
+
+    def release(self, owner):
+        with self.lock:
+            self.abandoned.discard(owner)
+
+    def duty_headroom(self):
+        """{pump_id: s} noch erlaubte Einschaltzeit für pump_planner, None ohne Begrenzung"""
+        if not self.duty.enabled:
+            return None
+        return {pump_id: self.duty.headroom_s(pump_id) for pump_id in set(self.pump_ids.values())}
+
+    def cooldown_s(self, planned):
+        """Wartezeit, bis alle Pumpen des Plans ihre Einschaltzeit innerhalb der Grenze schaffen"""
+        if not self.duty.enabled:
+            return 0.0
+        return max((
+            self.duty.cooldown_s(self.pump_ids[pin], duration_ms / 1000)
+            for pin, _, duration_ms, *_ in planned["schedule"] if pin in self.pump_ids
+        ), default=0.0)
+
+    def menu_index(self):
+        """MenuIndex mit aktuellen Pumpen und Füllständen; neu aufgebaut nur, wenn sich die Karte ändert"""
+        signature = menu_signature()
+        if self.menu is None or signature != self.menu_signature:
+            self.menu = MenuIndex(load_menu(), load_pump_config(), self.levels.snapshot())
+            self.menu_signature = signature
+        else:
+            self.menu.update_pumps(load_pump_config())
+            self.menu.update_levels(self.levels.snapshot())
+        return self.menu
+
+    def pour_forecast(self, cocktail_id=None):
+        """Verbleibende Ausschänke pro Cocktail und Größe gegen die Füllstände im Speicher"""
+        # NumPy erst bei Bedarf laden, die Dosierpfade brauchen es nicht
+        from pump_forecast import build_forecast, forecast_signature
+        signature = forecast_signature()
+        if self.forecast is None or signature != self.forecast_signature:
+            self.forecast = build_forecast()
+            self.forecast_signature = signature
+        return self.forecast.report(self.levels.snapshot(), cocktail_id)
+
+    def run_traced(self, request, limits, received_at):
+        """Dosierplan einer Anfrage ausführen, mit PUMP_TRACE_DIR als Trace-Datei pro Plan"""
+        trace = start_trace(request.get("trace") or "plan", self.pump_ids)
+        if trace is None:
+            return self.run_prepared(self.prepare(request["plan"], limits), received_at)
+        if request.get("spawned_at") is not None:
+            # CLI-Prozess, der die Anfrage weitergeleitet hat (gleiche monotone Uhr)
+            trace.complete("Prozessstart (CLI)", "process", float(request["spawned_at"]), received_at)
+        try:
+            result = self.run_prepared(self.prepare(request["plan"], limits, trace), received_at, trace)
+        finally:
+            path = save_trace(trace)
+        return dict(result, trace=path) if path else result
+
+    def stop(self, pin=None):
+        """Schaltet laufende Pumpen sofort ab; die Dosier-Threads werden nur noch geweckt"""
+        requested_at = time.monotonic()
+        with self.lock:
+            pins = [pin] if pin is not None else list(self.active)
+            stopped = [p for p in pins if p in self.active]
+            if stopped:
+                # Setze alle betroffenen Pins mit einem Aufruf auf HIGH (Relais aus)
+                GPIO.output_many(stopped, GPIO.HIGH)
+            off_at = time.monotonic()
+            ran_ms = {}
+            for p in stopped:
+                entry = self.active[p]
+                entry["stopped"].add(p)
+                entry["wake"].set()
+                # Einschaltzeit aller Impulse, ohne Pausen und ohne noch nicht gestartete Zeit
+                on_time, on_since = entry["clock"].get(p, (0.0, None))
+                if on_since is not None:
+                    on_time += off_at - on_since
+                ran_ms[str(p)] = round(on_time * 1000, 1)
+        return {
+            "success": True,
+            "stopped": stopped,
+            "ran_ms": ran_ms,
+            "latency_ms": round((off_at - requested_at) * 1000, 3),
+        }
+
+    def status(self):
+        now = time.monotonic()
+        with self.lock:
+            active = [
+                {
+                    "pin": pin,
+                    "duration_ms": entry["duration_ms"],
+                    "elapsed_ms": round((now - entry["started"]) * 1000, 1),
+                }
+                for pin, entry in sorted(self.active.items())
+            ]
+            pins = sorted(self.configured_pins)
+        return {
+            "success": True,
+            "pins": pins,
+            "active": active,
+            "timing": self.timing.summary(),
+            "plan_cache": {"recipes": self.recipe_cache.stats(), "prepared": self.prepare_cache.stats()},
+        }
+
+    def handle_request(self, request):
+        received_at = time.monotonic()
+        try:
+            command = request.get("command")
+            if command == "activate":
+                return self.activate(int(request["pin"]), int(request["duration_ms"]), received_at)
+            if command == "plan":
+                limits = {key: request[key] for key in ("max_simultaneous", "current_budget_amps") if key in request}
+                if request.get("dry_run"):
+                    # nur durchrechnen: Gesamtdauer inkl. Strombudget, z. B. für das Client-Timeout
+                    planned = self.prepare(request["plan"], limits)
+                    return {"success": True, "planned_total_ms": planned["planned_total_ms"],
+                            "lower_bound_ms": planned["lower_bound_ms"]}
+                return self.run_traced(request, limits, received_at)
+            if command == "plan_recipe":
+                # Ohne mitgeschickte Füllstände gelten die des Servers (inkl. noch nicht geschriebener Abzüge)
+                levels = request.get("levels")
+                if levels is None and self.levels.available:
+                    levels = self.levels.snapshot()
+                planned, cached = plan_recipe_cached(
+                    self.recipe_cache, request["recipe"], request.get("size", 300),
+                    request.get("pumps") or load_pump_config(),
+                    levels_by_pump(levels) if levels is not None else None, request.get("split_mode"),
+                    self.duty_headroom(), request.get("cocktail_id"),
+                )
+                return {"success": True, **planned, "cached": cached}
+            if command == "enqueue":
+                return self.queue.enqueue(
+                    request.get("name"), request["plan"], request.get("delayed"),
+                    request.get("delay_ms", 0), request.get("order_id"),
+                )
+            if command == "confirm":
+                return self.queue.confirm()
+            if command == "cancel":
+                return self.queue.cancel(request.get("order_id"))
+            if command == "queue":
+                return self.queue.status()
+            if command == "stop":
+                pin = request.get("pin")
+                return self.stop(int(pin) if pin is not None else None)
+            if command == "status":
+                return self.status()
+            if command == "timing":
+                return {"success": True, "timing": self.timing.summary()}
+            if command == "menu":
+                size = positive_size(request.get("size", 300))
+                # eigenes Lock, damit "stop" nie auf den Indexaufbau wartet
+                with self.menu_lock:
+                    menu = self.menu_index()
+                    if request.get("cocktail"):
+                        return {"success": True, **menu.check(request["cocktail"], size)}
+                    return {"success": True, "size": size, "pourable": menu.pourable(size)}
+            if command == "forecast":
+                with self.menu_lock:
+                    return {"success": True, "forecast": self.pour_forecast(request.get("cocktail"))}
+            if command == "duty":
+                size = positive_size(request.get("size", 300))
+                sustainable = forecast(load_menu(), load_pump_config(), size, split_mode=request.get("split_mode"))
+                return {"success": True, **self.duty.status(), "forecast": sustainable}
+            if command == "metrics":
+                return {"success": True, "metrics": self.metrics.render()}
+            if command == "levels":
+                # "flush": offene Abzüge sofort schreiben, bevor die App die Datei liest oder ändert
+                flushed = self.levels.flush() if request.get("flush") else False
+                return {"success": True, "flushed": flushed, "levels": self.levels.snapshot()}
+            return {"success": False, "error": f"Unbekannter Befehl: {command}"}
+        except (KeyError, TypeError, ValueError) as e:
+            return {"success": False, "error": f"Ungültige Anfrage: {e}"}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def shutdown(self):
+        self.queue.close()
+        self.stop()
+        if self.exporter is not None:
+            self.exporter.close()
+        with self.lock:
+            GPIO.output_many(sorted(self.configured_pins), GPIO.HIGH)
+        GPIO.cleanup()
+        self.levels.close()
+        if JOURNAL is not None:
+            JOURNAL.close()
+
+def _respond(server, line):
+    try:
+        request = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {"success": False, "error": f"Ungültiges JSON: {e}"}
+    response = server.handle_request(request)
+    if isinstance(request, dict) and "id" in request:
+        response["id"] = request["id"]
+    return response
+
+def _watch_client(sock, finished, on_gone):
+    """Ruft ``on_gone`` auf, wenn der Client die Verbindung schließt, bevor ``finished`` gesetzt ist"""
+    while not finished.is_set():
+        readable, _, _ = select.select([sock], [], [], 0.2)
+        if not readable:
+            continue
+        try:
+            data = sock.recv(1, socket.MSG_PEEK)
+        except OSError:
+            data = b""
+        if not data:
+            on_gone()
+        # sonst wartet schon die nächste Anfrage – der Client ist noch da
+        return
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server.pump_server
+        owner = threading.get_ident()
+        for raw_line in self.rfile:
+            line = raw_line.decode().strip()
+            if not line:
+                continue
+            # Ein Plan, dessen Client aufgibt (Timeout, Abbruch), soll nicht weiterlaufen
+            finished = threading.Event()
+            watcher = threading.Thread(target=_watch_client, args=(self.connection, finished, lambda: server.abandon(owner)),
+                                       daemon=True)
+            watcher.start()
+            try:
+                response = _respond(server, line)
+            finally:
+                finished.set()
+                watcher.join()
+                server.release(owner)
+            try:
+                self.wfile.write((json.dumps(response) + "\n").encode())
+                self.wfile.flush()
+            except OSError:
+                return
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve_socket(server, socket_path=PUMP_SOCKET_PATH):
+    """Nimmt JSON-Zeilen über einen Unix-Socket entgegen (eine Verbindung pro Client)"""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with _UnixServer(socket_path, _RequestHandler) as unix_server:
+        unix_server.pump_server = server
+        os.chmod(socket_path, 0o660)
+        print(f"Pump-Server lauscht auf {socket_path}", file=sys.stderr)
+        try:
+            unix_server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+def serve_stdio(server):
+    """Nimmt JSON-Zeilen über stdin entgegen; jede Anfrage läuft in einem eigenen Thread"""
+    write_lock = threading.Lock()
+
+    def worker(line):
+        response = _respond(server, line)
+        with write_lock:
+            sys.stdout.write(json.dumps(response) + "\n")
+            sys.stdout.flush()
+
+    workers = []
+    for raw_line in sys.stdin:
+        line = raw_line.strip()
+        if line:
+            thread = threading.Thread(target=worker, args=(line,), daemon=True)
+            thread.start()
+            workers.append(thread)
+            workers = [t for t in workers if t.is_alive()]
+    # Laufende Dosierungen bei EOF noch sauber zu Ende bringen
+    for thread in workers:
+        thread.join()
+
+def send_request(request, socket_path=PUMP_SOCKET_PATH, timeout=CLIENT_TIMEOUT):
+    """Schickt eine Anfrage an den laufenden Pump-Server; None, wenn keiner läuft
+
+    Antwortet ein laufender Server nicht (Timeout, Verbindung halb geschlossen),
+    kommt ein Fehler mit "no_response" zurück – kein None, denn der Server kann
+    die Pins noch ansteuern und darf nicht durch eine lokale Dosierung ersetzt werden.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(socket_path)
+            client.sendall((json.dumps(request) + "\n").encode())
+            with client.makefile("r") as reader:
+                return json.loads(reader.readline())
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    except (OSError, ValueError) as e:
+        # socket.timeout ist ein OSError, eine leere Antwortzeile ein JSONDecodeError (ValueError)
+        return {"success": False, "error": f"Pump-Server antwortet nicht: {e or 'keine Antwort'}", "no_response": True}
+
+def run_server(argv):
+    # systemd beendet mit SIGTERM – über SystemExit laufen die finally-Blöcke
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server = PumpServer()
+    try:
+        if "--stdio" in argv:
+            serve_stdio(server)
+        else:
+            socket_path = argv[argv.index("--socket") + 1] if "--socket" in argv else PUMP_SOCKET_PATH
+            serve_socket(server, socket_path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+def emergency_stop(pin=None):
+    """Not-Aus ohne Server: setzt die Pins direkt auf HIGH, auch wenn ein anderer Prozess dosiert"""
+    init_gpio()
+    pins = [pin] if pin is not None else load_configured_pins()
+    if pins:
+        GPIO.setup(pins, GPIO.HIGH)
+    return {"success": True, "stopped": pins, "direct": True}
+
+def parse_query(command, argv):
+    """Anfrage für "menu", "forecast" und "duty" aus den übrigen Argumenten"""
+    parser = argparse.ArgumentParser(prog=f"pump_control.py {command}")
+    if command in ("menu", "forecast"):
+        parser.add_argument("cocktail", nargs="?", default=None, help="Cocktail-ID")
+    if command in ("menu", "duty"):
+        parser.add_argument("--size", type=float, default=300, help="Glasgröße in ml")
+    if command == "duty":
+        parser.add_argument("--split-mode", choices=SPLIT_MODES, default=None)
+    args = parser.parse_args(argv)
+    if getattr(args, "size", 300) <= 0:
+        parser.error("--size muss größer als 0 sein")
+    return {"command": command, **{key: value for key, value in vars(args).items() if value is not None}}
+
+def run_plan_command(raw_plan):
+    """Führt einen ganzen Dosierplan in einem Aufruf aus (über den Pump-Server, falls er läuft)"""
+    doses = {}
+    spawned_at = process_start()
+    trace = start_trace("plan", load_pin_pump_ids())
+    try:
+        raw_plan = json.loads(raw_plan) if isinstance(raw_plan, str) else raw_plan
+        started = time.monotonic()
+        limits = load_power_config()
+        planned = prepare_plan(raw_plan, doses, limits)
+    except (ValueError, KeyError, TypeError) as e:
+        print(json.dumps({"success": False, "error": f"Ungültiger Dosierplan: {e}"}))
+        sys.exit(1)
+
+    # Ursprüngliche Einträge weiterreichen, damit der Server die ml-Angaben verbuchen kann;
+    # mit spawned_at nimmt der Server den Start dieses Prozesses in seinen Trace auf
+    request = {"command": "plan", "plan": raw_plan}
+    if trace is not None and spawned_at is not None:
+        request["spawned_at"] = spawned_at
+    response = send_request(request, timeout=CLIENT_TIMEOUT + planned["planned_total_ms"] / 1000)
+    if response is None and trace is not None:
+        if spawned_at is not None:
+            trace.complete("Prozessstart", "process", spawned_at, started)
+        trace.complete("Plan berechnen", "plan", started, time.monotonic(), args={"pumps": len(planned["schedule"])})
+    if response is None:
+        init_gpio()
+        init_journal()
+        levels = LevelStore(background=False) if doses else None
+        pins = [entry[0] for entry in planned["schedule"]]
+        for pin in pins:
+            setup_pin(pin)
+        install_stop_handlers(pins)
+        try:
+            on_finished = level_charger(levels, doses, trace) if levels is not None else None
+            response = run_schedule(planned["schedule"], wake=CANCEL, stopped_pins=CANCELLED_PINS,
+                                    on_finished=on_finished, trace=trace, limits=limits)
+            response["lower_bound_ms"] = planned["lower_bound_ms"]
+            response["levels_accounted"] = levels is not None and levels.available
+        finally:
+            # Bereinige die GPIO-Pins
+            GPIO.cleanup()
+            if levels is not None:
+                if trace is None:
+                    levels.close()
+                else:
+                    with trace.span("Füllstände schreiben", "levels"):
+                        levels.close()
+        path = save_trace(trace)
+        if path:
+            response["trace"] = path
+
+    print(json.dumps(response))
+    if not response.get("success"):
+        sys.exit(1)
+
 def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == "serve":
+        run_server(sys.argv[2:])
+        return
+
+    if len(sys.argv) == 2 and sys.argv[1] == "metrics":
+        response = send_request({"command": "metrics"})
+        if response is None:
+            print(json.dumps({"success": False, "error": "Pump-Server läuft nicht"}))
+            sys.exit(1)
+        if not response.get("success"):
+            print(json.dumps(response))
+            sys.exit(1)
+        # Prometheus-Textformat unverändert ausgeben (z.B. für den Textfile-Collector)
+        sys.stdout.write(response["metrics"])
+        return
+
+    if len(sys.argv) >= 2 and sys.argv[1] in ("stop", "status", "timing", "levels", "queue", "confirm", "duty", "menu", "forecast"):
+        if sys.argv[1] in ("duty", "menu", "forecast"):
+            request = parse_query(sys.argv[1], sys.argv[2:])
+        else:
+            request = {"command": sys.argv[1]}
+            if len(sys.argv) >= 3:
+                request["pin"] = int(sys.argv[2])
+        response = send_request(request)
+        if sys.argv[1] == "stop" and response is not None and response.get("no_response"):
+            # ein hängender Server darf den Not-Aus nicht aufhalten
+            print(f"{response['error']}, schalte direkt ab", file=sys.stderr)
+            response = None
+        if response is None and sys.argv[1] == "stop":
+            response = emergency_stop(request.get("pin"))
+        if response is None:
+            print(json.dumps({"success": False, "error": "Pump-Server läuft nicht"}))
+            sys.exit(1)
+        print(json.dumps(response))
+        if not response.get("success"):
+            sys.exit(1)
+        return
+
+    if len(sys.argv) == 3 and sys.argv[1] == "plan":
+        run_plan_command(sys.argv[2])
+        return
+
     if len(sys.argv) != 4:
         print("Verwendung: python3 pump_control.py <command> <pin> <duration_ms>")
+        print("            python3 pump_control.py plan '[[<pin>, <duration_ms>], ...]'")
         sys.exit(1)
-    
+
     command = sys.argv[1]
     pin = int(sys.argv[2])
     duration_ms = int(sys.argv[3])
-    
-    setup_pin(pin)
-    
-    if command == "activate":
-        activate_pump(pin, duration_ms)
-    else:
+
+    if command != "activate":
         print(f"Unbekannter Befehl: {command}")
         sys.exit(1)
-    
+
+    # Thin-Client: läuft der Pump-Server, übernimmt er die Dosierung
+    response = send_request(
+        {"command": "activate", "pin": pin, "duration_ms": duration_ms},
+        timeout=CLIENT_TIMEOUT + duration_ms / 1000,
+    )
+    if response is not None:
+        print(json.dumps(response))
+        if not response.get("success"):
+            sys.exit(1)
+        return
+
+    init_gpio()
+    init_journal()
+    setup_pin(pin)
+    install_stop_handlers([pin])
+    result = activate_pump(pin, duration_ms)
+    print(json.dumps({"success": True, **result}))
+
     # Bereinige die GPIO-Pins
     GPIO.cleanup()
 
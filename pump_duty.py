@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+pump_duty.py — Einschaltdauer-Begrenzung für Pumpen im Dauerbetrieb
+
+Billige Pumpenmotoren überhitzen, wenn dieselbe Saftpumpe auf einer Party
+fast ununterbrochen läuft. Pro Pumpe wird ein thermisches Modell erster
+Ordnung geführt: die Einschaltzeit summiert sich als "Wärme" auf und klingt
+mit der Zeitkonstante tau exponentiell ab. Dauerbetrieb mit Tastgrad d
+ergibt im Gleichgewicht d * tau – die Grenze ist also maxDuty * tau Sekunden.
+
+Grenzen in data/pump-duty.json, z.B.
+  {
+    "maxDuty": 0.5,
+    "timeConstantS": 300,
+    "pumpMaxDuty": {"7": 0.3}
+  }
+Fehlt die Datei, gibt es keine Begrenzung.
+
+pump_planner.py weicht mit dem verbleibenden Spielraum auf redundante
+Pumpen aus; sind die Pumpen eines Plans noch zu heiß, lehnt der Pump-Server
+ihn mit cooldown_ms ab und die Bestellwarteschlange wartet so lange.
+
+Vorhersage der dauerhaft machbaren Getränke/Stunde für die aktuelle Karte:
+  python3 pump_duty.py forecast [--size 300] [--cocktail big-john] [--split-mode parallel]
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+from pump_calibration import load_calibration
+from pump_planner import DEFAULT_SPLIT_MODE, SPLIT_MODES, flow_rate_of, load_pump_config, pumps_for_ingredient
+from pump_scheduler import load_power_config, schedule_jobs
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DUTY_CONFIG_PATH = os.path.join(DATA_DIR, "pump-duty.json")
+DEFAULT_TIME_CONSTANT_S = 300.0
+RELEASE_FRACTION = 0.05  # passt eine Dosierung nie ins Budget, wird bis auf 5 % abgekühlt
+
+def load_duty_config(config_path=DUTY_CONFIG_PATH):
+    """Liest data/pump-duty.json als Keyword-Argumente für DutyTracker"""
+    try:
+        with open(config_path, "r") as config_file:
+            raw = json.load(config_file)
+    except (OSError, ValueError):
+        return {}
+    return {
+        "max_duty": raw.get("maxDuty"),
+        "time_constant_s": float(raw.get("timeConstantS", DEFAULT_TIME_CONSTANT_S)),
+        "pump_max_duty": {int(pump_id): float(duty) for pump_id, duty in raw.get("pumpMaxDuty", {}).items()},
+    }
+
+class DutyTracker:
+    """Wärmemodell pro Pumpen-ID; record() nach jeder Dosierung, headroom_s() vor der Planung"""
+
+    def __init__(self, max_duty=None, time_constant_s=DEFAULT_TIME_CONSTANT_S, pump_max_duty=None):
+        if max_duty is not None and not 0 < max_duty <= 1:
+            raise ValueError("maxDuty muss zwischen 0 und 1 liegen")
+        self.max_duty = max_duty
+        self.time_constant_s = time_constant_s
+        self.pump_max_duty = pump_max_duty or {}
+        self.lock = threading.Lock()
+        self.heat = {}  # pump_id -> (Wärme in s Einschaltzeit, monotoner Zeitpunkt)
+
+    @property
+    def enabled(self):
+        return self.max_duty is not None or bool(self.pump_max_duty)
+
+    def duty_of(self, pump_id):
+        return self.pump_max_duty.get(pump_id, self.max_duty if self.max_duty is not None else 1.0)
+
+    def limit_s(self, pump_id):
+        return self.duty_of(pump_id) * self.time_constant_s
+
+    def _heat_at(self, pump_id, now):
+        heat, since = self.heat.get(pump_id, (0.0, now))
+        return heat * math.exp(-(now - since) / self.time_constant_s)
+
+    def record(self, pump_id, on_s, at=None):
+        at = time.monotonic() if at is None else at
+        with self.lock:
+            self.heat[pump_id] = (self._heat_at(pump_id, at) + on_s, at)
+
+    def current(self, pump_id, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            return self._heat_at(pump_id, now)
+
+    def headroom_s(self, pump_id, now=None):
+        """Einschaltzeit, die die Pumpe jetzt noch laufen darf (ohne Begrenzung: unendlich)"""
+        if not self.enabled:
+            return math.inf
+        return max(0.0, self.limit_s(pump_id) - self.current(pump_id, now))
+
+    def cooldown_s(self, pump_id, needed_s, now=None):
+        """Wartezeit, bis ``needed_s`` Einschaltzeit ins Budget passt"""
+        if not self.enabled:
+            return 0.0
+        heat = self.current(pump_id, now)
+        target = self.limit_s(pump_id) - needed_s
+        if target <= 0:
+            target = RELEASE_FRACTION * self.limit_s(pump_id)
+        return self.time_constant_s * math.log(heat / target) if heat > target else 0.0
+
+    def status(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            pump_ids = sorted(self.heat)
+        return {
+            "enabled": self.enabled,
+            "time_constant_s": self.time_constant_s,
+            "pumps": [
+                {
+                    "pump_id": pump_id,
+                    "duty": round(self.current(pump_id, now) / self.time_constant_s, 3),
+                    "max_duty": self.duty_of(pump_id),
+                    "headroom_s": round(self.headroom_s(pump_id, now), 1),
+                }
+                for pump_id in pump_ids
+            ],
+        }
+
+def _load_json(path, default):
+    try:
+        with open(path, "r") as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return default
+
+def load_menu(data_dir=DATA_DIR):
+    """Cocktails der Karte: Standard- und eigene Rezepte ohne ausgeblendete"""
+    hidden = set(_load_json(os.path.join(data_dir, "hidden-cocktails.json"), []))
+    cocktails = _load_json(os.path.join(data_dir, "cocktails.json"), [])
+    cocktails += _load_json(os.path.join(data_dir, "custom-cocktails.json"), [])
+    return [cocktail for cocktail in cocktails if cocktail.get("id") not in hidden]
+
+def automatic_items(recipe):
+    """Rezeptzeilen, die eine Pumpe dosiert (ohne manuelle Zutaten)"""
+    return [item for item in recipe if item.get("type") != "manual" and not item.get("manual")]
+
+def forecast(menu, pumps, size=300, config=None, calibration=None, split_mode=None, limits=None):
+    """Dauerhaft machbare Getränke/Stunde bei gleich verteilter Bestellung über ``menu``
+
+    Engpass ist entweder die Einschaltdauer-Grenze der Pumpen einer Zutat
+    (ml/h aller Pumpen der Zutat) oder die reine Dosierzeit pro Getränk.
+    Die Dosierzeit hängt vom Verteilungsmodus ab (siehe pump_planner.py) und
+    vom Strombudget ``limits`` (Default: data/pump-power.json), das Pumpen
+    nacheinander laufen lässt.
+    """
+    split_mode = split_mode or DEFAULT_SPLIT_MODE
+    if split_mode not in SPLIT_MODES:
+        raise ValueError(f"Unbekannter Verteilungsmodus: {split_mode} (verfügbar: {', '.join(SPLIT_MODES)})")
+    config = load_duty_config() if config is None else config
+    calibration = load_calibration() if calibration is None else calibration
+    tracker = DutyTracker(**config) if config else DutyTracker()
+    limits = load_power_config() if limits is None else limits
+    demand = {}  # Zutat -> ml pro Getränk (Mittel über die Karte)
+    pour_s = []
+    drinks = []
+    for cocktail in menu:
+        recipe = automatic_items(cocktail.get("recipe", []))
+        total = sum(item["amount"] for item in recipe)
+        # nur Cocktails, deren Zutaten alle eine Pumpe haben, sind bestellbar
+        if not total or any(not pumps_for_ingredient(item["ingredientId"], pumps) for item in recipe):
+            continue
+        drinks.append(cocktail.get("id"))
+        jobs = {}  # pin -> Laufzeit in ms
+        for item in recipe:
+            ml = item["amount"] * size / total
+            demand[item["ingredientId"]] = demand.get(item["ingredientId"], 0.0) + ml
+            candidates = pumps_for_ingredient(item["ingredientId"], pumps)
+            if split_mode == "parallel":
+                # anteilig zur Förderrate, alle Pumpen der Zutat laufen gleich lang
+                rate = sum(flow_rate_of(pump, calibration) for pump in candidates)
+            else:
+                # priority: die erste Pumpe liefert allein, redundante erst, wenn sie leer ist
+                rate = flow_rate_of(candidates[0], calibration)
+                candidates = candidates[:1]
+            for pump in candidates:
+                pin = int(pump["pin"])
+                jobs[pin] = jobs.get(pin, 0) + round(ml / rate * 1000)
+        # wie im Pump-Server: das Strombudget kann Pumpen nacheinander laufen lassen
+        pour_s.append(schedule_jobs(sorted(jobs.items()), **limits)["planned_total_ms"] / 1000)
+    if not drinks:
+        return {"drinks": [], "max_drinks_per_hour": 0.0, "bottleneck": None, "ingredients": []}
+
+    ingredients = []
+    for ingredient, ml in demand.items():
+        ml_per_drink = ml / len(drinks)
+        capacity_ml_h = sum(
+            flow_rate_of(pump, calibration) * tracker.duty_of(int(pump["id"])) * 3600
+            for pump in pumps_for_ingredient(ingredient, pumps)
+        )
+        ingredients.append({
+            "ingredient": ingredient,
+            "ml_per_drink": round(ml_per_drink, 1),
+            "capacity_ml_per_hour": round(capacity_ml_h),
+            "drinks_per_hour": round(capacity_ml_h / ml_per_drink, 1),
+        })
+    ingredients.sort(key=lambda entry: entry["drinks_per_hour"])
+    pour_limit = 3600 / (sum(pour_s) / len(pour_s))
+    duty_limit = ingredients[0]["drinks_per_hour"]
+    return {
+        "drinks": drinks,
+        "size_ml": size,
+        "split_mode": split_mode,
+        "max_drinks_per_hour": round(min(pour_limit, duty_limit), 1),
+        "pour_limited_per_hour": round(pour_limit, 1),
+        "bottleneck": ingredients[0]["ingredient"] if duty_limit < pour_limit else "Dosierzeit",
+        "ingredients": ingredients,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Getränke/Stunde unter der Einschaltdauer-Grenze vorhersagen")
+    parser.add_argument("command", choices=["forecast"])
+    parser.add_argument("--size", type=float, default=300)
+    parser.add_argument("--cocktail", default=None, help="nur diesen Cocktail statt der ganzen Karte")
+    parser.add_argument("--split-mode", choices=SPLIT_MODES, default=None)
+    args = parser.parse_args()
+
+    menu = load_menu()
+    if args.cocktail:
+        menu = [cocktail for cocktail in menu if cocktail.get("id") == args.cocktail]
+        if not menu:
+            print(json.dumps({"success": False, "error": f"Unbekannter Cocktail: {args.cocktail}"}))
+            sys.exit(1)
+    try:
+        result = forecast(menu, load_pump_config(), args.size, split_mode=args.split_mode)
+    except ValueError as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
+    print(json.dumps({"success": True, **result}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+pump_forecast.py — wie viele Cocktails gehen noch? Für die ganze Karte in einem Rechenschritt
+
+Alle Rezepte der Karte (pump_duty.load_menu) in allen Standardgrößen
+(data/persistent-data.json) plus alle Zutaten als Shot in den Shot-Größen
+(data/shot-sizes.json) werden einmal als Matrix "Ausschank x Zutat" in ml
+aufgebaut. Gegen die aktuellen Füllstände ist die Vorhersage dann nur noch
+
+  pours = floor(min(bestand / bedarf))   pro Zeile, Engpass = argmin
+
+Die Matrix wird nur neu aufgebaut, wenn sich Karte, Größen oder
+Pumpenkonfiguration ändern – nach jeder Dosierung kostet die Vorhersage
+Mikrosekunden. Mehrere Pumpen derselben Zutat zählen zusammen, Mengen werden
+wie in pump_planner.py skaliert und gerundet.
+
+  python3 pump_forecast.py                      # ganze Karte
+  python3 pump_forecast.py --cocktail mai-tai   # nur ein Cocktail
+  python3 pump_forecast.py --json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from pump_duty import DATA_DIR, automatic_items, load_menu
+from pump_menu import menu_signature
+from pump_planner import PUMP_CONFIG_PATH, file_signature, load_pump_config
+
+PERSISTENT_DATA_PATH = os.path.join(DATA_DIR, "persistent-data.json")
+SHOT_SIZES_PATH = os.path.join(DATA_DIR, "shot-sizes.json")
+DEFAULT_STANDARD_SIZES = [200, 300, 400]  # wie DEFAULT_DATA in lib/persistent-storage.ts
+DEFAULT_SHOT_SIZES = [40]                 # Standardmenge von makeSingleShotAction
+
+def _load_json(path, default):
+    try:
+        with open(path, "r") as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return default
+
+def load_sizes():
+    """(Standardgrößen, Shot-Größen) in ml"""
+    standard = _load_json(PERSISTENT_DATA_PATH, {}).get("standardSizes") or DEFAULT_STANDARD_SIZES
+    shots = [entry["size"] if isinstance(entry, dict) else entry for entry in _load_json(SHOT_SIZES_PATH, [])]
+    return [float(size) for size in standard], [float(size) for size in shots or DEFAULT_SHOT_SIZES]
+
+class PourForecast:
+    """Bedarfsmatrix der Karte; remaining() rechnet gegen einen Füllstandsvektor"""
+
+    def __init__(self, menu, pumps, sizes, shot_sizes):
+        recipes = [(cocktail, automatic_items(cocktail.get("recipe", []))) for cocktail in menu]
+        ingredients = sorted({item["ingredientId"] for _, recipe in recipes for item in recipe})
+        ingredients += sorted({pump["ingredient"] for pump in pumps if pump.get("ingredient")} - set(ingredients))
+        self.ingredients = ingredients
+        column = {ingredient: index for index, ingredient in enumerate(ingredients)}
+
+        # Anteile pro Cocktail (Cocktail x Zutat), skaliert auf jede Größe
+        shares = np.zeros((len(recipes), len(ingredients)))
+        for row, (_, recipe) in enumerate(recipes):
+            total = sum(item["amount"] for item in recipe)
+            for item in recipe:
+                shares[row, column[item["ingredientId"]]] += item["amount"] / total if total else 0.0
+        sizes_array = np.asarray(sizes, dtype=float)
+        # Math.round wie im Frontend; Anteil 0 bleibt 0
+        cocktail_need = np.floor(shares[:, None, :] * sizes_array[None, :, None] + 0.5) * (shares[:, None, :] > 0)
+        cocktail_need = cocktail_need.reshape(-1, len(ingredients))
+
+        # Shots: jede Zutat mit Pumpe einzeln in jeder Shot-Größe
+        shot_ingredients = sorted({pump["ingredient"] for pump in pumps if pump.get("ingredient") and pump.get("enabled", True) is not False})
+        shot_need = np.zeros((len(shot_ingredients) * len(shot_sizes), len(ingredients)))
+        self.rows = [
+            {"id": cocktail["id"], "name": cocktail.get("name", cocktail["id"]), "size": size, "kind": "cocktail"}
+            for cocktail, _ in recipes for size in sizes
+        ]
+        for index, (ingredient, size) in enumerate((ingredient, size) for ingredient in shot_ingredients for size in shot_sizes):
+            shot_need[index, column[ingredient]] = size
+            self.rows.append({"id": ingredient, "name": ingredient, "size": size, "kind": "shot"})
+        self.need = np.vstack([cocktail_need, shot_need])
+        self.used = self.need > 0
+        # Zeilen ohne automatische Zutaten (nur manuell) sind unbegrenzt
+        self.unlimited = ~self.used.any(axis=1)
+
+        # Pumpe -> Spalte, für den Füllstandsvektor
+        self.pump_columns = {
+            int(pump["id"]): column[pump["ingredient"]]
+            for pump in pumps if pump.get("ingredient") in column and pump.get("enabled", True) is not False
+        }
+
+    def stock(self, levels):
+        """[{"pumpId", "currentLevel"}, ...] -> Bestand pro Zutat (redundante Pumpen zusammen)"""
+        stock = np.zeros(len(self.ingredients))
+        for level in levels:
+            column = self.pump_columns.get(int(level["pumpId"]))
+            if column is not None:
+                stock[column] += max(0.0, float(level["currentLevel"]))
+        return stock
+
+    def remaining(self, levels):
+        """(verbleibende Ausschänke pro Zeile, Spalte der Engpass-Zutat pro Zeile)"""
+        stock = self.stock(levels)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(self.used, stock[None, :] / np.where(self.used, self.need, 1.0), np.inf)
+        limiting = ratio.argmin(axis=1)
+        pours = np.floor(ratio[np.arange(len(self.rows)), limiting])
+        return pours, limiting
+
+    def report(self, levels, cocktail_id=None):
+        pours, limiting = self.remaining(levels)
+        result = []
+        for index, row in enumerate(self.rows):
+            if cocktail_id is not None and row["id"] != cocktail_id:
+                continue
+            unlimited = bool(self.unlimited[index])
+            result.append(dict(
+                row,
+                pours=None if unlimited else int(pours[index]),
+                limiting=None if unlimited else self.ingredients[limiting[index]],
+            ))
+        return result
+
+def forecast_signature():
+    """Ändert sich, sobald Karte, Größen oder Pumpenkonfiguration sich ändern"""
+    return (menu_signature(), file_signature(PERSISTENT_DATA_PATH), file_signature(SHOT_SIZES_PATH),
+            file_signature(PUMP_CONFIG_PATH))
+
+def build_forecast():
+    sizes, shot_sizes = load_sizes()
+    return PourForecast(load_menu(), load_pump_config(), sizes, shot_sizes)
+
+def main():
+    parser = argparse.ArgumentParser(description="Verbleibende Ausschänke pro Cocktail und Größe")
+    parser.add_argument("--cocktail", default=None)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    from pump_levels import LevelStore
+    store = LevelStore(background=False)
+    report = build_forecast().report(store.snapshot() if store.available else [], args.cocktail)
+    if args.cocktail is not None and not report:
+        print(json.dumps({"success": False, "error": f"Unbekannter Cocktail: {args.cocktail}"}))
+        sys.exit(1)
+    if args.json:
+        print(json.dumps({"success": True, "forecast": report}))
+        return
+    for row in report:
+        pours = "unbegrenzt" if row["pours"] is None else row["pours"]
+        limiting = f"  (Engpass: {row['limiting']})" if row["limiting"] else ""
+        label = f"Shot {row['name']}" if row["kind"] == "shot" else row["name"]
+        print(f"{label:<32} {row['size']:>5.0f} ml  {pours:>10}{limiting}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+pump_gpio.py — austauschbares GPIO-Backend für die Pumpen-Relais
+
+  rpi  RPi.GPIO auf dem Raspberry Pi (Standard)
+  sim  Simulation im Speicher, protokolliert jeden Pegelwechsel mit Zeitstempel
+
+Auswahl über die Umgebungsvariable PUMP_GPIO_BACKEND, z.B.
+  PUMP_GPIO_BACKEND=sim python3 pump_control.py plan '[[17, 1200]]'
+"""
+
+import os
+import threading
+import time
+
+HIGH = 1
+LOW = 0
+
+class RPiGPIOBackend:
+    """RPi.GPIO im BCM-Modus"""
+
+    name = "rpi"
+    HIGH = HIGH
+    LOW = LOW
+    # Pin-Funktionen stehen in der Hardware und gelten über Prozessgrenzen hinweg
+    persistent = True
+
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        # Setze den GPIO-Modus
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setwarnings(False)
+
+    def setup(self, pins, initial):
+        # RPi.GPIO nimmt Listen von Kanälen direkt entgegen
+        self.GPIO.setup(list(pins), self.GPIO.OUT, initial=initial)
+
+    def output(self, pin, value):
+        self.GPIO.output(pin, value)
+
+    def output_many(self, pins, value):
+        self.GPIO.output(list(pins), value)
+
+    def is_output(self, pin):
+        # liest die Pin-Funktion aus der Hardware, gilt also auch für andere Prozesse
+        return self.GPIO.gpio_function(pin) == self.GPIO.OUT
+
+    def cleanup(self):
+        self.GPIO.cleanup()
+
+class SimulatedBackend:
+    """Merkt sich alle Pegelwechsel als (monotonic, pin, value) – für Tests und Benchmarks"""
+
+    name = "sim"
+    HIGH = HIGH
+    LOW = LOW
+    # jeder Prozess beginnt mit leeren Pegeln
+    persistent = False
+
+    def __init__(self, output_delay_s=0.0):
+        # output_delay_s simuliert die Laufzeit eines echten GPIO-Aufrufs
+        self.output_delay_s = output_delay_s
+        self.lock = threading.Lock()
+        self.levels = {}
+        self.transitions = []
+
+    def _write(self, pins, value):
+        if self.output_delay_s:
+            time.sleep(self.output_delay_s)
+        now = time.monotonic()
+        with self.lock:
+            for pin in pins:
+                if self.levels.get(pin) != value:
+                    self.transitions.append((now, pin, value))
+                self.levels[pin] = value
+
+    def setup(self, pins, initial):
+        self._write(pins, initial)
+
+    def output(self, pin, value):
+        self._write([pin], value)
+
+    def output_many(self, pins, value):
+        self._write(pins, value)
+
+    def is_output(self, pin):
+        with self.lock:
+            return pin in self.levels
+
+    def cleanup(self):
+        with self.lock:
+            self.levels.clear()
+
+    def reset(self):
+        with self.lock:
+            self.transitions = []
+
+    def intervals(self, active=LOW):
+        """Einschalt-Intervalle pro Pin: {pin: [(on_at, off_at), ...]}"""
+        result = {}
+        on_since = {}
+        with self.lock:
+            transitions = list(self.transitions)
+        for at, pin, value in transitions:
+            if value == active:
+                on_since.setdefault(pin, at)
+            elif pin in on_since:
+                result.setdefault(pin, []).append((on_since.pop(pin), at))
+        return result
+
+BACKENDS = {
+    "rpi": RPiGPIOBackend,
+    "sim": SimulatedBackend,
+}
+
+def get_backend(name=None):
+    """Erzeugt das über ``name`` bzw. PUMP_GPIO_BACKEND gewählte Backend"""
+    name = name or os.environ.get("PUMP_GPIO_BACKEND", "rpi")
+    if name not in BACKENDS:
+        raise ValueError(f"Unbekanntes GPIO-Backend: {name} (verfügbar: {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
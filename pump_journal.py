@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+pump_journal.py — Ringpuffer-Journal aller Relais-Aktivierungen
+
+Jede Aktivierung wird als Datensatz fester Größe in eine per mmap
+eingeblendete Datei geschrieben (Standard: data/pump-journal.bin). Das kostet
+pro Dosierung nur wenige Mikrosekunden – auch auf langsamen SD-Karten.
+Ist der Ring voll, werden die ältesten Einträge überschrieben.
+
+Export:
+  python3 pump_journal.py export                 # JSON
+  python3 pump_journal.py export --format csv --last 100
+"""
+
+import argparse
+import csv
+import fcntl
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+JOURNAL_PATH = os.environ.get(
+    "PUMP_JOURNAL",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "pump-journal.bin"),
+)
+DEFAULT_CAPACITY = 8192
+
+MAGIC = b"CBJ1"
+VERSION = 1
+# magic, version, record_size, capacity, next_seq
+HEADER = struct.Struct("<4sHHIQ")
+HEADER_SIZE = 64
+# seq, start_ns, stop_ns, requested_ms, actual_us, pin, pump_id, flags
+RECORD = struct.Struct("<QqqIIHhB3x")
+FLAG_STOPPED = 0x01
+
+FIELDS = ["seq", "pin", "pump_id", "requested_ms", "actual_ms", "start", "stop", "stopped"]
+
+class PumpJournal:
+    """Schreibt Aktivierungen in den mmap-Ring; sicher für Threads und mehrere Prozesse"""
+
+    def __init__(self, path=JOURNAL_PATH, capacity=DEFAULT_CAPACITY):
+        self.lock = threading.Lock()
+        size = HEADER_SIZE + capacity * RECORD.size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            existing = os.fstat(self.fd).st_size
+            header = os.pread(self.fd, HEADER.size, 0) if existing >= HEADER.size else b""
+            if not header or HEADER.unpack(header)[0] != MAGIC:
+                os.ftruncate(self.fd, size)
+                os.pwrite(self.fd, HEADER.pack(MAGIC, VERSION, RECORD.size, capacity, 0), 0)
+            else:
+                # Vorhandene Datei behält ihre Kapazität
+                capacity = HEADER.unpack(header)[3]
+                size = HEADER_SIZE + capacity * RECORD.size
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.capacity = capacity
+        self.map = mmap.mmap(self.fd, size)
+
+    def append(self, pin, requested_ms, actual_ms, start_ns, stop_ns, pump_id=-1, stopped=False):
+        with self.lock:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                seq = HEADER.unpack_from(self.map, 0)[4]
+                offset = HEADER_SIZE + (seq % self.capacity) * RECORD.size
+                RECORD.pack_into(
+                    self.map, offset, seq, start_ns, stop_ns, int(requested_ms),
+                    int(round(actual_ms * 1000)), pin, pump_id, FLAG_STOPPED if stopped else 0,
+                )
+                # next_seq erst nach dem Datensatz weiterzählen, damit Leser nie halbe Einträge sehen
+                struct.pack_into("<Q", self.map, 12, seq + 1)
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        return seq
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        os.close(self.fd)
+
+def read_journal(path=JOURNAL_PATH, last=None):
+    """Dekodiert den Ring in zeitlicher Reihenfolge als Liste von dicts"""
+    with open(path, "rb") as journal_file:
+        data = journal_file.read()
+    magic, _, record_size, capacity, next_seq = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or record_size != RECORD.size:
+        raise ValueError(f"{path} ist kein Pump-Journal (Version {VERSION})")
+    first = max(0, next_seq - capacity)
+    if last is not None:
+        first = max(first, next_seq - last)
+    records = []
+    for seq in range(first, next_seq):
+        stored_seq, start_ns, stop_ns, requested_ms, actual_us, pin, pump_id, flags = RECORD.unpack_from(
+            data, HEADER_SIZE + (seq % capacity) * RECORD.size
+        )
+        if stored_seq != seq:
+            continue
+        records.append({
+            "seq": seq,
+            "pin": pin,
+            "pump_id": pump_id if pump_id >= 0 else None,
+            "requested_ms": requested_ms,
+            "actual_ms": actual_us / 1000,
+            "start": _iso(start_ns),
+            "stop": _iso(stop_ns),
+            "stopped": bool(flags & FLAG_STOPPED),
+        })
+    return records
+
+def _iso(ns):
+    seconds, rest = divmod(ns, 1_000_000_000)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(seconds)) + f".{rest // 1_000_000:03d}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Pump-Journal exportieren")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--path", default=JOURNAL_PATH)
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument("--last", type=int, default=None, help="nur die letzten N Einträge")
+    args = parser.parse_args()
+
+    try:
+        records = read_journal(args.path, args.last)
+    except (OSError, ValueError, struct.error) as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
+
+    if args.format == "csv":
+        writer = csv.DictWriter(sys.stdout, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+    else:
+        print(json.dumps(records, indent=2))
+
+if __name__ == "__main__":
+    main()
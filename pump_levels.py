@@ -0,0 +1,114 @@
+"""
+pump_levels.py — Füllstände im Speicher mit verzögertem Zurückschreiben
+
+Der Pump-Server zieht jede Dosierung sofort vom Füllstand ab, sobald das
+Relais schließt. data/ingredient-levels.json wird höchstens alle
+FLUSH_INTERVAL_S Sekunden (und beim Beenden) atomar per Temp-Datei + rename
+geschrieben. Offene Abzüge werden als Deltas gehalten: hat die Next.js-App
+die Datei inzwischen selbst geändert (Nachfüllen, Kapazität), wird sie vor
+dem Schreiben neu gelesen und die Deltas darauf angewendet.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+LEVELS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ingredient-levels.json")
+FLUSH_INTERVAL_S = float(os.environ.get("PUMP_LEVELS_FLUSH_S", "5"))
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+class LevelStore:
+    """Füllstände pro Pumpe; consume() ist billig, flush() passiert im Hintergrund"""
+
+    def __init__(self, path=LEVELS_PATH, flush_interval_s=FLUSH_INTERVAL_S, background=True):
+        self.path = path
+        self.flush_interval_s = flush_interval_s
+        self.lock = threading.Lock()
+        self.levels = []
+        self.mtime = None
+        self.pending = {}  # pump_id -> noch nicht geschriebene ml
+        self.last_flush = 0.0
+        self.dirty = threading.Event()
+        self.closed = False
+        self._reload()
+        self.thread = None
+        if background:
+            self.thread = threading.Thread(target=self._writer, daemon=True)
+            self.thread.start()
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self.mtime:
+                return
+            with open(self.path, "r") as levels_file:
+                self.levels = json.load(levels_file)
+            self.mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def available(self):
+        """False, solange es keine Füllstandsdatei gibt – dann verbucht die App selbst"""
+        return self.mtime is not None
+
+    def consume(self, pump_id, ml):
+        if ml <= 0 or not self.available:
+            return
+        with self.lock:
+            self.pending[pump_id] = self.pending.get(pump_id, 0.0) + ml
+        self.dirty.set()
+
+    def snapshot(self):
+        """Aktuelle Füllstände inklusive noch nicht geschriebener Abzüge"""
+        with self.lock:
+            self._reload()
+            return [
+                dict(level, currentLevel=max(0, level["currentLevel"] - self.pending.get(level["pumpId"], 0.0)))
+                for level in self.levels
+            ]
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return False
+            self._reload()
+            if not self.available:
+                return False
+            updated = _now_iso()
+            for level in self.levels:
+                consumed = self.pending.get(level.get("pumpId"))
+                if consumed:
+                    level["currentLevel"] = max(0, round(level["currentLevel"] - consumed, 1))
+                    level["lastUpdated"] = updated
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as levels_file:
+                json.dump(self.levels, levels_file, indent=2)
+            os.replace(tmp_path, self.path)
+            self.mtime = os.stat(self.path).st_mtime_ns
+            self.pending = {}
+            self.last_flush = time.monotonic()
+        return True
+
+    def _writer(self):
+        # Schreibvorgänge zusammenfassen: höchstens einer pro flush_interval_s
+        while not self.closed:
+            self.dirty.wait()
+            self.dirty.clear()
+            delay = self.last_flush + self.flush_interval_s - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Fehler beim Schreiben der Füllstände: {e}", file=sys.stderr)
+
+    def close(self):
+        self.closed = True
+        self.dirty.set()
+        self.flush()
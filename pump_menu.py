@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+pump_menu.py — welche Cocktails sind gerade machbar? Per Bitmaske statt Rezeptschleife
+
+Beim Aufbau bekommt jede Zutat ein Bit und jeder Cocktail die Maske seiner
+automatischen Zutaten; umgekehrt gibt es pro Zutat den Index der Cocktails,
+die sie brauchen. Pro Zutat sind die Cocktails nach ihrem Mengenanteil
+sortiert – welche bei Füllstand L und Größe X reichen, ist damit ein Präfix,
+dessen Maske vorab berechnet ist. "Machbar" ist dann nur noch
+
+  alle & ~(gesperrt[zutat1] | gesperrt[zutat2] | ...)
+
+Ändert sich der Füllstand oder die Zutat einer Pumpe, werden nur die
+Sperrmasken der betroffenen Zutaten neu bestimmt.
+
+Mehrere Pumpen derselben Zutat zählen zusammen (wie in pump_planner.py).
+Benötigt wird die auf X ml skalierte, gerundete Menge; "knapp" heißt: reicht
+für genau einen Cocktail.
+
+  python3 pump_menu.py pourable [--size 300]
+  python3 pump_menu.py check <cocktail-id> [--size 300]
+"""
+
+import argparse
+import bisect
+import json
+import math
+import os
+import sys
+
+from pump_duty import DATA_DIR, automatic_items, load_menu
+from pump_planner import load_pump_config
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+class MenuIndex:
+    """Invertierter Zutatenindex mit Bitmasken; Cocktails sind Bits eines int"""
+
+    def __init__(self, cocktails, pumps=(), levels=()):
+        self.ids = []
+        self.names = {}
+        self.ingredient_bits = {}   # Zutat -> Bitnummer
+        self.cocktail_masks = []    # Cocktail -> Maske seiner Zutaten
+        self.users = {}             # Zutat -> [(Anteil, Cocktail), ...] aufsteigend
+        self.prefix = {}            # Zutat -> Maske der ersten k Cocktails aus users
+        self.uses = {}              # Zutat -> Maske aller Cocktails, die sie brauchen
+        for cocktail in cocktails:
+            recipe = automatic_items(cocktail.get("recipe", []))
+            total = sum(item["amount"] for item in recipe)
+            index = len(self.ids)
+            self.ids.append(cocktail["id"])
+            self.names[cocktail["id"]] = index
+            mask = 0
+            for item in recipe:
+                ingredient = item["ingredientId"]
+                bit = self.ingredient_bits.setdefault(ingredient, len(self.ingredient_bits))
+                mask |= 1 << bit
+                share = item["amount"] / total if total else 0.0
+                self.users.setdefault(ingredient, []).append((share, index))
+            self.cocktail_masks.append(mask)
+        self.all = (1 << len(self.ids)) - 1
+        for ingredient, users in self.users.items():
+            users.sort()
+            prefix = [0]
+            for _, index in users:
+                prefix.append(prefix[-1] | (1 << index))
+            self.prefix[ingredient] = prefix
+            self.uses[ingredient] = prefix[-1]
+
+        self.pumps = {}       # pump_id -> (Zutat, aktiviert)
+        self.pump_levels = {}  # pump_id -> ml
+        self.stock = {}       # Zutat -> ml über alle aktivierten Pumpen
+        self.blocked = {}     # Größe -> {Zutat: (gesperrt, knapp)}
+        self.update_pumps(pumps)
+        self.update_levels(levels)
+
+    def _covered(self, ingredient, stock, size):
+        # floor(anteil * size + 0.5) <= stock  <=>  anteil < (floor(stock) + 0.5) / size
+        users = self.users[ingredient]
+        limit = (math.floor(stock) + 0.5) / size
+        return self.prefix[ingredient][bisect.bisect_left(users, (limit, -1))]
+
+    def _masks(self, ingredient, size):
+        """(gesperrt, knapp) einer Zutat bei ``size`` ml – aus dem Cache"""
+        cached = self.blocked.setdefault(size, {})
+        if ingredient not in cached:
+            stock = self.stock.get(ingredient)
+            if stock is None:
+                # keine aktivierte Pumpe: alle Cocktails mit dieser Zutat sind gesperrt
+                cached[ingredient] = (self.uses[ingredient], 0)
+            else:
+                enough = self._covered(ingredient, stock, size)
+                twice = self._covered(ingredient, stock / 2, size)
+                cached[ingredient] = (self.uses[ingredient] & ~enough, enough & ~twice)
+        return cached[ingredient]
+
+    def _invalidate(self, ingredients):
+        for cached in self.blocked.values():
+            for ingredient in ingredients:
+                cached.pop(ingredient, None)
+
+    def _restock(self, ingredients):
+        changed = set()
+        for ingredient in ingredients:
+            if ingredient is None or ingredient not in self.users:
+                continue
+            levels = [
+                self.pump_levels.get(pump_id, 0.0)
+                for pump_id, (pump_ingredient, enabled) in self.pumps.items()
+                if pump_ingredient == ingredient and enabled
+            ]
+            stock = sum(levels) if levels else None
+            if self.stock.get(ingredient) != stock:
+                if stock is None:
+                    self.stock.pop(ingredient, None)
+                else:
+                    self.stock[ingredient] = stock
+                changed.add(ingredient)
+        self._invalidate(changed)
+        return changed
+
+    def update_pumps(self, pumps):
+        """Übernimmt die Pumpenkonfiguration; nur geänderte Zuordnungen lösen Arbeit aus"""
+        seen = {}
+        for pump in pumps:
+            seen[int(pump["id"])] = (pump.get("ingredient"), pump.get("enabled", True) is not False)
+        touched = set()
+        for pump_id in set(self.pumps) | set(seen):
+            before, after = self.pumps.get(pump_id), seen.get(pump_id)
+            if before != after:
+                touched.update(entry[0] for entry in (before, after) if entry)
+        self.pumps = seen
+        return self._restock(touched)
+
+    def set_level(self, pump_id, ml):
+        if self.pump_levels.get(pump_id) == ml:
+            return set()
+        self.pump_levels[pump_id] = ml
+        pump = self.pumps.get(pump_id)
+        return self._restock([pump[0]] if pump else [])
+
+    def update_levels(self, levels):
+        """[{"pumpId", "currentLevel"}, ...] – nur Pumpen mit geändertem Füllstand"""
+        changed = set()
+        for level in levels:
+            changed |= self.set_level(int(level["pumpId"]), float(level["currentLevel"]))
+        return changed
+
+    def pourable_mask(self, size=300):
+        blocked = 0
+        for ingredient in self.users:
+            blocked |= self._masks(ingredient, size)[0]
+        return self.all & ~blocked
+
+    def pourable(self, size=300):
+        """IDs aller Cocktails, die bei ``size`` ml jetzt machbar sind"""
+        return [self.ids[index] for index in _bits(self.pourable_mask(size))]
+
+    def users_of(self, ingredient):
+        """Cocktails, die eine Zutat brauchen (invertierter Index)"""
+        return [self.ids[index] for index in _bits(self.uses.get(ingredient, 0))]
+
+    def check(self, cocktail_id, size=300):
+        """Wie checkCocktailAvailability in lib/ingredient-availability.ts"""
+        index = self.names[cocktail_id]
+        bit = 1 << index
+        low, missing = [], []
+        for ingredient, ingredient_bit in self.ingredient_bits.items():
+            if not self.cocktail_masks[index] >> ingredient_bit & 1:
+                continue
+            blocked, scarce = self._masks(ingredient, size)
+            if blocked & bit:
+                missing.append(ingredient)
+            elif scarce & bit:
+                low.append(ingredient)
+        return {"canMake": not missing, "lowIngredients": low, "missingIngredients": missing}
+
+MENU_FILES = ("cocktails.json", "custom-cocktails.json", "hidden-cocktails.json")
+
+def menu_signature(data_dir=DATA_DIR):
+    """Änderungszeitpunkte der Rezeptdateien – ändert sich die Karte, wird neu aufgebaut"""
+    signature = []
+    for name in MENU_FILES:
+        try:
+            signature.append(os.stat(os.path.join(data_dir, name)).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def build_index(levels=None):
+    """Index über die aktuelle Karte, Pumpenkonfiguration und Füllstände"""
+    if levels is None:
+        from pump_levels import LevelStore
+        store = LevelStore(background=False)
+        levels = store.snapshot() if store.available else []
+    return MenuIndex(load_menu(), load_pump_config(), levels)
+
+def main():
+    parser = argparse.ArgumentParser(description="Machbare Cocktails per Bitmaske bestimmen")
+    parser.add_argument("command", choices=["pourable", "check"])
+    parser.add_argument("cocktail", nargs="?")
+    parser.add_argument("--size", type=float, default=300)
+    args = parser.parse_args()
+    if args.size <= 0:
+        print(json.dumps({"success": False, "error": f"Ungültige Größe: {args.size} (muss größer als 0 sein)"}))
+        sys.exit(1)
+
+    index = build_index()
+    if args.command == "check":
+        if args.cocktail not in index.names:
+            print(json.dumps({"success": False, "error": f"Unbekannter Cocktail: {args.cocktail}"}))
+            sys.exit(1)
+        print(json.dumps({"success": True, **index.check(args.cocktail, args.size)}))
+        return
+    print(json.dumps({"success": True, "size": args.size, "pourable": index.pourable(args.size)}))
+
+if __name__ == "__main__":
+    main()
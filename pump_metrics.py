@@ -0,0 +1,225 @@
+"""
+pump_metrics.py — Zähler und Histogramme des Pump-Servers im Prometheus-Textformat
+
+Erfasst werden Aktivierungen und Einschaltzeit pro Pin, die Zeit von der
+Anfrage bis zum Schließen des ersten Relais, der Dosierfehler und die Länge
+der Bestellwarteschlange. Die Werte werden erst nach einem Plan aus dessen
+Ergebnis übernommen, die Zeitschleife selbst bleibt unberührt.
+
+Veröffentlichung (beides optional):
+  PUMP_METRICS_PORT=9105                 HTTP-Listener auf 127.0.0.1:<port>/metrics
+  PUMP_METRICS_TEXTFILE=/var/lib/node_exporter/textfile_collector/cocktailbot.prom
+                                         für den Textfile-Collector des node_exporter,
+                                         alle PUMP_METRICS_INTERVAL_S Sekunden (15)
+  python3 pump_control.py metrics        einmalig über den laufenden Server
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.environ.get("PUMP_METRICS_PORT", "0") or 0)
+METRICS_TEXTFILE = os.environ.get("PUMP_METRICS_TEXTFILE", "")
+TEXTFILE_INTERVAL_S = float(os.environ.get("PUMP_METRICS_INTERVAL_S", "15"))
+
+# Obergrenzen der Histogramm-Buckets in Sekunden
+ON_TIME_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+ERROR_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1)
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # letzter Eintrag: +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            le = bound if bound == "+Inf" else _number(bound)
+            lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(round(self.total, 6))}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+class PumpMetrics:
+    """Prozessinterne Metriken; record_plan() wird nach jedem Plan einmal aufgerufen"""
+
+    def __init__(self, pump_ids=None, queue_depth=None):
+        self.lock = threading.Lock()
+        self.pump_ids = pump_ids or {}
+        self.queue_depth = queue_depth  # Callable, wird erst beim Abruf gefragt
+        self.activations = {}   # pin -> Anzahl
+        self.stopped = {}       # pin -> vorzeitig gestoppte Aktivierungen
+        self.on_seconds = {}    # pin -> Summe der Einschaltzeit
+        self.on_time = {}       # pin -> Histogramm der Einschaltzeit pro Aktivierung
+        self.dose_error = _Histogram(ERROR_BUCKETS)
+        self.latency = _Histogram(LATENCY_BUCKETS)
+        self.plans = {"ok": 0, "failed": 0}
+        self.started = time.time()
+
+    def record_plan(self, result, latency_s=None):
+        """Übernimmt ein Ergebnis von run_schedule(); ``latency_s`` = Anfrage bis erstes Relais"""
+        with self.lock:
+            self.plans["ok" if result.get("success") else "failed"] += 1
+            if latency_s is not None:
+                self.latency.observe(latency_s)
+            for pump in result.get("pumps", ()):
+                if "started_ms" not in pump:
+                    continue  # nie eingeschaltet
+                pin = pump["pin"]
+                on_s = pump["measured_ms"] / 1000
+                self.activations[pin] = self.activations.get(pin, 0) + 1
+                self.on_seconds[pin] = self.on_seconds.get(pin, 0.0) + on_s
+                self.on_time.setdefault(pin, _Histogram(ON_TIME_BUCKETS)).observe(on_s)
+                if pump["stopped"]:
+                    self.stopped[pin] = self.stopped.get(pin, 0) + 1
+                else:
+                    self.dose_error.observe(abs(pump["error_ms"]) / 1000)
+
+    def record_failure(self):
+        with self.lock:
+            self.plans["failed"] += 1
+
+    def _pin_labels(self, pin):
+        pump_id = self.pump_ids.get(pin)
+        return (("pin", pin),) if pump_id is None else (("pin", pin), ("pump_id", pump_id))
+
+    def render(self):
+        """Alle Metriken im Prometheus-Textformat (Version 0.0.4)"""
+        depth = self.queue_depth() if self.queue_depth is not None else None
+        with self.lock:
+            lines = [
+                "# HELP cocktailbot_pump_activations_total Relais-Aktivierungen pro Pin",
+                "# TYPE cocktailbot_pump_activations_total counter",
+            ]
+            lines += [f"cocktailbot_pump_activations_total{_labels(self._pin_labels(pin))} {count}"
+                      for pin, count in sorted(self.activations.items())]
+            lines += [
+                "# HELP cocktailbot_pump_stopped_total Vorzeitig gestoppte Aktivierungen pro Pin",
+                "# TYPE cocktailbot_pump_stopped_total counter",
+            ]
+            lines += [f"cocktailbot_pump_stopped_total{_labels(self._pin_labels(pin))} {count}"
+                      for pin, count in sorted(self.stopped.items())]
+            lines += [
+                "# HELP cocktailbot_pump_on_seconds_total Kumulierte Einschaltzeit pro Pin",
+                "# TYPE cocktailbot_pump_on_seconds_total counter",
+            ]
+            lines += [f"cocktailbot_pump_on_seconds_total{_labels(self._pin_labels(pin))} {_number(round(seconds, 6))}"
+                      for pin, seconds in sorted(self.on_seconds.items())]
+            lines += [
+                "# HELP cocktailbot_pump_on_time_seconds Einschaltzeit pro Aktivierung",
+                "# TYPE cocktailbot_pump_on_time_seconds histogram",
+            ]
+            for pin, histogram in sorted(self.on_time.items()):
+                lines += histogram.render("cocktailbot_pump_on_time_seconds", self._pin_labels(pin))
+            lines += [
+                "# HELP cocktailbot_pump_dispatch_latency_seconds Anfrage bis zum Schließen des ersten Relais",
+                "# TYPE cocktailbot_pump_dispatch_latency_seconds histogram",
+            ]
+            lines += self.latency.render("cocktailbot_pump_dispatch_latency_seconds", ())
+            lines += [
+                "# HELP cocktailbot_pump_dose_error_seconds Betrag des Dosierfehlers (gemessen - Soll)",
+                "# TYPE cocktailbot_pump_dose_error_seconds histogram",
+            ]
+            lines += self.dose_error.render("cocktailbot_pump_dose_error_seconds", ())
+            lines += [
+                "# HELP cocktailbot_pump_plans_total Ausgeführte Dosierpläne",
+                "# TYPE cocktailbot_pump_plans_total counter",
+            ]
+            lines += [f"cocktailbot_pump_plans_total{_labels((('result', result),))} {count}"
+                      for result, count in sorted(self.plans.items())]
+            if depth is not None:
+                lines += [
+                    "# HELP cocktailbot_order_queue_depth Wartende und laufende Bestellungen",
+                    "# TYPE cocktailbot_order_queue_depth gauge",
+                    f"cocktailbot_order_queue_depth {depth}",
+                ]
+            lines += [
+                "# HELP cocktailbot_pump_server_start_time_seconds Startzeit des Pump-Servers",
+                "# TYPE cocktailbot_pump_server_start_time_seconds gauge",
+                f"cocktailbot_pump_server_start_time_seconds {_number(round(self.started, 3))}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        # atomar ersetzen, damit der node_exporter nie eine halbe Datei liest
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(tmp_path, path)
+
+class MetricsExporter:
+    """Veröffentlicht PumpMetrics per HTTP und/oder Textfile in Hintergrund-Threads"""
+
+    def __init__(self, metrics, port=METRICS_PORT, textfile=METRICS_TEXTFILE, interval_s=TEXTFILE_INTERVAL_S):
+        self.metrics = metrics
+        self.textfile = textfile
+        self.interval_s = interval_s
+        self.closed = threading.Event()
+        self.httpd = None
+        if port:
+            self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+            self.httpd.daemon_threads = True
+            threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        if textfile:
+            threading.Thread(target=self._write_loop, daemon=True).start()
+
+    def _handler(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # kein Log pro Abruf
+
+        return Handler
+
+    def _write_loop(self):
+        while not self.closed.wait(self.interval_s):
+            self._write()
+
+    def _write(self):
+        try:
+            self.metrics.write_textfile(self.textfile)
+        except OSError as e:
+            print(f"Fehler beim Schreiben der Metriken: {e}", file=sys.stderr)
+
+    def close(self):
+        self.closed.set()
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        if self.textfile:
+            self._write()
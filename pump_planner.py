@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+pump_planner.py — verteilt Rezeptzutaten auf die Pumpen
+
+Port von distributeToPumps/planCocktail aus lib/cocktail-machine-server.ts.
+Für Zutaten mit mehreren Pumpen gibt es zwei Modi:
+
+  priority  Pumpen nach Priorität nacheinander leeren – die zweite liefert nur,
+            was die erste nicht mehr hat (bisheriges Verhalten)
+  parallel  Menge auf alle aktivierten Pumpen der Zutat aufteilen, anteilig zur
+            kalibrierten Förderrate und begrenzt durch den Füllstand; alle
+            Pumpen laufen gleichzeitig und sind zusammen fertig
+
+Standard über PUMP_SPLIT_MODE (priority), pro Anfrage überschreibbar.
+
+Mit ``headroom`` (verbleibende Einschaltzeit pro Pumpe, siehe pump_duty.py)
+wird zuerst nur innerhalb der Einschaltdauer-Grenze verteilt, sodass heiße
+Pumpen an ihre redundanten Partner abgeben; erst der Rest überschreitet sie.
+
+  python3 pump_planner.py recipe '{"recipe": [...], "size": 300, "split_mode": "parallel"}'
+"""
+
+import hashlib
+import json
+import math
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from pump_calibration import CALIBRATION_PATH, fit_line, load_calibration
+
+PUMP_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "pump-config.json")
+SPLIT_MODES = ("priority", "parallel")
+DEFAULT_SPLIT_MODE = os.environ.get("PUMP_SPLIT_MODE", "priority")
+PLAN_CACHE_SIZE = int(os.environ.get("PUMP_PLAN_CACHE_SIZE", "64"))
+LEVEL_BUCKET_ML = float(os.environ.get("PUMP_PLAN_LEVEL_BUCKET_ML", "1"))
+HEADROOM_BUCKET_S = 0.5
+
+_cache = {"path": None, "mtime": None, "pumps": []}
+
+def load_pump_config(path=PUMP_CONFIG_PATH):
+    """Pumpen aus data/pump-config.json – gecacht bis sich die Datei ändert"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return []
+    if _cache["path"] != path or _cache["mtime"] != mtime:
+        with open(path, "r") as config_file:
+            _cache.update(path=path, mtime=mtime, pumps=json.load(config_file))
+    return _cache["pumps"]
+
+def flow_rate_of(pump, calibration):
+    """Förderrate in ml/s: aus den Kalibrierpunkten gefittet, sonst flowRate aus der Config"""
+    entry = calibration.get(int(pump["id"]))
+    fit = fit_line(entry["points"]) if entry and entry.get("points") else None
+    return fit["flow_ml_per_s"] if fit else float(pump["flowRate"])
+
+def pumps_for_ingredient(ingredient, pumps):
+    # Gleiche Sortierung wie getPumpsForIngredient: Priorität 1 zuerst, ohne Priorität zuletzt
+    candidates = [pump for pump in pumps if pump.get("ingredient") == ingredient and pump.get("enabled", True)]
+    return sorted(candidates, key=lambda pump: pump.get("priority") or 999)
+
+def _entry(pump, ml):
+    return {"pin": int(pump["pin"]), "pump_id": int(pump["id"]), "ml": round(ml, 1), "flow_rate": float(pump["flowRate"])}
+
+def _split_parallel(candidates, amount, available, rates):
+    """Wasserfüllung: anteilig zur Förderrate, leere Pumpen geben ihren Rest an die anderen ab"""
+    allocation = {}
+    active = [pump for pump in candidates if available[pump["id"]] > 0]
+    remaining = amount
+    while remaining > 1e-9 and active:
+        total_rate = sum(rates[pump["id"]] for pump in active)
+        capped = [pump for pump in active if available[pump["id"]] < remaining * rates[pump["id"]] / total_rate]
+        if not capped:
+            for pump in active:
+                allocation[pump["id"]] = allocation.get(pump["id"], 0.0) + remaining * rates[pump["id"]] / total_rate
+            remaining = 0.0
+            break
+        for pump in capped:
+            allocation[pump["id"]] = allocation.get(pump["id"], 0.0) + available[pump["id"]]
+            remaining -= available[pump["id"]]
+            active.remove(pump)
+    return allocation, remaining
+
+def _split_priority(candidates, amount, available):
+    allocation = {}
+    remaining = amount
+    for pump in candidates:
+        if remaining <= 0:
+            break
+        if available[pump["id"]] <= 0:
+            continue
+        allocation[pump["id"]] = min(remaining, available[pump["id"]])
+        remaining -= allocation[pump["id"]]
+    return allocation, remaining
+
+def distribute(ingredient, amount, pumps, levels=None, split_mode=None, calibration=None, headroom=None):
+    """Verteilt ``amount`` ml einer Zutat; liefert ([{"pin", "pump_id", "ml", "flow_rate"}, ...], Fehlmenge)
+
+    ``levels`` ist {pump_id: ml}; None heißt unbegrenzt. ``headroom`` ist
+    {pump_id: s} noch erlaubte Einschaltzeit; None heißt keine Begrenzung. Der
+    Aufrufer zieht die Mengen selbst ab, wenn mehrere Zutaten geplant werden.
+    """
+    split_mode = split_mode or DEFAULT_SPLIT_MODE
+    if split_mode not in SPLIT_MODES:
+        raise ValueError(f"Unbekannter Verteilungsmodus: {split_mode} (verfügbar: {', '.join(SPLIT_MODES)})")
+    candidates = pumps_for_ingredient(ingredient, pumps)
+    if not candidates:
+        return [], amount
+    available = {pump["id"]: math.inf if levels is None else max(0.0, levels.get(int(pump["id"]), 0.0)) for pump in candidates}
+    rates = None
+    if split_mode == "parallel" or headroom is not None:
+        calibration = load_calibration() if calibration is None else calibration
+        rates = {pump["id"]: flow_rate_of(pump, calibration) for pump in candidates}
+
+    def split(amount, available):
+        if split_mode == "parallel":
+            return _split_parallel(candidates, amount, available, rates)
+        return _split_priority(candidates, amount, available)
+
+    if headroom is None:
+        allocation, remaining = split(amount, available)
+    else:
+        # Erst innerhalb der Einschaltdauer-Grenze, nur der Rest darf sie überschreiten
+        within = {
+            pump_id: min(ml, headroom.get(int(pump_id), math.inf) * rates[pump_id]) for pump_id, ml in available.items()
+        }
+        allocation, remaining = split(amount, within)
+        if remaining > 1e-9:
+            rest = {pump_id: ml - allocation.get(pump_id, 0.0) for pump_id, ml in available.items()}
+            extra, remaining = split(remaining, rest)
+            for pump_id, ml in extra.items():
+                allocation[pump_id] = allocation.get(pump_id, 0.0) + ml
+    entries = [_entry(pump, allocation[pump["id"]]) for pump in candidates if round(allocation.get(pump["id"], 0.0), 1) > 0]
+    return entries, max(0.0, remaining)
+
+def plan_recipe(recipe, size, pumps, levels=None, split_mode=None, headroom=None):
+    """Skaliert das Rezept auf ``size`` ml und verteilt sofortige und verzögerte Zutaten getrennt
+
+    Liefert {"immediate": [...], "delayed": [...], "short": {zutat: ml},
+    "over_duty": {pump_id: s}} – die Einträge sind direkt als Dosierplan bzw.
+    Zeitleisten-Schritte verwendbar; ``over_duty`` ist die Einschaltzeit über
+    der Einschaltdauer-Grenze (nur mit ``headroom``).
+    """
+    current_total = sum(item["amount"] for item in recipe)
+    scale = size / current_total if current_total else 1
+    levels = dict(levels) if levels is not None else None
+    headroom = dict(headroom) if headroom is not None else None
+    calibration = load_calibration()
+    rates = {int(pump["id"]): flow_rate_of(pump, calibration) for pump in pumps} if headroom is not None else {}
+    planned = {"immediate": [], "delayed": [], "short": {}, "over_duty": {}}
+    for item in recipe:
+        # Math.round wie im Frontend (.5 rundet auf)
+        amount = math.floor(item["amount"] * scale + 0.5)
+        entries, short = distribute(item["ingredientId"], amount, pumps, levels, split_mode, calibration, headroom)
+        for entry in entries:
+            if levels is not None:
+                levels[entry["pump_id"]] = levels.get(entry["pump_id"], 0.0) - entry["ml"]
+            if headroom is not None:
+                left = headroom.get(entry["pump_id"], math.inf) - entry["ml"] / rates[entry["pump_id"]]
+                headroom[entry["pump_id"]] = max(0.0, left)
+                if left < 0:
+                    planned["over_duty"][entry["pump_id"]] = round(planned["over_duty"].get(entry["pump_id"], 0.0) - left, 1)
+            if item.get("pulse"):
+                entry["pulse"] = {"on_ms": int(item["pulse"]["onMs"]), "off_ms": int(item["pulse"]["offMs"])}
+        planned["delayed" if item.get("delayed") else "immediate"].extend(entries)
+        if short > 0:
+            planned["short"][item["ingredientId"]] = round(planned["short"].get(item["ingredientId"], 0) + short, 1)
+    return planned
+
+def digest(value):
+    """Kurzer, stabiler Hash eines JSON-fähigen Werts (Schlüssel für Plan-Caches)"""
+    return hashlib.sha1(json.dumps(value, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:16]
+
+def file_signature(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _bucket(value, needed, step):
+    # Wer mehr hat als das Rezept braucht, plant genauso wie mit genau ``needed`` –
+    # darunter wird abgerundet, damit ähnliche Füllstände denselben Plan teilen
+    if value >= needed:
+        return needed
+    return math.floor(max(0.0, value) / step) * step
+
+class PlanCache:
+    """LRU-Cache für Pläne; leert sich, sobald sich Pumpenkonfiguration oder Kalibrierung ändern"""
+
+    def __init__(self, max_entries=PLAN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.signature = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, signature, key, compute):
+        """Plan zu ``key``; ``compute()`` nur bei einem Fehltreffer"""
+        with self.lock:
+            if signature != self.signature:
+                self.entries.clear()
+                self.signature = signature
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key], True
+            self.misses += 1
+        value = compute()
+        with self.lock:
+            if self.signature == signature and self.max_entries > 0:
+                self.entries[key] = value
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return value, False
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+def plan_recipe_cached(cache, recipe, size, pumps, levels=None, split_mode=None, headroom=None, cocktail_id=None):
+    """plan_recipe() über ``cache``; liefert (plan, Treffer) – der Plan darf nicht verändert werden
+
+    Schlüssel: Cocktail-ID und Rezept-Hash, Größe, Verteilungsmodus sowie
+    Füllstände und Einschaltdauer-Spielraum der beteiligten Pumpen in Stufen
+    (PUMP_PLAN_LEVEL_BUCKET_ML bzw. 0,5 s). Geplant wird mit den gestuften Werten,
+    damit jeder Eintrag exakt zu seinem Schlüssel passt.
+    """
+    calibration = load_calibration()
+    signature = (digest(pumps), file_signature(CALIBRATION_PATH))
+    current_total = sum(item["amount"] for item in recipe)
+    scale = size / current_total if current_total else 1
+    needed = {}
+    for item in recipe:
+        needed[item["ingredientId"]] = needed.get(item["ingredientId"], 0) + math.floor(item["amount"] * scale + 0.5)
+    involved = [pump for ingredient in needed for pump in pumps_for_ingredient(ingredient, pumps)]
+
+    bucketed_levels = None
+    if levels is not None:
+        bucketed_levels = {
+            int(pump["id"]): _bucket(levels.get(int(pump["id"]), 0.0), needed[pump["ingredient"]], LEVEL_BUCKET_ML)
+            for pump in involved
+        }
+    bucketed_headroom = None
+    if headroom is not None:
+        bucketed_headroom = {
+            int(pump["id"]): _bucket(
+                headroom.get(int(pump["id"]), math.inf),
+                needed[pump["ingredient"]] / flow_rate_of(pump, calibration), HEADROOM_BUCKET_S,
+            )
+            for pump in involved
+        }
+    key = (
+        cocktail_id, digest(recipe), size, split_mode or DEFAULT_SPLIT_MODE,
+        tuple(sorted(bucketed_levels.items())) if bucketed_levels is not None else None,
+        tuple(sorted(bucketed_headroom.items())) if bucketed_headroom is not None else None,
+    )
+    return cache.get(signature, key, lambda: plan_recipe(recipe, size, pumps, bucketed_levels, split_mode, bucketed_headroom))
+
+def levels_by_pump(levels):
+    """[{"pumpId", "currentLevel"}, ...] -> {pump_id: ml}"""
+    return {int(level["pumpId"]): float(level["currentLevel"]) for level in levels}
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] != "recipe":
+        print(__doc__)
+        sys.exit(1)
+    try:
+        request = json.loads(sys.argv[2])
+        pumps = request.get("pumps") or load_pump_config()
+        levels = request.get("levels")
+        if levels is None:
+            from pump_levels import LevelStore
+            store = LevelStore(background=False)
+            levels = store.snapshot() if store.available else None
+        result = plan_recipe(
+            request["recipe"], request.get("size", 300), pumps,
+            levels_by_pump(levels) if levels is not None else None, request.get("split_mode"),
+        )
+    except (ValueError, KeyError, TypeError) as e:
+        print(json.dumps({"success": False, "error": f"Ungültige Anfrage: {e}"}))
+        sys.exit(1)
+    print(json.dumps({"success": True, **result}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+pump_queue.py — Bestellwarteschlange vor dem Pump-Server
+
+Bei vielen Bestellungen hintereinander wird jeder Dosierplan schon beim
+Einreihen vorbereitet (Kalibrierkurve, Strombudget-Scheduling), während das
+aktuelle Getränk noch läuft. Das nächste startet, sobald der Glaswechsel
+bestätigt ist ("confirm"); mit PUMP_QUEUE_CONFIRM=0 laufen die Bestellungen
+direkt nacheinander. Erreicht eine Bestellung die Spitze, werden ihre Mengen
+noch einmal gegen die aktuellen Füllstände geprüft – zwischen Einreihen und
+Start haben andere Getränke die Flaschen geleert.
+
+Kennzahlen: Getränke/Stunde (gleitendes Fenster), Wartezeit in der Schlange
+und Dauer pro Bestellung.
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+from pump_timing import summarize
+from pump_trace import save_trace, start_trace
+
+REQUIRE_CONFIRM = os.environ.get("PUMP_QUEUE_CONFIRM", "1") != "0"
+THROUGHPUT_WINDOW_S = 3600
+MAX_HISTORY = 200
+
+def _distribution(durations_s):
+    """min/mean/p99/max einer Liste von Dauern in ms"""
+    summary = summarize([duration * 1000 for duration in durations_s])
+    summary.pop("p99_abs_ms", None)
+    return summary
+
+class OrderQueue:
+    """Reiht Bestellungen ein und dosiert sie nacheinander über ``server``
+
+    ``server`` muss prepare(raw_plan, trace=None) -> stage, missing_ml(stages) und
+    run_prepared(stage, trace=None) anbieten (siehe PumpServer in pump_control.py).
+    """
+
+    def __init__(self, server, require_confirm=REQUIRE_CONFIRM):
+        self.server = server
+        self.require_confirm = require_confirm
+        self.cond = threading.Condition()
+        self.pending = deque()
+        self.current = None
+        self.glass_ready = True  # das erste Glas steht bereits
+        self.history = deque(maxlen=MAX_HISTORY)
+        self.ids = itertools.count(1)
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def enqueue(self, name, plan, delayed=None, delay_ms=0, order_id=None):
+        """Bereitet die Dosierpläne vor und hängt die Bestellung an; gibt Position und Vorbereitungszeit zurück"""
+        enqueued_at = time.monotonic()
+        trace = start_trace(name or "bestellung", getattr(self.server, "pump_ids", None))
+        stages = [self.server.prepare(plan, trace=trace)]
+        if delayed:
+            stages.append(self.server.prepare(delayed, trace=trace))
+        order = {
+            "id": str(order_id) if order_id is not None else str(next(self.ids)),
+            "name": name,
+            "state": "queued",
+            "stages": stages,
+            "delay_ms": int(delay_ms),
+            "cancel": threading.Event(),
+            "trace": trace,
+            "enqueued_at": enqueued_at,
+            "prepare_ms": round((time.monotonic() - enqueued_at) * 1000, 3),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+        }
+        with self.cond:
+            self.pending.append(order)
+            position = len(self.pending) + (self.current is not None)
+            self.cond.notify_all()
+        return {"success": True, "order_id": order["id"], "position": position, "prepare_ms": order["prepare_ms"]}
+
+    def confirm(self):
+        """Glaswechsel bestätigt – die nächste Bestellung darf starten"""
+        with self.cond:
+            if self.current is not None:
+                return {"success": False, "error": f"Bestellung {self.current['id']} läuft noch"}
+            self.glass_ready = True
+            self.cond.notify_all()
+            return {"success": True, "waiting": len(self.pending)}
+
+    def cancel(self, order_id=None):
+        """Entfernt eine wartende Bestellung bzw. bricht die laufende ab (ohne ID: alles)"""
+        with self.cond:
+            cancelled = [order for order in self.pending if order_id is None or order["id"] == str(order_id)]
+            for order in cancelled:
+                self.pending.remove(order)
+                order["state"] = "cancelled"
+                self.history.append(order)
+            current = self.current
+        if current is not None and (order_id is None or current["id"] == str(order_id)):
+            current["cancel"].set()
+            for pin in current["pins"]:
+                self.server.stop(pin)
+            cancelled.append(current)
+        return {"success": True, "cancelled": [order["id"] for order in cancelled]}
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.closed and not (self.pending and self.glass_ready):
+                    self.cond.wait()
+                if self.closed:
+                    return
+                order = self.pending.popleft()
+                order["pins"] = sorted({pin for stage in order["stages"] for pin, *_ in stage["schedule"]})
+                order["state"] = "pouring"
+                order["started_at"] = time.monotonic()
+                self.current = order
+                self.glass_ready = False
+            trace = order["trace"]
+            if trace is not None:
+                trace.complete("Warteschlange", "wait", order["enqueued_at"], order["started_at"])
+            results = []
+            stopped = False
+            try:
+                missing = self.server.missing_ml(order["stages"])
+                if missing:
+                    results.append({"success": False, "error": f"Füllstand reicht nicht (fehlende ml pro Pumpe: {missing})",
+                                    "missing_ml": missing})
+                for index, stage in enumerate(order["stages"] if not missing else []):
+                    # Pause vor verzögerten Zutaten, durch cancel unterbrechbar
+                    paused_at = time.monotonic()
+                    if index and order["cancel"].wait(order["delay_ms"] / 1000):
+                        break
+                    if index and trace is not None:
+                        trace.complete("Pause vor verzögerten Zutaten", "wait", paused_at, time.monotonic())
+                    # Heiße Pumpen lehnt run_prepared mit cooldown_ms ab (Einschaltdauer-Grenze,
+                    # siehe pump_duty.py) – abwarten und erneut versuchen
+                    result = self.server.run_prepared(stage, trace=trace)
+                    while result.get("cooldown_ms") and not order["cancel"].is_set():
+                        order["state"] = "cooling"
+                        cooling_from = time.monotonic()
+                        if order["cancel"].wait(result["cooldown_ms"] / 1000):
+                            break
+                        order["state"] = "pouring"
+                        if trace is not None:
+                            trace.complete("Abkühlen", "wait", cooling_from, time.monotonic())
+                        result = self.server.run_prepared(stage, trace=trace)
+                    results.append(result)
+                    # Not-Aus ("stop") ohne cancel: gestoppte Pumpen brechen die Bestellung ab
+                    stopped = any(pump.get("stopped") for pump in results[-1].get("pumps", []))
+                    if order["cancel"].is_set() or stopped or not results[-1].get("success"):
+                        break
+                if order["cancel"].is_set() or stopped:
+                    order["state"] = "cancelled"
+                else:
+                    order["state"] = "done" if all(result.get("success") for result in results) else "failed"
+            except Exception as e:
+                order["state"] = "failed"
+                results.append({"success": False, "error": str(e)})
+            save_trace(trace)
+            order["trace"] = None
+            with self.cond:
+                order["finished_at"] = time.monotonic()
+                order["result"] = results
+                self.history.append(order)
+                self.current = None
+                # ohne Ausschank steht das Glas noch leer bereit
+                poured = any(result.get("pumps") for result in results)
+                self.glass_ready = not self.require_confirm or not poured
+                self.cond.notify_all()
+
+    def depth(self):
+        """Wartende plus laufende Bestellungen"""
+        with self.cond:
+            return len(self.pending) + (self.current is not None)
+
+    def _describe(self, order, now):
+        started_at = order["started_at"]
+        finished_at = order["finished_at"]
+        return {
+            "id": order["id"],
+            "name": order["name"],
+            "state": order["state"],
+            "prepare_ms": order["prepare_ms"],
+            "wait_ms": round(((started_at or now) - order["enqueued_at"]) * 1000, 1),
+            "pour_ms": round(((finished_at or now) - started_at) * 1000, 1) if started_at else None,
+        }
+
+    def metrics(self, now=None):
+        """Getränke/Stunde im gleitenden Fenster, Warte- und Dosierzeiten der fertigen Bestellungen"""
+        now = time.monotonic() if now is None else now
+        with self.cond:
+            done = [order for order in self.history if order["state"] == "done"]
+        recent = [order for order in done if now - order["finished_at"] <= THROUGHPUT_WINDOW_S]
+        window_s = now - min((order["started_at"] for order in recent), default=now)
+        return {
+            "completed": len(done),
+            "drinks_per_hour": round(len(recent) * 3600 / window_s, 1) if window_s > 0 else 0.0,
+            "window_s": round(window_s, 1),
+            "wait_ms": _distribution([order["started_at"] - order["enqueued_at"] for order in done]),
+            "pour_ms": _distribution([order["finished_at"] - order["started_at"] for order in done]),
+        }
+
+    def status(self):
+        now = time.monotonic()
+        with self.cond:
+            current = self._describe(self.current, now) if self.current is not None else None
+            pending = [self._describe(order, now) for order in self.pending]
+            recent = [self._describe(order, now) for order in list(self.history)[-10:]]
+            glass_ready = self.glass_ready
+        return {
+            "success": True,
+            "current": current,
+            "pending": pending,
+            "recent": recent,
+            "glass_ready": glass_ready,
+            "metrics": self.metrics(now),
+        }
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.cancel()
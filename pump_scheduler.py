@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+pump_scheduler.py — verteilt einen Dosierplan so, dass das Netzteil nicht überlastet wird
+
+Alle 18 Relais gleichzeitig bringen das 12-V-Netzteil in die Knie, strikt
+nacheinander dauert jeder Drink ewig. schedule_jobs() packt die Pumpen nach
+Longest-Job-First in ein Budget aus "maximal gleichzeitig" und/oder Strom.
+
+Die Grenzen stehen in data/pump-power.json, z.B.
+  {
+    "maxSimultaneous": 6,
+    "currentBudgetAmps": 8.0,
+    "defaultPumpCurrentAmps": 1.2,
+    "pumpCurrentAmps": {"17": 1.5}
+  }
+Fehlt die Datei, laufen wie bisher alle Pumpen gleichzeitig.
+
+Vorschau ohne Hardware:
+  python3 pump_scheduler.py '[[17, 4000], [18, 1200], [27, 800]]' --max-simultaneous 2
+"""
+
+import argparse
+import heapq
+import json
+import os
+
+POWER_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "pump-power.json")
+DEFAULT_PUMP_CURRENT_AMPS = 1.0
+
+def load_power_config(config_path=POWER_CONFIG_PATH):
+    """Liest data/pump-power.json als Keyword-Argumente für schedule_jobs()"""
+    try:
+        with open(config_path, "r") as config_file:
+            raw = json.load(config_file)
+    except (OSError, ValueError):
+        return {}
+    return {
+        "max_simultaneous": raw.get("maxSimultaneous"),
+        "current_budget_amps": raw.get("currentBudgetAmps"),
+        "default_pump_current_amps": raw.get("defaultPumpCurrentAmps", DEFAULT_PUMP_CURRENT_AMPS),
+        "pump_current_amps": {int(pin): float(amps) for pin, amps in raw.get("pumpCurrentAmps", {}).items()},
+    }
+
+class PowerBudget:
+    """Belegung von "maximal gleichzeitig" und Strom durch die gerade laufenden Pumpen
+
+    Dieselbe Buchführung dient der Planung (schedule_jobs, pump_timeline) und
+    der Ausführung (pump_control.run_schedule), die eine Pumpe erst einschaltet,
+    wenn ihr Budget tatsächlich frei ist.
+    """
+
+    def __init__(self, max_simultaneous=None, current_budget_amps=None,
+                 pump_current_amps=None, default_pump_current_amps=DEFAULT_PUMP_CURRENT_AMPS):
+        if max_simultaneous is not None and max_simultaneous < 1:
+            raise ValueError("maxSimultaneous muss mindestens 1 sein")
+        self.max_simultaneous = max_simultaneous
+        self.current_budget_amps = current_budget_amps
+        self.pump_current_amps = pump_current_amps or {}
+        self.default_pump_current_amps = default_pump_current_amps
+        self.running = set()
+        self.used_amps = 0.0
+
+    def current_of(self, pin):
+        return self.pump_current_amps.get(pin, self.default_pump_current_amps)
+
+    def check(self, pins):
+        """ValueError, wenn eine Pumpe allein schon mehr Strom braucht als das Budget"""
+        if self.current_budget_amps is None:
+            return
+        too_big = sorted({pin for pin in pins if self.current_of(pin) > self.current_budget_amps})
+        if too_big:
+            raise ValueError(f"Pumpen an Pin {too_big} brauchen mehr Strom als das Budget von {self.current_budget_amps}A")
+
+    def fits(self, pin):
+        fits_count = self.max_simultaneous is None or len(self.running) < self.max_simultaneous
+        fits_current = (self.current_budget_amps is None
+                        or self.used_amps + self.current_of(pin) <= self.current_budget_amps + 1e-9)
+        return fits_count and fits_current
+
+    def acquire(self, pin):
+        self.running.add(pin)
+        self.used_amps += self.current_of(pin)
+
+    def release(self, pin):
+        if pin in self.running:
+            self.running.discard(pin)
+            self.used_amps -= self.current_of(pin)
+
+def schedule_jobs(plan, max_simultaneous=None, current_budget_amps=None,
+                  pump_current_amps=None, default_pump_current_amps=DEFAULT_PUMP_CURRENT_AMPS):
+    """Plant [(pin, duration_ms), ...] als [(pin, start_ms, duration_ms), ...]
+
+    Longest-Job-First-Listenplanung: sobald Budget frei wird, startet die
+    längste noch wartende Pumpe, die hineinpasst (kürzere füllen Lücken auf).
+    Die Startzeiten sind frühestmögliche Zeitpunkte – schaltet ein Relais
+    später ab als geplant, hält run_schedule die nächste Pumpe zurück.
+    """
+    budget = PowerBudget(max_simultaneous, current_budget_amps, pump_current_amps, default_pump_current_amps)
+    budget.check(pin for pin, _ in plan)
+
+    waiting = sorted(plan, key=lambda job: (-job[1], job[0]))
+    running = []  # Heap aus (end_ms, pin)
+    now_ms = 0
+    schedule = []
+    while waiting:
+        still_waiting = []
+        for pin, duration_ms in waiting:
+            if budget.fits(pin):
+                schedule.append((pin, now_ms, duration_ms))
+                heapq.heappush(running, (now_ms + duration_ms, pin))
+                budget.acquire(pin)
+            else:
+                still_waiting.append((pin, duration_ms))
+        waiting = still_waiting
+        if waiting:
+            # Zeit bis zum nächsten Abschalten vorspulen und dessen Budget freigeben
+            now_ms = running[0][0]
+            while running and running[0][0] <= now_ms:
+                _, pin = heapq.heappop(running)
+                budget.release(pin)
+
+    planned_total_ms = max((start + duration for _, start, duration in schedule), default=0)
+    return {
+        "schedule": schedule,
+        "planned_total_ms": planned_total_ms,
+        "lower_bound_ms": _lower_bound_ms(plan, budget.current_of, max_simultaneous, current_budget_amps),
+    }
+
+def _lower_bound_ms(plan, current_of, max_simultaneous, current_budget_amps):
+    # Keine Planung kann schneller sein als die längste Pumpe bzw. die Gesamtarbeit durch das Budget
+    bound = max((duration for _, duration in plan), default=0)
+    if max_simultaneous:
+        bound = max(bound, sum(duration for _, duration in plan) / max_simultaneous)
+    if current_budget_amps:
+        bound = max(bound, sum(duration * current_of(pin) for pin, duration in plan) / current_budget_amps)
+    return round(bound, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Vorschau der Pumpen-Planung")
+    parser.add_argument("plan", help="JSON-Liste aus [pin, duration_ms]")
+    parser.add_argument("--max-simultaneous", type=int, default=None)
+    parser.add_argument("--current-budget", type=float, default=None, help="Strombudget in A")
+    args = parser.parse_args()
+
+    limits = load_power_config()
+    if args.max_simultaneous is not None:
+        limits["max_simultaneous"] = args.max_simultaneous
+    if args.current_budget is not None:
+        limits["current_budget_amps"] = args.current_budget
+
+    plan = [(int(pin), int(duration_ms)) for pin, duration_ms in json.loads(args.plan)]
+    print(json.dumps(schedule_jobs(plan, **limits)))
+
+if __name__ == "__main__":
+    main()
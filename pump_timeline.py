@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+pump_timeline.py — deklarative Dosier-Zeitleiste für geschichtete Drinks
+
+Jeder Schritt hat einen Startversatz, eine Dauer (bzw. ml) und optional ein
+Impulsmuster, z.B. Grenadine langsam einschichten:
+
+  {"steps": [
+    {"pin": 17, "pump_id": 1, "ml": 40, "flow_rate": 20},
+    {"pin": 18, "pump_id": 2, "ml": 20, "flow_rate": 20},
+    {"pin": 22, "pump_id": 6, "ml": 10, "flow_rate": 20,
+     "after": [17, 18], "offset_ms": 2000, "pulse": {"on_ms": 200, "off_ms": 300}}
+  ]}
+
+``after`` startet einen Schritt ``offset_ms`` nach dem Ende der genannten Pins,
+ohne ``after`` zählt ``offset_ms`` ab Planstart. Alle Schritte teilen sich
+das Strombudget aus pump_scheduler; ein startbereiter Schritt wartet, bis
+er hineinpasst.
+pump_control.py führt die ganze Zeitleiste gegen eine gemeinsame Uhr aus.
+
+Vorschau ohne Hardware:
+  python3 pump_timeline.py '{"steps": [...]}'
+"""
+
+import heapq
+import json
+import sys
+
+from pump_calibration import duration_for
+from pump_scheduler import PowerBudget, load_power_config
+
+def wall_ms(duration_ms, pulse=None):
+    """Gesamtdauer eines Schritts inklusive der Pausen zwischen den Impulsen"""
+    if not pulse or duration_ms <= 0:
+        return duration_ms
+    on_ms, off_ms = pulse
+    pulses = -(-duration_ms // on_ms)  # aufrunden
+    return duration_ms + (pulses - 1) * off_ms
+
+def _parse_step(step, doses):
+    pin = int(step["pin"])
+    if "ml" in step:
+        duration_ms = duration_for(step.get("pump_id"), float(step["ml"]), float(step["flow_rate"]))
+        if doses is not None and step.get("pump_id") is not None:
+            doses[pin] = (int(step["pump_id"]), float(step["ml"]))
+    else:
+        duration_ms = float(step["duration_ms"])
+    pulse = step.get("pulse")
+    if pulse:
+        pulse = (int(pulse["on_ms"]), int(pulse["off_ms"]))
+        if pulse[0] <= 0 or pulse[1] < 0:
+            raise ValueError(f"Ungültiges Impulsmuster an Pin {pin}: {step['pulse']}")
+    return {
+        "pin": pin,
+        "duration_ms": int(round(duration_ms)),
+        "offset_ms": int(step.get("offset_ms", 0)),
+        "after": [int(p) for p in step.get("after", [])],
+        "pulse": pulse,
+    }
+
+def compile_timeline(raw_timeline, doses=None, limits=None):
+    """Löst Versätze und Abhängigkeiten auf; liefert {"schedule": [(pin, start_ms, duration_ms, pulse)], ...}
+
+    ``doses`` wird wie bei pump_control.parse_plan mit pin -> (pump_id, ml) gefüllt.
+    """
+    if isinstance(raw_timeline, str):
+        raw_timeline = json.loads(raw_timeline)
+    steps = [_parse_step(step, doses) for step in raw_timeline["steps"]]
+    by_pin = {step["pin"]: step for step in steps}
+    if len(by_pin) != len(steps):
+        raise ValueError("Jeder Pin darf in der Zeitleiste nur einmal vorkommen")
+    for step in steps:
+        unknown = [pin for pin in step["after"] if pin not in by_pin]
+        if unknown:
+            raise ValueError(f"Pin {step['pin']} wartet auf unbekannte Pins {unknown}")
+
+    # Alle Schritte teilen sich ein Strombudget über die ganze Zeitleiste: ein Schritt
+    # ist ab dem Ende seiner after-Pins + offset_ms startbereit und läuft an, sobald
+    # er ins Budget passt (längster zuerst, kürzere füllen Lücken wie in pump_scheduler)
+    limits = load_power_config() if limits is None else limits
+    budget = PowerBudget(**limits)
+    budget.check(by_pin)
+    start_ms = {}
+
+    def end_ms(pin):
+        return start_ms[pin] + wall_ms(by_pin[pin]["duration_ms"], by_pin[pin]["pulse"])
+
+    running = []  # Heap aus (end_ms, pin)
+    now_ms = 0
+    waiting = sorted(steps, key=lambda step: (-wall_ms(step["duration_ms"], step["pulse"]), step["pin"]))
+    while waiting:
+        release_ms = {
+            step["pin"]: step["offset_ms"] + max((end_ms(pin) for pin in step["after"]), default=0)
+            for step in waiting if all(pin in start_ms for pin in step["after"])
+        }
+        if not release_ms and not running:
+            raise ValueError(f"Zyklische Abhängigkeit zwischen Pins {sorted(step['pin'] for step in waiting)}")
+        still_waiting = []
+        for step in waiting:
+            pin = step["pin"]
+            released = pin in release_ms and release_ms[pin] <= now_ms
+            if released and (not budget.running or budget.fits(pin)):
+                start_ms[pin] = now_ms
+                heapq.heappush(running, (end_ms(pin), pin))
+                budget.acquire(pin)
+            else:
+                still_waiting.append(step)
+        waiting = still_waiting
+        if waiting:
+            # bis zum nächsten Abschalten bzw. zur nächsten Startbereitschaft vorspulen
+            upcoming = [release for release in release_ms.values() if release > now_ms]
+            if running:
+                upcoming.append(running[0][0])
+            now_ms = min(upcoming)
+            while running and running[0][0] <= now_ms:
+                _, pin = heapq.heappop(running)
+                budget.release(pin)
+
+    schedule = sorted(
+        ((step["pin"], start_ms[step["pin"]], step["duration_ms"], step["pulse"]) for step in steps),
+        key=lambda entry: (entry[1], entry[0]),
+    )
+    planned_total_ms = max((start + wall_ms(duration, pulse) for _, start, duration, pulse in schedule), default=0)
+    return {"schedule": schedule, "planned_total_ms": planned_total_ms, "lower_bound_ms": planned_total_ms}
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    try:
+        result = compile_timeline(sys.argv[1])
+    except (ValueError, KeyError, TypeError) as e:
+        print(json.dumps({"success": False, "error": f"Ungültige Zeitleiste: {e}"}))
+        sys.exit(1)
+    print(json.dumps({"success": True, **result}))
+
+if __name__ == "__main__":
+    main()
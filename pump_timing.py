@@ -0,0 +1,80 @@
+"""
+pump_timing.py — präzise Dosier-Zeitmessung für die Pumpen-Relais
+
+time.sleep() überschreitet unter Last (Kiosk-Chromium) gerne um einige zehn
+Millisekunden. sleep_until() schläft deshalb nur grob bis kurz vor die
+monotone Deadline und wartet die letzten Millisekunden aktiv ab.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+
+SPIN_THRESHOLD_S = 0.002  # die letzten 2 ms werden aktiv abgewartet
+MAX_SAMPLES = 1000
+
+def sleep_until(deadline, wake=None):
+    """Wartet bis zur monotonen Deadline; True, wenn ``wake`` vorher gesetzt wurde"""
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        if remaining > SPIN_THRESHOLD_S:
+            if wake is None:
+                time.sleep(remaining - SPIN_THRESHOLD_S)
+            elif wake.wait(remaining - SPIN_THRESHOLD_S):
+                return True
+        elif wake is not None and wake.is_set():
+            return True
+
+def measurement(pin, requested_ms, on_at, off_at, stopped=False):
+    """Soll- und gemessene Relais-Einschaltzeit eines Pins als JSON-fähiges dict"""
+    measured_ms = (off_at - on_at) * 1000
+    return {
+        "pin": pin,
+        "duration_ms": requested_ms,
+        "measured_ms": round(measured_ms, 3),
+        "error_ms": round(measured_ms - requested_ms, 3),
+        "stopped": stopped,
+    }
+
+def percentile(sorted_values, fraction):
+    """Nearest-Rank-Perzentil einer bereits sortierten Liste"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(errors_ms):
+    """min/mean/p99/max der Dosierfehler (gemessen - Soll) in ms"""
+    values = sorted(errors_ms)
+    if not values:
+        return {"count": 0}
+    absolute = sorted(abs(v) for v in values)
+    return {
+        "count": len(values),
+        "min_ms": round(values[0], 3),
+        "mean_ms": round(sum(values) / len(values), 3),
+        "p99_ms": round(percentile(values, 0.99), 3),
+        "max_ms": round(values[-1], 3),
+        "p99_abs_ms": round(percentile(absolute, 0.99), 3),
+    }
+
+class TimingStats:
+    """Sammelt Dosierfehler über viele Läufe (die letzten MAX_SAMPLES Messungen)"""
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.lock = threading.Lock()
+        self.errors_ms = deque(maxlen=max_samples)
+
+    def record(self, pumps):
+        # Abgebrochene Dosierungen verfälschen die Statistik und werden übersprungen
+        with self.lock:
+            for pump in pumps:
+                if not pump.get("stopped"):
+                    self.errors_ms.append(pump["error_ms"])
+
+    def summary(self):
+        with self.lock:
+            return summarize(list(self.errors_ms))
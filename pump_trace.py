@@ -0,0 +1,129 @@
+"""
+pump_trace.py — Chrome/Perfetto-Trace pro Dosierung
+
+Mit PUMP_TRACE_DIR=data/traces schreibt der Pump-Layer für jeden Dosierplan
+bzw. jede Bestellung eine Trace-Event-JSON-Datei (ui.perfetto.dev oder
+chrome://tracing). Enthalten sind Spans für Prozessstart (CLI ohne Server),
+Planberechnung, Warteschlange und Pausen, jede Relais-Einschaltphase pro Pin
+und das Verbuchen der Füllstände (ohne Server auch deren Schreiben – im
+Server schreibt pump_levels.py gebündelt im Hintergrund). Ohne PUMP_TRACE_DIR
+liefert start_trace() None und es entsteht kein Aufwand.
+
+Es werden höchstens PUMP_TRACE_KEEP (50) Dateien behalten.
+"""
+
+import json
+import os
+import sys
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+TRACE_DIR = os.environ.get("PUMP_TRACE_DIR", "")
+TRACE_KEEP = int(os.environ.get("PUMP_TRACE_KEEP", "50"))
+PLAN_TID = 0  # Zeile für Plan, Warten und Füllstände; Relais bekommen ihre Pin-Nummer
+
+class Trace:
+    """Sammelt Spans einer Dosierung; Zeiten sind time.monotonic()-Sekunden"""
+
+    def __init__(self, name, pump_ids=None):
+        self.name = name
+        self.pump_ids = pump_ids or {}
+        self.lock = threading.Lock()
+        self.started = datetime.now()
+        self.events = []
+        self.pins = set()
+
+    def complete(self, name, cat, start, end, tid=PLAN_TID, args=None):
+        event = {
+            "name": name, "cat": cat, "ph": "X", "pid": 1, "tid": tid,
+            "ts": start, "dur": round(max(0.0, end - start) * 1e6, 1),
+        }
+        if args:
+            event["args"] = args
+        with self.lock:
+            self.events.append(event)
+            if tid != PLAN_TID:
+                self.pins.add(tid)
+
+    @contextmanager
+    def span(self, name, cat, tid=PLAN_TID, **args):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.complete(name, cat, start, time.monotonic(), tid, args)
+
+    def relays(self, intervals):
+        """[(pin, on_at, off_at), ...] aus run_schedule -> ein Span pro Einschaltphase"""
+        for pin, on_at, off_at in intervals:
+            self.complete("Relais an", "relay", on_at, off_at, pin, {"pump_id": self.pump_ids.get(pin)})
+
+    def to_json(self):
+        with self.lock:
+            # Zeitachse beginnt mit dem frühesten Span (z.B. dem Prozessstart vor dem Trace)
+            origin = min((event["ts"] for event in self.events), default=0.0)
+            events = [dict(event, ts=round((event["ts"] - origin) * 1e6, 1)) for event in self.events]
+            pins = sorted(self.pins)
+        # Zeilennamen für den Viewer
+        names = [(PLAN_TID, "Plan")] + [
+            (pin, f"Pin {pin}" + (f" (Pumpe {self.pump_ids[pin]})" if pin in self.pump_ids else "")) for pin in pins
+        ]
+        metadata = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"Pump-Layer: {self.name}"}}]
+        metadata += [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}} for tid, name in names
+        ]
+        metadata += [
+            {"name": "thread_sort_index", "ph": "M", "pid": 1, "tid": tid, "args": {"sort_index": tid}} for tid, _ in names
+        ]
+        return {
+            "traceEvents": metadata + sorted(events, key=lambda event: event["ts"]),
+            "displayTimeUnit": "ms",
+            "otherData": {"name": self.name, "started": self.started.isoformat(timespec="milliseconds")},
+        }
+
+    def save(self, directory=None):
+        """Schreibt den Trace nach ``directory`` (PUMP_TRACE_DIR) und gibt den Pfad zurück"""
+        directory = directory or TRACE_DIR
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "-", self.name).strip("-") or "plan"
+        path = os.path.join(directory, f"{self.started:%Y%m%d-%H%M%S-%f}-{slug}.json")
+        with open(path, "w") as trace_file:
+            json.dump(self.to_json(), trace_file)
+        _prune(directory)
+        return path
+
+def _prune(directory, keep=TRACE_KEEP):
+    traces = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+    for name in traces[:-keep] if keep > 0 else []:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+def start_trace(name, pump_ids=None):
+    """Neuer Trace oder None, wenn PUMP_TRACE_DIR nicht gesetzt ist"""
+    return Trace(name, pump_ids) if TRACE_DIR else None
+
+def save_trace(trace):
+    # Tracing darf eine Dosierung nie scheitern lassen
+    if trace is None:
+        return None
+    try:
+        return trace.save()
+    except OSError as e:
+        print(f"Trace konnte nicht geschrieben werden: {e}", file=sys.stderr)
+        return None
+
+def process_start():
+    """Startzeit des eigenen Prozesses auf der monotonen Uhr (Linux), sonst None"""
+    try:
+        with open("/proc/self/stat", "r") as stat_file:
+            # Feld 22 (starttime) in Ticks seit dem Booten; der Prozessname kann Leerzeichen enthalten
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        started_since_boot = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return time.monotonic() - (time.clock_gettime(time.CLOCK_BOOTTIME) - started_since_boot)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
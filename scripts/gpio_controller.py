@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
-import RPi.GPIO as GPIO
 import sys
 import time
 import json
 import os
 import traceback
 
+# Die API-Route startet dieses Skript direkt (python3 scripts/gpio_controller.py), das
+# Projektverzeichnis ist also nicht automatisch im Suchpfad. pump_gpio.py und pump_timing.py
+# liegen dort neben pump_control.py, das sie ebenfalls importiert – eine Kopie hier in
+# scripts/ würde auseinanderlaufen.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pump_gpio import get_backend
+from pump_timing import measurement, sleep_until
+
 # Debugging-Informationen
 print("Python-Skript wird ausgeführt...")
 print(f"Arbeitsverzeichnis: {os.getcwd()}")
@@ -13,60 +20,141 @@ print(f"Python-Version: {sys.version}")
 print(f"Argumente: {sys.argv}")
 
 try:
-    # GPIO-Modus setzen
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setwarnings(False)
-    print("GPIO-Modus auf BCM gesetzt")
+    # GPIO-Backend laden (RPi.GPIO im BCM-Modus, PUMP_GPIO_BACKEND=sim für Tests ohne Pi)
+    GPIO = get_backend()
+    print(f"GPIO-Backend {GPIO.name} geladen")
 except Exception as e:
-    print(f"Fehler beim Setzen des GPIO-Modus: {str(e)}")
+    print(f"Fehler beim Laden des GPIO-Backends: {str(e)}")
     print(traceback.format_exc())
     # Gib trotzdem ein JSON-Objekt zurück, damit die API-Route es parsen kann
-    print(json.dumps({"success": False, "error": f"Fehler beim Setzen des GPIO-Modus: {str(e)}"}))
+    print(json.dumps({"success": False, "error": f"Fehler beim Laden des GPIO-Backends: {str(e)}"}))
     sys.exit(1)
 
+# Zuletzt bekannter Pin-Zustand über Prozessgrenzen hinweg (RPi.GPIO behält die
+# Konfiguration bis zum cleanup). Nach einem Neustart ist der Zustand ungültig,
+# nach einem cleanup (auch aus pump_control.py) zeigt es die Pin-Funktion.
+GPIO_STATE_PATH = os.environ.get("GPIO_STATE_PATH", "/tmp/cocktailbot-gpio-state.json")
+PUMP_CONFIG_PATH = os.path.join(os.getcwd(), "data", "pump-config.json")
+# BCM-Pins 2-27 auf der Stiftleiste, falls keine Pump-Config existiert
+DEFAULT_PINS = list(range(2, 28))
+PIN_STATE = "out:LOW"
+
+def _boot_id():
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r") as boot_id_file:
+            return boot_id_file.read().strip()
+    except OSError:
+        return None
+
+def load_state():
+    """{"boot_id", "backend", "config_mtime", "desired": [...], "pins": {pin: state}}"""
+    try:
+        with open(GPIO_STATE_PATH, "r") as state_file:
+            state = json.load(state_file)
+        if state.get("boot_id") == _boot_id() and state.get("backend") == GPIO.name:
+            return state
+    except (OSError, ValueError):
+        pass
+    return {"boot_id": _boot_id(), "backend": GPIO.name, "config_mtime": None, "desired": None, "pins": {}}
+
+def save_state(state):
+    tmp_path = f"{GPIO_STATE_PATH}.tmp"
+    with open(tmp_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(tmp_path, GPIO_STATE_PATH)
+
+def desired_pins(state):
+    """Gewünschte Pins aus der Pump-Config – neu geparst nur, wenn sich deren mtime geändert hat"""
+    try:
+        mtime = os.stat(PUMP_CONFIG_PATH).st_mtime_ns
+    except OSError:
+        mtime = None
+    if state["desired"] is not None and state["config_mtime"] == mtime:
+        return state["desired"], True
+    if mtime is None:
+        print("Pump-Config-Datei nicht gefunden, verwende Standard-Pins")
+        pins = DEFAULT_PINS
+    else:
+        with open(PUMP_CONFIG_PATH, "r") as pump_config_file:
+            pins = sorted({int(pump["pin"]) for pump in json.load(pump_config_file)})
+    state["config_mtime"] = mtime
+    state["desired"] = pins
+    return pins, False
+
+def _is_output(pin):
+    try:
+        return GPIO.is_output(pin)
+    except Exception:
+        return False  # im Zweifel neu konfigurieren
+
 def setup_pins():
-    """Alle Pins initialisieren"""
+    """Pins mit der Pump-Config abgleichen und nur abweichende neu konfigurieren"""
     try:
-        # Versuche, die Pump-Config zu laden
-        pump_config_path = os.path.join(os.getcwd(), "data", "pump-config.json")
-        print(f"Suche Pump-Config unter: {pump_config_path}")
-        
-        if os.path.exists(pump_config_path):
-            print(f"Pump-Config gefunden: {pump_config_path}")
-            with open(pump_config_path, "r") as pump_config_file:
-                pump_config = json.load(pump_config_file)
-            
-            print(f"Pump-Config geladen: {pump_config}")
-            
-            # Initialisiere alle Pins aus der Konfiguration
-            for pump in pump_config:
-                pin = pump["pin"]
-                setup_pin(pin)
-                # Stelle sicher, dass der Pin ausgeschaltet ist
-                GPIO.output(pin, GPIO.LOW)
-                print(f"Pin {pin} initialisiert und auf LOW gesetzt")
+        state = load_state()
+        pins, cached = desired_pins(state)
+        known = state["pins"]
+        # Dem Cache wird vertraut. cleanup() eines anderen Prozesses setzt alle Pins zugleich
+        # auf Eingang zurück – das zeigt schon ein einzelner Pin, erst dann werden alle geprüft.
+        # Die Simulation hält keinen Zustand zwischen Prozessen, dort gilt nur der Cache.
+        cached_pins = [pin for pin in pins if known.get(str(pin)) == PIN_STATE]
+        if GPIO.persistent and cached_pins and not _is_output(cached_pins[0]):
+            print("Pin-Cache veraltet (cleanup durch anderen Prozess?), prüfe alle Pins")
+            stale = {pin for pin in cached_pins if not _is_output(pin)}
         else:
-            print("Pump-Config-Datei nicht gefunden, verwende Standard-Pins")
-            # Initialisiere Standard-Pins (1-28)
-            for pin in range(1, 28):
-                try:
-                    setup_pin(pin)
-                    GPIO.output(pin, GPIO.LOW)
-                    print(f"Pin {pin} initialisiert und auf LOW gesetzt")
-                except Exception as pin_error:
-                    print(f"Fehler beim Initialisieren von Pin {pin}: {str(pin_error)}")
-        
-        return {"success": True, "message": "Pins erfolgreich initialisiert"}
+            stale = set()
+        changed = [pin for pin in pins if known.get(str(pin)) != PIN_STATE or pin in stale]
+        removed = sorted(int(pin) for pin in known if int(pin) not in pins)
+        failed = []
+
+        if changed:
+            try:
+                # Alle abweichenden Pins mit einem Aufruf als Ausgang (LOW = aus) konfigurieren
+                GPIO.setup(changed, GPIO.LOW)
+            except Exception as e:
+                # Einzeln nachziehen, um ungültige Pins zu finden
+                print(f"Sammel-Setup fehlgeschlagen ({e}), konfiguriere Pins einzeln")
+                for pin in changed:
+                    try:
+                        GPIO.setup([pin], GPIO.LOW)
+                    except Exception as pin_error:
+                        print(f"Fehler beim Initialisieren von Pin {pin}: {str(pin_error)}")
+                        failed.append(pin)
+        for pin in changed:
+            if pin not in failed:
+                known[str(pin)] = PIN_STATE
+        for pin in removed:
+            known.pop(str(pin), None)
+        save_state(state)
+
+        return {
+            "success": True,
+            "message": "Pins erfolgreich initialisiert",
+            "diff": {
+                "configured": [pin for pin in changed if pin not in failed],
+                "removed": removed,
+                "failed": failed,
+                "unchanged": len(pins) - len(changed),
+                "config_cached": cached,
+            },
+        }
     except Exception as e:
         print(f"Fehler beim Initialisieren der Pins: {str(e)}")
         print(traceback.format_exc())
         return {"success": False, "error": f"Fehler beim Initialisieren der Pins: {str(e)}"}
 
+def forget_pin(pin):
+    """Pin beim nächsten setup neu konfigurieren (sein Pegel ist nicht mehr bekannt)"""
+    try:
+        state = load_state()
+        if state["pins"].pop(str(pin), None) is not None:
+            save_state(state)
+    except OSError as e:
+        print(f"Pin-Zustand konnte nicht gespeichert werden: {e}")
+
 def setup_pin(pin):
     """Pin als Ausgang konfigurieren"""
     try:
-        GPIO.setup(pin, GPIO.OUT)
-        GPIO.output(pin, GPIO.LOW)
+        GPIO.setup([pin], GPIO.LOW)
         print(f"Pin {pin} als Ausgang konfiguriert")
     except Exception as e:
         print(f"Fehler beim Konfigurieren von Pin {pin}: {str(e)}")
@@ -77,7 +165,9 @@ def activate_pump(pin, duration_ms):
     try:
         print(f"Aktiviere Pumpe an Pin {pin} für {duration_ms}ms")
         
-        # Pin als Ausgang konfigurieren
+        # Pin als Ausgang konfigurieren; stirbt der Prozess, während die Pumpe läuft,
+        # darf setup den Pin nicht als "aus" überspringen – das nächste setup zieht ihn neu
+        forget_pin(pin)
         setup_pin(pin)
         
         # Stelle sicher, dass der Pin ausgeschaltet ist, bevor er eingeschaltet wird
@@ -87,15 +177,17 @@ def activate_pump(pin, duration_ms):
         # Pumpe einschalten
         print(f"Setze Pin {pin} auf HIGH")
         GPIO.output(pin, GPIO.HIGH)
+        on_at = time.monotonic()
         
-        # Warte für die angegebene Zeit
-        time.sleep(duration_ms / 1000.0)
+        # Warte bis zur Deadline (grob schlafen, Rest aktiv warten)
+        sleep_until(on_at + duration_ms / 1000.0)
         
         # Pumpe ausschalten
-        print(f"Setze Pin {pin} auf LOW")
         GPIO.output(pin, GPIO.LOW)
+        timing = measurement(pin, duration_ms, on_at, time.monotonic())
+        print(f"Pin {pin} auf LOW gesetzt nach {timing['measured_ms']}ms")
         
-        return {"success": True, "message": f"Pumpe an Pin {pin} für {duration_ms}ms aktiviert"}
+        return {"success": True, "message": f"Pumpe an Pin {pin} für {duration_ms}ms aktiviert", "timing": timing}
     except Exception as e:
         print(f"Fehler beim Aktivieren der Pumpe an Pin {pin}: {str(e)}")
         print(traceback.format_exc())
@@ -106,6 +198,9 @@ def cleanup():
     try:
         print("Bereinige alle GPIO-Pins")
         GPIO.cleanup()
+        # Nach cleanup sind alle Pins wieder Eingänge
+        if os.path.exists(GPIO_STATE_PATH):
+            os.unlink(GPIO_STATE_PATH)
         return {"success": True, "message": "GPIO-Pins erfolgreich bereinigt"}
     except Exception as e:
         print(f"Fehler beim Bereinigen der GPIO-Pins: {str(e)}")
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+asyncio client for the Raspberry Pico 2 LED firmware (JSON lines over USB serial)
+
+The serial fd is registered with the event loop and read non-blockingly, so
+several commands can be in flight at once: writes are pipelined and every
+response is matched to its caller by the echoed "id" (or in send order for
+firmware without id echo). No thread per request:
+
+  async with AsyncLEDClient() as leds:
+      await asyncio.gather(leds.set_making({"color": "#ff8800"}), leds.brightness(80))
+
+Commands return the firmware's response dict, failures come back as
+{"success": False, "error": ...} like LEDController in led_controller.py.
+Firmware that answers the HELLO handshake gets binary frames (led_protocol.py)
+matched by sequence number, older firmware JSON lines.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import time
+
+import serial
+
+import led_protocol
+from pico_port import find_port
+
+PICO_SERIAL_PORTS = ["/dev/ttyACM0", "/dev/ttyACM1", "/dev/ttyUSB0", "/dev/ttyUSB1"]
+PICO_BAUD_RATE = 115200
+COMMAND_TIMEOUT = 3
+READ_SIZE = 4096
+
+def probe_pico(port):
+    """Blocking check that the LED firmware answers on ``port`` (run in an executor)"""
+    with serial.Serial(port, PICO_BAUD_RATE, timeout=1) as test_serial:
+        time.sleep(0.5)  # Give device time to initialize
+        if led_protocol.handshake(test_serial):
+            return True
+        test_serial.reset_input_buffer()
+        test_serial.write((json.dumps({"command": "get_status", "data": {}}) + "\n").encode())
+        response = test_serial.readline().decode(errors="replace").strip()
+    return bool(response) and "success" in response
+
+class AsyncLEDClient:
+    def __init__(self, port=None, baud=PICO_BAUD_RATE, timeout=COMMAND_TIMEOUT):
+        self.port = port
+        self.baud = baud
+        self.timeout = timeout
+        self.serial_connection = None
+        self.loop = None
+        self.fd = None
+        self.buffer = b""
+        self.outgoing = bytearray()
+        # request id -> Future, in send order (dicts keep insertion order)
+        self.pending = {}
+        self.request_ids = itertools.count(1)
+        self.connected = False
+        # HELLO reply of the firmware; None means the legacy JSON line protocol
+        self.capabilities = None
+        self.frames = led_protocol.FrameReader()
+
+    async def connect(self):
+        """Find and open the Pico; True once the fd is registered with the loop"""
+        self.loop = asyncio.get_running_loop()
+        if self.port is None:
+            # Discovery blocks on serial timeouts - keep it off the event loop
+            self.port = await self.loop.run_in_executor(None, find_port, PICO_SERIAL_PORTS, probe_pico)
+            if self.port is None:
+                return False
+        try:
+            self.serial_connection = serial.Serial(self.port, self.baud, timeout=1)
+        except serial.SerialException as e:
+            print(f"❌ Failed to connect to Pico 2: {e}")
+            return False
+        # One blocking round trip before the fd goes non-blocking
+        self.capabilities = await self.loop.run_in_executor(None, led_protocol.handshake, self.serial_connection)
+        self.serial_connection.timeout = 0
+        self.fd = self.serial_connection.fileno()
+        os.set_blocking(self.fd, False)
+        self.loop.add_reader(self.fd, self._on_readable)
+        self.connected = True
+        return True
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def _on_readable(self):
+        try:
+            chunk = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._lost(f"Lost connection to Pico 2: {e}")
+            return
+        if not chunk:
+            self._lost("Connection to Pico 2 closed")
+            return
+        if self.capabilities:
+            for opcode, seq, body in self.frames.feed(chunk):
+                future = self.pending.pop(seq, None)
+                if future is None:
+                    print(f"⚠️ Unmatched frame: opcode 0x{opcode:02x} seq {seq}")
+                elif not future.done():
+                    future.set_result(led_protocol.decode_reply(opcode, body))
+            return
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split(b"\n")
+        for line in lines:
+            line = line.decode(errors="replace").strip()
+            if not line:
+                continue
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"⚠️ Invalid JSON response: {line}")
+                continue
+            self._resolve(response)
+
+    def _resolve(self, response):
+        request_id = response.pop("id", None) if isinstance(response, dict) else None
+        if request_id is not None:
+            future = self.pending.pop(request_id, None)
+        elif self.pending:
+            # Firmware without id echo answers strictly in order: oldest request first
+            future = self.pending.pop(next(iter(self.pending)))
+        else:
+            future = None
+        if future is None:
+            print(f"⚠️ Unmatched response: {response}")
+        elif not future.done():
+            future.set_result(response)
+
+    def _write(self, payload):
+        # Pipelined: append and flush what the fd takes now, the rest when it is writable
+        was_idle = not self.outgoing
+        self.outgoing += payload
+        if was_idle:
+            self._on_writable()
+
+    def _on_writable(self):
+        try:
+            written = os.write(self.fd, self.outgoing)
+        except BlockingIOError:
+            written = 0
+        except OSError as e:
+            self._lost(f"Lost connection to Pico 2: {e}")
+            return
+        del self.outgoing[:written]
+        if self.outgoing:
+            self.loop.add_writer(self.fd, self._on_writable)
+        else:
+            self.loop.remove_writer(self.fd)
+
+    def _lost(self, error):
+        print(f"❌ {error}")
+        self.close(error)
+
+    async def send_command(self, command, data=None):
+        """Send one command; any number of these may be awaited concurrently"""
+        if not self.connected:
+            return {"success": False, "error": "Not connected to Pico 2"}
+        if self.capabilities:
+            encoded = led_protocol.encode_command(command, data)
+            if encoded is None:
+                return {"success": False, "error": f"Unknown command: {command}"}
+            if encoded[0] not in self.capabilities["opcodes"]:
+                return {"success": False, "error": f"Firmware does not support {command}"}
+            request_id = next(self.request_ids) % 256
+            payload = led_protocol.encode_frame(encoded[0], request_id, encoded[1])
+        else:
+            request_id = next(self.request_ids)
+            packet = {"id": request_id, "command": command, "data": data or {}, "timestamp": time.time()}
+            payload = (json.dumps(packet) + "\n").encode()
+        future = self.loop.create_future()
+        self.pending[request_id] = future
+        try:
+            self._write(payload)
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            return {"success": False, "error": "Command timeout"}
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def set_idle(self, config=None):
+        return await self.send_command("set_idle", config)
+
+    async def set_making(self, config=None):
+        return await self.send_command("set_making", config)
+
+    async def set_finished(self, config=None):
+        return await self.send_command("set_finished", config)
+
+    async def brightness(self, level):
+        """Brightness in percent (0-100), keeps the current mode"""
+        return await self.send_command("set_brightness", {"brightness": max(0, min(100, int(level)))})
+
+    async def turn_off(self):
+        return await self.send_command("turn_off")
+
+    async def get_status(self):
+        return await self.send_command("get_status")
+
+    def close(self, error="Connection to Pico 2 closed"):
+        """Unregister the fd, fail everything in flight and release the port"""
+        if self.fd is not None and self.loop is not None:
+            self.loop.remove_reader(self.fd)
+            self.loop.remove_writer(self.fd)
+        self.connected = False
+        self.fd = None
+        self.outgoing.clear()
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_result({"success": False, "error": error})
+        if self.serial_connection is not None:
+            self.serial_connection.close()
+            self.serial_connection = None
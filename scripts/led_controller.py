@@ -1,4 +1,18 @@
 #!/usr/bin/env python3
+"""
+LED controller for the Raspberry Pico 2 (USB serial)
+
+Speaks the binary frame protocol of led_protocol.py when the firmware answers
+the HELLO handshake, JSON lines otherwise.
+
+One-shot:
+  python3 led_controller.py set_making '{"color": "#ff8800"}'
+
+Resident service (discovers the Pico once and keeps the port open):
+  python3 led_controller.py serve               # Unix socket (LED_SOCKET)
+
+While the service runs, the one-shot form only forwards to it.
+"""
 import sys
 import json
 import time
@@ -6,7 +20,14 @@ import traceback
 import serial
 import os
 import threading
-import queue
+import itertools
+import socket
+import socketserver
+import signal
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import led_protocol
+from pico_port import find_port, forget_cache
 
 print("LED Controller wird gestartet...")
 print(f"Arbeitsverzeichnis: {os.getcwd()}")
@@ -18,44 +39,61 @@ PICO_SERIAL_PORTS = ["/dev/ttyACM0", "/dev/ttyACM1", "/dev/ttyUSB0", "/dev/ttyUS
 PICO_BAUD_RATE = 115200
 CONNECTION_TIMEOUT = 5
 COMMAND_TIMEOUT = 3
+LED_SOCKET_PATH = os.environ.get("LED_SOCKET", "/tmp/cocktailbot-led.sock")
+RECONNECT_INTERVAL = 2  # seconds between discovery attempts while the Pico is gone
+MODE_COMMANDS = ("set_idle", "set_making", "set_finished", "turn_off")
 
 class LEDController:
     def __init__(self):
         self.serial_connection = None
-        self.command_queue = queue.Queue()
-        self.response_queue = queue.Queue()
+        self.write_lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+        # request id -> Future, in send order (dicts keep insertion order)
+        self.pending = {}
+        self.request_ids = itertools.count(1)
         self.connected = False
+        # HELLO reply of the firmware; None means the legacy JSON line protocol
+        self.capabilities = None
+        self.probed = {}  # port -> capabilities found while probing
+        self.frames = led_protocol.FrameReader()
         self.connect_to_pico()
         
         if self.connected:
             self.start_communication_thread()
     
+    def probe_pico(self, port):
+        """True if the LED firmware answers on ``port``"""
+        try:
+            test_serial = serial.Serial(port, PICO_BAUD_RATE, timeout=1)
+            try:
+                time.sleep(0.5)  # Give device time to initialize
+                
+                # Current firmware identifies itself in the handshake
+                capabilities = led_protocol.handshake(test_serial)
+                if capabilities:
+                    self.probed[port] = capabilities
+                    return True
+                
+                # Legacy firmware: send a simple test command
+                test_serial.reset_input_buffer()
+                test_command = json.dumps({"command": "get_status", "data": {}}) + "\n"
+                test_serial.write(test_command.encode())
+                
+                # Wait for response
+                response = test_serial.readline().decode().strip()
+            finally:
+                test_serial.close()
+            return bool(response) and "success" in response
+        except Exception as e:
+            print(f"❌ Failed to test {port}: {e}")
+            return False
+    
     def find_pico_device(self):
-        """Find the Raspberry Pico 2 device automatically"""
-        for port in PICO_SERIAL_PORTS:
-            if os.path.exists(port):
-                try:
-                    # Test connection
-                    test_serial = serial.Serial(port, PICO_BAUD_RATE, timeout=1)
-                    time.sleep(0.5)  # Give device time to initialize
-                    
-                    # Send a simple test command
-                    test_command = json.dumps({"command": "get_status", "data": {}}) + "\n"
-                    test_serial.write(test_command.encode())
-                    
-                    # Wait for response
-                    response = test_serial.readline().decode().strip()
-                    test_serial.close()
-                    
-                    if response and "success" in response:
-                        print(f"✅ Found Pico 2 at {port}")
-                        return port
-                        
-                except Exception as e:
-                    print(f"❌ Failed to test {port}: {e}")
-                    continue
-        
-        return None
+        """Find the Raspberry Pico 2: cached port, then /dev/serial/by-id, then all candidates at once"""
+        port = find_port(PICO_SERIAL_PORTS, self.probe_pico)
+        if port:
+            print(f"✅ Found Pico 2 at {port}")
+        return port
     
     def connect_to_pico(self):
         """Connect to Raspberry Pico 2 via serial"""
@@ -78,11 +116,16 @@ class LEDController:
             # Wait for device to initialize
             time.sleep(1)
             
+            self.capabilities = self.probed.get(device_port) or led_protocol.handshake(self.serial_connection)
+            if self.capabilities:
+                print(f"✅ Binary protocol v{self.capabilities['version']} ({self.capabilities['firmware']})")
+            
             print(f"✅ Connected to Pico 2 at {device_port}")
             self.connected = True
             
         except Exception as e:
             print(f"❌ Failed to connect to Pico 2: {str(e)}")
+            forget_cache()
             self.serial_connection = None
             self.connected = False
     
@@ -92,59 +135,132 @@ class LEDController:
         self.comm_thread.start()
     
     def communication_worker(self):
-        """Background worker for serial communication"""
+        """Background reader: blocks on the port and hands each response to its caller"""
+        buffer = b""
         while self.connected and self.serial_connection:
             try:
-                # Check for commands to send
-                if not self.command_queue.empty():
-                    command = self.command_queue.get_nowait()
-                    command_str = json.dumps(command) + "\n"
-                    self.serial_connection.write(command_str.encode())
-                
-                # Check for responses
-                if self.serial_connection.in_waiting > 0:
-                    response_line = self.serial_connection.readline().decode().strip()
-                    if response_line:
-                        try:
-                            response = json.loads(response_line)
-                            self.response_queue.put(response)
-                        except json.JSONDecodeError:
-                            print(f"⚠️ Invalid JSON response: {response_line}")
-                
-                time.sleep(0.01)  # Small delay to prevent CPU spinning
-                
+                if self.capabilities:
+                    # Binary frames: block for the first byte, then take whatever has arrived
+                    chunk = self.serial_connection.read(self.serial_connection.in_waiting or 1)
+                    for opcode, seq, body in self.frames.feed(chunk):
+                        self.resolve_frame(opcode, seq, body)
+                    continue
+                # Blocks until a full line arrives or the port timeout expires - no polling
+                chunk = self.serial_connection.readline()
+                if not chunk:
+                    continue
+                buffer += chunk
+                if not buffer.endswith(b"\n"):
+                    continue  # timeout in the middle of a line, keep the partial data
+                response_line = buffer.decode(errors="replace").strip()
+                buffer = b""
+                if not response_line:
+                    continue
+                try:
+                    response = json.loads(response_line)
+                except json.JSONDecodeError:
+                    print(f"⚠️ Invalid JSON response: {response_line}")
+                    continue
+                self.resolve(response)
+            except serial.SerialException as e:
+                # Port vanished (USB re-enumeration) - the service reconnects
+                if self.connected:
+                    print(f"❌ Lost connection to Pico 2: {e}")
+                self.connected = False
+                break
             except Exception as e:
+                if not self.connected:
+                    break
                 print(f"❌ Communication worker error: {e}")
                 time.sleep(0.1)
-    
+        self.fail_pending("Connection to Pico 2 closed")
+
+    def resolve(self, response):
+        """Complete the future of the request this response belongs to"""
+        with self.pending_lock:
+            request_id = response.pop("id", None) if isinstance(response, dict) else None
+            if request_id is not None:
+                future = self.pending.pop(request_id, None)
+            elif self.pending:
+                # Firmware without id echo answers strictly in order: oldest request first
+                future = self.pending.pop(next(iter(self.pending)))
+            else:
+                future = None
+        if future is None:
+            print(f"⚠️ Unmatched response: {response}")
+            return
+        future.set_result(response)
+
+    def resolve_frame(self, opcode, seq, body):
+        """Complete the future waiting for sequence number ``seq``"""
+        with self.pending_lock:
+            future = self.pending.pop(seq, None)
+        if future is None:
+            print(f"⚠️ Unmatched frame: opcode 0x{opcode:02x} seq {seq}")
+            return
+        future.set_result(led_protocol.decode_reply(opcode, body))
+
+    def fail_pending(self, error):
+        with self.pending_lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_result({"success": False, "error": error})
+
     def send_command(self, command, data):
-        """Send command to Raspberry Pico 2"""
+        """Send command to Raspberry Pico 2 and wait for its own response"""
         if not self.connected:
             return {"success": False, "error": "Not connected to Pico 2"}
         
-        try:
+        if self.capabilities:
+            encoded = led_protocol.encode_command(command, data)
+            if encoded is None:
+                return {"success": False, "error": f"Unknown command: {command}"}
+            if encoded[0] not in self.capabilities["opcodes"]:
+                return {"success": False, "error": f"Firmware does not support {command}"}
+            # The frame carries an 8-bit sequence number instead of the JSON id
+            request_id = next(self.request_ids) % 256
+            payload = led_protocol.encode_frame(encoded[0], request_id, encoded[1])
+        else:
+            request_id = next(self.request_ids)
             packet = {
+                "id": request_id,
                 "command": command,
                 "data": data,
                 "timestamp": time.time()
             }
+            payload = (json.dumps(packet) + "\n").encode()
+        future = Future()
+        try:
+            with self.pending_lock:
+                self.pending[request_id] = future
+            with self.write_lock:
+                self.serial_connection.write(payload)
             
-            # Add command to queue
-            self.command_queue.put(packet)
-            
-            # Wait for response with timeout
-            start_time = time.time()
-            while time.time() - start_time < COMMAND_TIMEOUT:
-                if not self.response_queue.empty():
-                    response = self.response_queue.get_nowait()
-                    return response
-                time.sleep(0.01)
-            
+            return future.result(timeout=COMMAND_TIMEOUT)
+        
+        except FutureTimeoutError:
             return {"success": False, "error": "Command timeout"}
-                
+        except serial.SerialException as e:
+            print(f"❌ Lost connection to Pico 2: {e}")
+            self.connected = False
+            return {"success": False, "error": str(e)}
         except Exception as e:
             print(f"❌ Error sending command: {str(e)}")
             return {"success": False, "error": str(e)}
+        finally:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+
+    def close(self):
+        """Stop the reader thread and release the serial port"""
+        self.connected = False
+        if self.serial_connection:
+            try:
+                self.serial_connection.cancel_read()
+            except Exception:
+                pass
+            self.serial_connection.close()
+        self.fail_pending("Connection to Pico 2 closed")
     
     def set_idle(self, config):
         """Set LED to idle mode"""
@@ -185,6 +301,137 @@ class LEDController:
         else:
             return {"success": False, "error": "Connection test failed"}
 
+NOT_CONNECTED = {
+    "success": False,
+    "error": "Failed to connect to Raspberry Pico 2",
+    "help": "Make sure Pico 2 is connected and running LED firmware"
+}
+
+def run_command(controller, command, led_data):
+    """Dispatch one LED command to a connected controller"""
+    if command == "set_idle":
+        return controller.set_idle(led_data)
+    if command == "set_making":
+        return controller.set_making(led_data)
+    if command == "set_finished":
+        return controller.set_finished(led_data)
+    if command == "turn_off":
+        return controller.turn_off()
+    if command == "get_status":
+        return controller.get_status()
+    if command == "test":
+        return controller.test_connection()
+    return {"success": False, "error": f"Unknown command: {command}"}
+
+class LEDService:
+    """Keeps one LEDController - and the Pico serial port - open for all callers"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.controller = None
+        self.last_mode = None  # (command, data) to restore after a reconnect
+        self.closed = threading.Event()
+        self.reconnect()
+        self.watchdog_thread = threading.Thread(target=self.watchdog, daemon=True)
+        self.watchdog_thread.start()
+
+    @property
+    def connected(self):
+        return self.controller is not None and self.controller.connected
+
+    def reconnect(self):
+        """Rediscover the Pico if the port is gone; restores the last LED mode"""
+        with self.lock:
+            if self.connected:
+                return True
+            if self.controller is not None:
+                self.controller.close()
+            self.controller = LEDController()
+            if not self.controller.connected:
+                return False
+            last_mode = self.last_mode
+        # A re-enumerated Pico has rebooted into its default mode
+        if last_mode is not None:
+            run_command(self.controller, *last_mode)
+        return True
+
+    def watchdog(self):
+        while not self.closed.wait(RECONNECT_INTERVAL):
+            if not self.connected:
+                self.reconnect()
+
+    def handle_request(self, request):
+        command = request.get("command")
+        led_data = request.get("data") or {}
+        if command in MODE_COMMANDS and self.connected and self.last_mode == (command, led_data):
+            # The strip already shows this mode - keep the serial link free
+            return {"success": True, "message": f"LED already in {command}", "unchanged": True}
+        if not self.reconnect():
+            return dict(NOT_CONNECTED)
+        result = run_command(self.controller, command, led_data)
+        if not result.get("success") and not self.connected and self.reconnect():
+            # The port vanished during the command - retry once on the new connection
+            result = run_command(self.controller, command, led_data)
+        if command in MODE_COMMANDS and result.get("success"):
+            self.last_mode = (command, led_data)
+        return result
+
+    def close(self):
+        self.closed.set()
+        with self.lock:
+            if self.controller is not None:
+                self.controller.close()
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw_line in self.rfile:
+            line = raw_line.decode().strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+                response = self.server.led_service.handle_request(request)
+            except (json.JSONDecodeError, AttributeError) as e:
+                request, response = None, {"success": False, "error": f"Invalid request: {e}"}
+            if isinstance(request, dict) and "id" in request:
+                response["id"] = request["id"]
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(socket_path=LED_SOCKET_PATH):
+    """Run the resident LED service on a Unix socket (JSON lines)"""
+    service = LEDService()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    try:
+        with _UnixServer(socket_path, _RequestHandler) as unix_server:
+            unix_server.led_service = service
+            os.chmod(socket_path, 0o660)
+            print(f"LED service listening on {socket_path}")
+            try:
+                unix_server.serve_forever()
+            finally:
+                os.unlink(socket_path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+def send_request(request, socket_path=LED_SOCKET_PATH, timeout=COMMAND_TIMEOUT + 2):
+    """Forward a request to the running LED service; None if none is running"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(socket_path)
+            client.sendall((json.dumps(request) + "\n").encode())
+            with client.makefile("rb") as reader:
+                return json.loads(reader.readline())
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+
 def main():
     try:
         if len(sys.argv) < 2:
@@ -192,6 +439,11 @@ def main():
             sys.exit(1)
         
         command = sys.argv[1]
+        if command == "serve":
+            # systemd stops with SIGTERM - go through SystemExit so the port is released
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            serve(sys.argv[sys.argv.index("--socket") + 1] if "--socket" in sys.argv else LED_SOCKET_PATH)
+            return
         print(f"🚀 Executing LED command: {command}")
         
         led_data = {}
@@ -202,29 +454,12 @@ def main():
                 print(json.dumps({"success": False, "error": f"Invalid LED data: {str(e)}"}))
                 sys.exit(1)
         
-        controller = LEDController()
-        
-        if not controller.connected:
-            result = {
-                "success": False, 
-                "error": "Failed to connect to Raspberry Pico 2",
-                "help": "Make sure Pico 2 is connected and running LED firmware"
-            }
-        elif command == "set_idle":
-            result = controller.set_idle(led_data)
-        elif command == "set_making":
-            result = controller.set_making(led_data)
-        elif command == "set_finished":
-            result = controller.set_finished(led_data)
-        elif command == "turn_off":
-            result = controller.turn_off()
-        elif command == "get_status":
-            result = controller.get_status()
-        elif command == "test":
-            result = controller.test_connection()
-        else:
-            result = {"success": False, "error": f"Unknown command: {command}"}
-        
+        # The resident service already holds the port - no discovery needed
+        result = send_request({"command": command, "data": led_data})
+        if result is None:
+            controller = LEDController()
+            result = run_command(controller, command, led_data) if controller.connected else dict(NOT_CONNECTED)
+            controller.close()
         print(json.dumps(result))
         
     except Exception as e:
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+led_protocol.py — binäres Rahmenprotokoll zwischen Host und Pico-Firmware
+
+Ein Rahmen ist
+
+  0x00  COBS( opcode:u8  seq:u8  nutzdaten  crc16:u16 big-endian )  0x00
+
+crc16 ist CRC-16/CCITT-FALSE über opcode, seq und Nutzdaten. COBS sorgt
+dafür, dass im Rahmen keine 0x00 vorkommt – Textzeilen (alte Befehle,
+Ausgaben der Firmware) enthalten nie 0x00, beides kann sich den Port teilen.
+
+Die Antwort trägt opcode | 0x80 und dieselbe seq, die Nutzdaten beginnen mit
+einem Status (STATUS_*). Ein Rahmen mit falscher CRC wird mit OP_ERROR und
+STATUS_CRC beantwortet.
+
+Beim Verbinden schickt der Host OP_HELLO (Nutzdaten: Protokollversion). Die
+Antwort nennt Version, Firmware (FIRMWARE_*), LED-Anzahl (u16) und alle
+unterstützten Opcodes. Antwortet niemand, spricht die Firmware nur das alte
+Text- bzw. JSON-Protokoll.
+
+Helligkeit ist im Protokoll immer 0-255; led_controller.py rechnet die
+Prozentwerte seiner JSON-Befehle um.
+
+pico_led_firmware.py und pico_led_controller.py enthalten eine eigene Kopie
+von COBS und CRC – sie laufen allein auf dem Pico.
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+VERSION = 1
+REPLY = 0x80
+HELLO_SEQ = 0
+HANDSHAKE_TIMEOUT = 0.5  # s
+CAPS_CACHE_PATH = os.environ.get("PICO_CAPS_CACHE", "/tmp/cocktailbot-pico-caps.json")
+MAX_FRAME = 64  # kodierte Bytes; längere Rahmen werden verworfen
+
+# Opcodes
+OP_HELLO = 0x01
+OP_STATUS = 0x02
+OP_OFF = 0x10
+OP_COLOR = 0x11         # r g b
+OP_PULSE = 0x12         # r g b
+OP_BLINK = 0x13         # r g b
+OP_RAINBOW = 0x14       # [ms pro Schritt], ohne Nutzdaten bleibt das Tempo
+OP_BUSY = 0x15
+OP_READY = 0x16
+OP_ERROR_MODE = 0x17
+OP_BRIGHT = 0x18        # helligkeit 0-255
+OP_SET_IDLE = 0x20      # Konfiguration, siehe encode_config
+OP_SET_MAKING = 0x21
+OP_SET_FINISHED = 0x22
+OP_ERROR = 0xFF         # Antwort auf einen unlesbaren Rahmen
+
+STATUS_OK = 0
+STATUS_UNKNOWN_OPCODE = 1
+STATUS_BAD_LENGTH = 2
+STATUS_CRC = 3
+STATUS_FAILED = 4  # Befehl erkannt, aber in der Firmware fehlgeschlagen
+STATUS_TEXT = {
+    STATUS_UNKNOWN_OPCODE: "Unknown opcode",
+    STATUS_BAD_LENGTH: "Invalid frame length",
+    STATUS_CRC: "CRC error",
+    STATUS_FAILED: "Command failed",
+}
+
+FIRMWARE_JSON = 1   # pico_led_firmware.py
+FIRMWARE_TEXT = 2   # pico_led_controller.py
+FIRMWARE_NAMES = {FIRMWARE_JSON: "pico_led_firmware", FIRMWARE_TEXT: "pico_led_controller"}
+
+# Reihenfolge ist Teil des Protokolls (Index als u8)
+MODES = ("off", "idle", "making", "finished", "color", "busy", "error", "rainbow", "pulse", "blink")
+PATTERNS = ("solid", "fade", "pulse", "rainbow", "chase")
+
+# Bits der Konfigurationsmaske von OP_SET_*; Felder folgen in dieser Reihenfolge
+CONFIG_COLOR = 0x01       # r g b
+CONFIG_BRIGHTNESS = 0x02  # u8 0-255
+CONFIG_PATTERN = 0x04     # u8 Index in PATTERNS
+CONFIG_BLINKING = 0x08    # u8 0/1
+CONFIG_BLINK_SPEED = 0x10  # u16 ms
+
+TEXT_OPCODES = {
+    "OFF": OP_OFF, "COLOR": OP_COLOR, "PULSE": OP_PULSE, "BLINK": OP_BLINK, "RAINBOW": OP_RAINBOW,
+    "BUSY": OP_BUSY, "READY": OP_READY, "ERROR": OP_ERROR_MODE, "BRIGHT": OP_BRIGHT,
+}
+MODE_OPCODES = {"set_idle": OP_SET_IDLE, "set_making": OP_SET_MAKING, "set_finished": OP_SET_FINISHED}
+OPCODE_NAMES = {opcode: name for name, opcode in list(TEXT_OPCODES.items()) + list(MODE_OPCODES.items())}
+OPCODE_NAMES.update({OP_HELLO: "HELLO", OP_STATUS: "STATUS"})
+
+class ProtocolError(ValueError):
+    pass
+
+def crc16(data: bytes) -> int:
+    """CRC-16/CCITT-FALSE (Polynom 0x1021, Start 0xFFFF)"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+    return crc
+
+def cobs_encode(data: bytes) -> bytes:
+    out = bytearray([0])
+    code_index, code = 0, 1
+    for byte in data:
+        if byte:
+            out.append(byte)
+            code += 1
+        if not byte or code == 0xFF:
+            out[code_index] = code
+            code_index, code = len(out), 1
+            out.append(0)
+    out[code_index] = code
+    return bytes(out)
+
+def cobs_decode(data: bytes) -> bytes:
+    out = bytearray()
+    index = 0
+    while index < len(data):
+        code = data[index]
+        if code == 0 or index + code > len(data):
+            raise ProtocolError("Ungültige COBS-Kodierung")
+        out += data[index + 1:index + code]
+        index += code
+        if code < 0xFF and index < len(data):
+            out.append(0)
+    return bytes(out)
+
+def encode_frame(opcode: int, seq: int, body: bytes = b"") -> bytes:
+    raw = bytes([opcode, seq & 0xFF]) + bytes(body)
+    crc = crc16(raw)
+    return b"\x00" + cobs_encode(raw + bytes([crc >> 8, crc & 0xFF])) + b"\x00"
+
+def decode_frame(encoded: bytes) -> Tuple[int, int, bytes]:
+    """(opcode, seq, nutzdaten) eines Rahmens ohne Begrenzer"""
+    raw = cobs_decode(encoded)
+    if len(raw) < 4:
+        raise ProtocolError("Rahmen zu kurz")
+    if crc16(raw[:-2]) != (raw[-2] << 8 | raw[-1]):
+        raise ProtocolError("CRC-Fehler")
+    return raw[0], raw[1], raw[2:-2]
+
+class FrameReader:
+    """Trennt einen Bytestrom in Rahmen; Textzeilen dazwischen werden übersprungen"""
+
+    def __init__(self):
+        self.frame = None  # None: außerhalb eines Rahmens
+        self.text = bytearray()
+
+    def feed(self, chunk: bytes) -> List[Tuple[int, int, bytes]]:
+        frames = []
+        for byte in chunk:
+            if byte == 0:
+                if self.frame:
+                    try:
+                        frames.append(decode_frame(bytes(self.frame)))
+                    except ProtocolError:
+                        pass  # Störung oder verpasster Anfang – der nächste Rahmen zählt
+                    self.frame = None
+                else:
+                    # Anfang (zwei Nullen hintereinander: Ende + Anfang)
+                    self.frame = bytearray()
+                    self.text.clear()
+            elif self.frame is not None:
+                self.frame.append(byte)
+                if len(self.frame) > MAX_FRAME:
+                    self.frame = None
+            elif byte == 0x0A:
+                self.text.clear()  # Ausgabe der Firmware, für das Protokoll bedeutungslos
+            else:
+                self.text.append(byte)
+        return frames
+
+def _clamp(value) -> int:
+    return max(0, min(255, int(value)))
+
+def percent_to_byte(percent) -> int:
+    return _clamp(round(float(percent) * 255 / 100))
+
+def byte_to_percent(value: int) -> int:
+    return round(value * 100 / 255)
+
+def _hex_to_rgb(color: str) -> bytes:
+    color = color.lstrip("#")
+    return bytes(int(color[index:index + 2], 16) for index in (0, 2, 4))
+
+def encode_config(config: Dict) -> bytes:
+    """JSON-Konfiguration (color, brightness %, pattern, blinking, blinkSpeed) -> Maske + Felder"""
+    mask, fields = 0, bytearray()
+    if "color" in config:
+        mask |= CONFIG_COLOR
+        fields += _hex_to_rgb(config["color"])
+    if "brightness" in config:
+        mask |= CONFIG_BRIGHTNESS
+        fields.append(percent_to_byte(config["brightness"]))
+    if config.get("pattern") in PATTERNS:
+        mask |= CONFIG_PATTERN
+        fields.append(PATTERNS.index(config["pattern"]))
+    if "blinking" in config:
+        mask |= CONFIG_BLINKING
+        fields.append(1 if config["blinking"] else 0)
+    if "blinkSpeed" in config:
+        mask |= CONFIG_BLINK_SPEED
+        speed = max(0, min(0xFFFF, int(config["blinkSpeed"])))
+        fields += bytes([speed >> 8, speed & 0xFF])
+    return bytes([mask]) + bytes(fields)
+
+def encode_command(command: str, data: Optional[Dict] = None) -> Optional[Tuple[int, bytes]]:
+    """Befehl von led_controller.py (JSON) -> (opcode, nutzdaten); None, wenn es keinen gibt"""
+    data = data or {}
+    if command in MODE_OPCODES:
+        return MODE_OPCODES[command], encode_config(data)
+    if command == "turn_off":
+        return OP_OFF, b""
+    if command in ("get_status", "test"):
+        return OP_STATUS, b""
+    if command == "set_brightness":
+        return OP_BRIGHT, bytes([percent_to_byte(data.get("brightness", 100))])
+    return None
+
+def encode_text(cmd: str) -> Optional[Tuple[int, bytes]]:
+    """Textbefehl von led_client.py ("COLOR 0 255 0") -> (opcode, nutzdaten); None, wenn unbekannt"""
+    parts = cmd.split()
+    if not parts or parts[0].upper() not in TEXT_OPCODES:
+        return None
+    opcode = TEXT_OPCODES[parts[0].upper()]
+    try:
+        if opcode in (OP_COLOR, OP_PULSE, OP_BLINK):
+            if len(parts) < 4:
+                return None
+            return opcode, bytes(_clamp(value) for value in parts[1:4])
+        if opcode == OP_BRIGHT:
+            return opcode, bytes([_clamp(parts[1])])
+        if opcode == OP_RAINBOW and len(parts) >= 2:
+            return opcode, bytes([_clamp(parts[1])])
+    except (IndexError, ValueError):
+        return None
+    return opcode, b""
+
+def parse_hello(data: bytes) -> Dict:
+    if len(data) < 4:
+        raise ProtocolError("HELLO-Antwort zu kurz")
+    return {
+        "version": data[0],
+        "firmware": FIRMWARE_NAMES.get(data[1], data[1]),
+        "num_leds": data[2] << 8 | data[3],
+        "opcodes": sorted(data[4:]),
+    }
+
+def parse_status(data: bytes) -> Dict:
+    """mode:u8 r g b helligkeit:u8 num_leds:u16 – im Format von get_status der JSON-Firmware"""
+    if len(data) < 7:
+        raise ProtocolError("STATUS-Antwort zu kurz")
+    mode = MODES[data[0]] if data[0] < len(MODES) else data[0]
+    return {
+        "mode": mode,
+        "config": {"color": "#%02x%02x%02x" % (data[1], data[2], data[3]), "brightness": byte_to_percent(data[4])},
+        "num_leds": data[5] << 8 | data[6],
+    }
+
+def decode_reply(opcode: int, body: bytes) -> Dict:
+    """Antwortrahmen -> Ergebnis im Format der JSON-Firmware ({"success": ..., ...})"""
+    if not body:
+        return {"success": False, "error": STATUS_TEXT[STATUS_BAD_LENGTH]}
+    status, data = body[0], body[1:]
+    if status != STATUS_OK:
+        return {"success": False, "error": STATUS_TEXT.get(status, f"Status {status}")}
+    try:
+        if opcode == OP_STATUS | REPLY:
+            return {"success": True, "data": parse_status(data), "message": "Status retrieved"}
+        if opcode == OP_HELLO | REPLY:
+            return {"success": True, "data": parse_hello(data)}
+    except ProtocolError as e:
+        return {"success": False, "error": str(e)}
+    return {"success": True, "message": f"{OPCODE_NAMES.get(opcode & 0x7F, hex(opcode & 0x7F))} executed"}
+
+def hello_frame() -> bytes:
+    # Der Zeilenumbruch danach schließt den Rahmen für alte Firmware als (ungültige) Zeile ab
+    return encode_frame(OP_HELLO, HELLO_SEQ, bytes([VERSION])) + b"\n"
+
+def read_reply(ser, opcode: int, seq: int, timeout: float = HANDSHAKE_TIMEOUT) -> Optional[bytes]:
+    """Wartet auf die Antwort zu einem gesendeten Rahmen; Rumpf (Status + Daten) oder None"""
+    previous_timeout = ser.timeout
+    ser.timeout = 0.05
+    try:
+        reader = FrameReader()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for reply_opcode, reply_seq, body in reader.feed(ser.read(ser.in_waiting or 1)):
+                # auch ein CRC-Fehler zeigt, dass die Firmware Rahmen versteht
+                if reply_opcode in (opcode | REPLY, OP_ERROR) and reply_seq == seq:
+                    return body
+        return None
+    finally:
+        ser.timeout = previous_timeout
+
+def handshake(ser, timeout: float = HANDSHAKE_TIMEOUT) -> Optional[Dict]:
+    """HELLO über einen offenen pyserial-Port; Fähigkeiten oder None (altes Protokoll)"""
+    ser.reset_input_buffer()
+    ser.write(hello_frame())
+    ser.flush()
+    body = read_reply(ser, OP_HELLO, HELLO_SEQ, timeout)
+    if body is not None and body[:1] == bytes([STATUS_OK]):
+        try:
+            return parse_hello(body[1:])
+        except ProtocolError:
+            return None
+    # Fehlermeldung alter Firmware auf den HELLO-Rahmen nicht als Antwort auf den nächsten Befehl lesen
+    ser.reset_input_buffer()
+    return None
+
+def device_key(port: str) -> str:
+    """Ändert sich bei jeder neuen USB-Enumeration (udev legt den Knoten neu an)"""
+    target = os.path.realpath(port)
+    try:
+        return f"{target}:{os.stat(target).st_ctime_ns}"
+    except OSError:
+        return target
+
+def load_caps(port: str, cache_path: str = CAPS_CACHE_PATH):
+    """Zwischengespeicherte Fähigkeiten: dict, {} für altes Protokoll, None wenn unbekannt"""
+    try:
+        with open(cache_path, "r") as cache_file:
+            cached = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    return cached.get("caps") if cached.get("device") == device_key(port) else None
+
+def forget_caps(cache_path: str = CAPS_CACHE_PATH) -> None:
+    """Nächster Aufruf fragt die Fähigkeiten wieder per HELLO ab"""
+    try:
+        os.remove(cache_path)
+    except OSError:
+        pass
+
+def save_caps(port: str, caps: Optional[Dict], cache_path: str = CAPS_CACHE_PATH) -> None:
+    try:
+        with open(cache_path, "w") as cache_file:
+            json.dump({"device": device_key(port), "caps": caps or {}}, cache_file)
+    except OSError:
+        pass
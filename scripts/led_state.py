@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+led_state.py — Zustands-Spiegel und Zusammenfassen von LED-Befehlen
+
+Jeder Aufruf von led_client.py ist ein eigener Prozess, der Zustand liegt
+deshalb in LED_STATE_PATH (/tmp/cocktailbot-led-state.json, per flock
+geschützt):
+
+  - Spiegel: zuletzt gesendeter Modus (COLOR, RAINBOW, BUSY, ...) und die
+    Helligkeit. Ein Befehl, der daran nichts ändert, wird nicht gesendet.
+    Nach LED_STATE_TTL_S (60) wird trotzdem gesendet – falls der Pico
+    zwischendurch neu gestartet ist.
+  - Zusammenfassen: ein Befehl wartet LED_COALESCE_MS (40) ab. Kommt in der
+    Zeit ein neuerer derselben Art (z.B. BRIGHT vom Schieberegler), wird nur
+    der neueste gesendet.
+
+Unbekannte Befehle werden immer sofort gesendet.
+"""
+
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+STATE_PATH = os.environ.get("LED_STATE_PATH", "/tmp/cocktailbot-led-state.json")
+COALESCE_S = float(os.environ.get("LED_COALESCE_MS", "40")) / 1000
+STATE_TTL_S = float(os.environ.get("LED_STATE_TTL_S", "60"))
+
+COLOR_MODES = ("COLOR", "PULSE", "BLINK")
+PLAIN_MODES = ("OFF", "BUSY", "ERROR", "RAINBOW")
+ALIASES = {"READY": "COLOR 0 255 0"}  # auf dem Pico identisch
+
+def normalize(cmd: str) -> Optional[Tuple[str, str]]:
+    """(Art, Zustand) eines Befehls wie ihn pico_led_controller.py auswertet, sonst None"""
+    parts = cmd.split()
+    if not parts:
+        return None
+    action = parts[0].upper()
+    try:
+        if action == "BRIGHT":
+            return "bright", str(max(0, min(255, int(parts[1]))))
+        if action in COLOR_MODES and len(parts) >= 4:
+            return "mode", " ".join([action] + [str(int(value)) for value in parts[1:4]])
+        if action == "RAINBOW" and len(parts) >= 2:
+            # das Tempo gehört zum Zustand, sonst fiele "RAINBOW 60" nach "RAINBOW 30" weg
+            return "mode", f"RAINBOW {max(0, min(255, int(parts[1])))}"
+    except (IndexError, ValueError):
+        return None
+    if action in PLAIN_MODES:
+        return "mode", action
+    if action in ALIASES:
+        return "mode", ALIASES[action]
+    return None
+
+@contextmanager
+def locked_state(path: str = STATE_PATH):
+    """Zustand exklusiv lesen und beim Verlassen (auch nach Fehlern) zurückschreiben"""
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with open(path, "r") as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("mirror", {})
+        state.setdefault("pending", {})
+        try:
+            yield state
+        finally:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as state_file:
+                json.dump(state, state_file)
+            os.replace(tmp_path, path)
+
+def send_coalesced(cmd: str, send: Callable[[str], None], force: bool = False,
+                   path: str = STATE_PATH) -> bool:
+    """Ruft ``send(cmd)`` nur auf, wenn der Befehl der neueste seiner Art ist und
+    den Zustand ändert; True, wenn gesendet wurde"""
+    key = normalize(cmd)
+    if key is None:
+        # unbekannt: immer senden, die Sperre hält nur andere Schreiber fern
+        with locked_state(path):
+            send(cmd)
+        return True
+    kind, value = key
+
+    token = f"{os.getpid()}-{time.monotonic_ns()}"
+    if COALESCE_S > 0:
+        with locked_state(path) as state:
+            state["pending"][kind] = token
+        time.sleep(COALESCE_S)
+
+    with locked_state(path) as state:
+        if COALESCE_S > 0:
+            if state["pending"].get(kind) != token:
+                return False  # ein neuerer Befehl derselben Art sendet
+            del state["pending"][kind]
+        mirrored = state["mirror"].get(kind)
+        if (not force and mirrored and mirrored["value"] == value
+                and time.time() - mirrored["at"] < STATE_TTL_S):
+            return False
+        # schlägt das Senden fehl, ist der Zustand unbekannt
+        state["mirror"].pop(kind, None)
+        send(cmd)
+        state["mirror"][kind] = {"value": value, "at": time.time()}
+        return True
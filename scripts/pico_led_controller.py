@@ -1,8 +1,13 @@
 # === Pico W LED Controller für Cocktailmaschine ===
-# Unterstützt: COLOR, OFF, BUSY, READY, ERROR, RAINBOW, PULSE, BLINK
+# Unterstützt: COLOR, OFF, BUSY, READY, ERROR, RAINBOW [ms pro Schritt], PULSE, BLINK, REPL
 # 240 WS2812B LEDs über GPIO0
+# Befehle als Textzeile oder als Binärrahmen aus scripts/led_protocol.py
+# (0x00 COBS(opcode seq daten crc16) 0x00) – Opcodes müssen dazu passen
+# Strg+C ist abgeschaltet (Rahmen dürfen 0x03 enthalten); "REPL" beendet das Programm
+# und gibt Strg+C wieder frei, z. B. vor dem Neu-Flashen
 
 import machine
+import micropython
 import neopixel
 import time
 import select
@@ -19,6 +24,7 @@ np = neopixel.NeoPixel(machine.Pin(LED_PIN), NUM_LEDS)
 # Globale Variablen
 current_mode = "OFF"
 current_color = (0, 0, 0)
+rainbow_wait = 10  # ms pro Regenbogen-Schritt ("RAINBOW 30")
 running = True
 
 def apply_brightness(color):
@@ -38,13 +44,8 @@ def rainbow_cycle(wait=10):
         if current_mode != "RAINBOW":
             break
         # Prüfe auf neue Befehle vor jedem Frame
-        events = poll.poll(0)
-        if events:
-            line = sys.stdin.readline()
-            if line:
-                handle_command(line.strip())
-                if current_mode != "RAINBOW":
-                    break
+        if check_input() and current_mode != "RAINBOW":
+            break
         # LEDs setzen
         for i in range(NUM_LEDS):
             pixel_index = (i * 256 // NUM_LEDS) + j
@@ -67,6 +68,7 @@ def pulse_effect(color):
     """Pulsiert zwischen dunkel und hell"""
     # Aufwärts von 0% bis 100%
     for i in range(51):
+        check_input()
         if current_mode != "PULSE":
             return
         factor = i / 50.0
@@ -77,6 +79,7 @@ def pulse_effect(color):
     
     # Abwärts von 100% bis 0%
     for i in range(50, -1, -1):
+        check_input()
         if current_mode != "PULSE":
             return
         factor = i / 50.0
@@ -91,6 +94,7 @@ def blink_effect(color, speed=300):
     set_all(color)
     start = time.ticks_ms()
     while time.ticks_diff(time.ticks_ms(), start) < speed:
+        check_input()
         if current_mode != "BLINK":
             return
         time.sleep_ms(10)
@@ -100,13 +104,14 @@ def blink_effect(color, speed=300):
     np.write()
     start = time.ticks_ms()
     while time.ticks_diff(time.ticks_ms(), start) < speed:
+        check_input()
         if current_mode != "BLINK":
             return
         time.sleep_ms(10)
 
 def handle_command(cmd):
     """Verarbeitet empfangene Befehle"""
-    global current_mode, current_color, BRIGHTNESS
+    global current_mode, current_color, BRIGHTNESS, rainbow_wait, running
     
     parts = cmd.strip().split()
     if not parts:
@@ -144,7 +149,9 @@ def handle_command(cmd):
         
     elif action == "RAINBOW":
         current_mode = "RAINBOW"
-        print("OK: RAINBOW")
+        if len(parts) >= 2:
+            rainbow_wait = max(0, min(255, int(parts[1])))
+        print(f"OK: RAINBOW {rainbow_wait}")
         
     elif action == "PULSE" and len(parts) >= 4:
         current_mode = "PULSE"
@@ -161,12 +168,188 @@ def handle_command(cmd):
         BRIGHTNESS = val / 255.0
         print(f"OK: BRIGHTNESS {BRIGHTNESS}")
         
+    elif action == "REPL":
+        # Zurück zur MicroPython-Konsole, Strg+C wirkt wieder
+        micropython.kbd_intr(3)
+        running = False
+        print("OK: REPL")
+        
     else:
         print(f"ERROR: Unknown command '{cmd}'")
 
+# === Binärprotokoll (siehe scripts/led_protocol.py) ===
+PROTOCOL_VERSION = 1
+FIRMWARE_ID = 2  # FIRMWARE_TEXT
+OP_HELLO = 0x01
+OP_STATUS = 0x02
+OP_OFF = 0x10
+OP_COLOR = 0x11
+OP_PULSE = 0x12
+OP_BLINK = 0x13
+OP_RAINBOW = 0x14
+OP_BUSY = 0x15
+OP_READY = 0x16
+OP_ERROR_MODE = 0x17
+OP_BRIGHT = 0x18
+OP_ERROR = 0xFF
+STATUS_OK = 0
+STATUS_UNKNOWN_OPCODE = 1
+STATUS_BAD_LENGTH = 2
+STATUS_CRC = 3
+MAX_FRAME = 64
+SUPPORTED_OPCODES = bytes([OP_HELLO, OP_STATUS, OP_OFF, OP_COLOR, OP_PULSE, OP_BLINK,
+                           OP_RAINBOW, OP_BUSY, OP_READY, OP_ERROR_MODE, OP_BRIGHT])
+MODES = ("off", "idle", "making", "finished", "color", "busy", "error", "rainbow", "pulse", "blink")
+# Modi mit Farbe aus den Daten bzw. mit fester Farbe
+COLOR_OPCODES = {OP_COLOR: "COLOR", OP_PULSE: "PULSE", OP_BLINK: "BLINK"}
+FIXED_OPCODES = {
+    OP_READY: ("COLOR", (0, 255, 0)),
+    OP_BUSY: ("BUSY", (255, 255, 0)),
+    OP_ERROR_MODE: ("ERROR", (255, 0, 0)),
+}
+
+stdin = getattr(sys.stdin, "buffer", sys.stdin)
+stdout = getattr(sys.stdout, "buffer", sys.stdout)
+rx_frame = None  # bytearray innerhalb eines Rahmens
+rx_line = bytearray()
+
+def crc16(data):
+    """CRC-16/CCITT-FALSE"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+    return crc
+
+def cobs_encode(data):
+    out = bytearray(1)
+    code_index = 0
+    code = 1
+    for byte in data:
+        if byte:
+            out.append(byte)
+            code += 1
+        if not byte or code == 0xFF:
+            out[code_index] = code
+            code_index = len(out)
+            code = 1
+            out.append(0)
+    out[code_index] = code
+    return out
+
+def cobs_decode(data):
+    out = bytearray()
+    index = 0
+    while index < len(data):
+        code = data[index]
+        if code == 0 or index + code > len(data):
+            return None
+        out.extend(data[index + 1:index + code])
+        index += code
+        if code < 0xFF and index < len(data):
+            out.append(0)
+    return out
+
+def send_frame(opcode, seq, body):
+    raw = bytearray((opcode, seq))
+    raw.extend(body)
+    crc = crc16(raw)
+    raw.append(crc >> 8)
+    raw.append(crc & 0xFF)
+    stdout.write(b"\x00" + cobs_encode(raw) + b"\x00")
+
+def execute_frame(opcode, body):
+    """Führt einen Binärbefehl aus; (Status, Antwortdaten)"""
+    global current_mode, current_color, BRIGHTNESS, rainbow_wait
+    if opcode == OP_HELLO:
+        return STATUS_OK, bytes((PROTOCOL_VERSION, FIRMWARE_ID, NUM_LEDS >> 8, NUM_LEDS & 0xFF)) + SUPPORTED_OPCODES
+    if opcode == OP_STATUS:
+        r, g, b = current_color
+        return STATUS_OK, bytes((MODES.index(current_mode.lower()), r, g, b, int(BRIGHTNESS * 255),
+                                 NUM_LEDS >> 8, NUM_LEDS & 0xFF))
+    if opcode in COLOR_OPCODES:
+        if len(body) != 3:
+            return STATUS_BAD_LENGTH, b""
+        current_mode = COLOR_OPCODES[opcode]
+        current_color = (body[0], body[1], body[2])
+        if current_mode == "COLOR":
+            set_all(current_color)
+        return STATUS_OK, b""
+    if opcode in FIXED_OPCODES:
+        current_mode, current_color = FIXED_OPCODES[opcode]
+        if current_mode == "COLOR":
+            set_all(current_color)
+        return STATUS_OK, b""
+    if opcode == OP_RAINBOW:
+        if len(body) > 1:
+            return STATUS_BAD_LENGTH, b""
+        current_mode = "RAINBOW"
+        if body:
+            rainbow_wait = body[0]
+        return STATUS_OK, b""
+    if opcode == OP_OFF:
+        current_mode = "OFF"
+        np.fill((0, 0, 0))
+        np.write()
+        return STATUS_OK, b""
+    if opcode == OP_BRIGHT:
+        if len(body) != 1:
+            return STATUS_BAD_LENGTH, b""
+        BRIGHTNESS = body[0] / 255.0
+        return STATUS_OK, b""
+    return STATUS_UNKNOWN_OPCODE, b""
+
+def handle_frame(encoded):
+    """Prüft und beantwortet einen Rahmen (ohne die 0x00-Begrenzer)"""
+    raw = cobs_decode(encoded)
+    if raw is None or len(raw) < 4:
+        return
+    seq = raw[1]
+    if crc16(raw[:-2]) != (raw[-2] << 8 | raw[-1]):
+        send_frame(OP_ERROR, seq, bytes((STATUS_CRC,)))
+        return
+    status, data = execute_frame(raw[0], raw[2:-2])
+    send_frame(raw[0] | 0x80, seq, bytes((status,)) + data)
+
+def check_input(timeout_ms=0):
+    """Liest alle verfügbaren Bytes, führt Textzeilen und Rahmen aus; True, wenn etwas ausgeführt wurde"""
+    global rx_frame, rx_line
+    handled = False
+    while poll.poll(timeout_ms):
+        timeout_ms = 0
+        data = stdin.read(1)
+        if not data:
+            break
+        byte = data[0] if not isinstance(data, str) else ord(data)
+        if byte == 0:
+            if rx_frame:
+                handle_frame(rx_frame)
+                rx_frame = None
+                handled = True
+            else:
+                rx_frame = bytearray()  # Anfang eines Rahmens
+        elif rx_frame is not None:
+            rx_frame.append(byte)
+            if len(rx_frame) > MAX_FRAME:
+                rx_frame = None
+        elif byte == 0x0A:
+            line = bytes(rx_line).decode().strip()
+            rx_line = bytearray()
+            if line:
+                handle_command(line)
+                handled = True
+        else:
+            rx_line.append(byte)
+    return handled
+
 # === Hauptloop ===
 print("Pico LED Controller ready")
-print("Supported: COLOR, OFF, READY, BUSY, ERROR, RAINBOW, PULSE, BLINK, BRIGHT")
+print("Supported: COLOR, OFF, READY, BUSY, ERROR, RAINBOW, PULSE, BLINK, BRIGHT, REPL")
+
+# Rahmen dürfen 0x03 enthalten – der USB-Treiber würde es sonst schon beim Empfang als
+# Strg+C werten, noch bevor der erste Rahmen gelesen ist (z. B. ohne HELLO bei gecachten Fähigkeiten)
+micropython.kbd_intr(-1)
 
 # USB Serial Setup
 poll = select.poll()
@@ -177,61 +360,32 @@ while running:
         # Führe aktuellen Effekt aus
         if current_mode == "RAINBOW":
             # Prüfe auf neue Befehle während Rainbow
-            events = poll.poll(0)
-            if events:
-                line = sys.stdin.readline()
-                if line:
-                    handle_command(line.strip())
-            else:
-                rainbow_cycle(10)
+            if not check_input():
+                rainbow_cycle(rainbow_wait)
                 
         elif current_mode == "PULSE":
             # Prüfe auf neue Befehle vor jedem Puls
-            events = poll.poll(0)
-            if events:
-                line = sys.stdin.readline()
-                if line:
-                    handle_command(line.strip())
-            else:
+            if not check_input():
                 pulse_effect(current_color)
                 
         elif current_mode == "BLINK":
             # Prüfe auf neue Befehle vor jedem Blink
-            events = poll.poll(0)
-            if events:
-                line = sys.stdin.readline()
-                if line:
-                    handle_command(line.strip())
-            else:
+            if not check_input():
                 blink_effect(current_color, 300)
                 
         elif current_mode == "BUSY":
             # BUSY = Gelb blinkend
-            events = poll.poll(0)
-            if events:
-                line = sys.stdin.readline()
-                if line:
-                    handle_command(line.strip())
-            else:
+            if not check_input():
                 blink_effect(current_color, 300)
                 
         elif current_mode == "ERROR":
             # ERROR = Rot blinkend
-            events = poll.poll(0)
-            if events:
-                line = sys.stdin.readline()
-                if line:
-                    handle_command(line.strip())
-            else:
+            if not check_input():
                 blink_effect(current_color, 300)
                 
         else:
             # OFF oder COLOR: Warte auf Befehle
-            events = poll.poll(100)
-            if events:
-                line = sys.stdin.readline()
-                if line:
-                    handle_command(line.strip())
+            check_input(100)
                     
     except KeyboardInterrupt:
         np.fill((0, 0, 0))
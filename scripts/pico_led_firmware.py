@@ -1,5 +1,9 @@
 # Raspberry Pico 2 LED Controller Firmware
 # This script should be uploaded to the Raspberry Pico 2 using Thonny or similar
+#
+# Speaks JSON lines and the binary frame protocol of scripts/led_protocol.py
+# (0x00 COBS(opcode seq body crc16) 0x00). Both can share the link: text lines
+# never contain 0x00. The opcodes and constants below must match led_protocol.py.
 
 import machine
 import neopixel
@@ -31,6 +35,36 @@ current_config = {
 }
 animation_running = False
 
+# Binary frame protocol (see scripts/led_protocol.py)
+PROTOCOL_VERSION = 1
+FIRMWARE_ID = 1  # FIRMWARE_JSON
+OP_HELLO = 0x01
+OP_STATUS = 0x02
+OP_OFF = 0x10
+OP_BRIGHT = 0x18
+OP_SET_IDLE = 0x20
+OP_SET_MAKING = 0x21
+OP_SET_FINISHED = 0x22
+OP_ERROR = 0xFF
+STATUS_OK = 0
+STATUS_UNKNOWN_OPCODE = 1
+STATUS_BAD_LENGTH = 2
+STATUS_CRC = 3
+STATUS_FAILED = 4
+MAX_FRAME = 64
+SUPPORTED_OPCODES = bytes([OP_HELLO, OP_STATUS, OP_OFF, OP_BRIGHT, OP_SET_IDLE, OP_SET_MAKING, OP_SET_FINISHED])
+MODES = ("off", "idle", "making", "finished")  # prefix of led_protocol.MODES
+PATTERNS = ("solid", "fade", "pulse", "rainbow", "chase")
+FRAME_COMMANDS = {
+    OP_OFF: "turn_off",
+    OP_BRIGHT: "set_brightness",
+    OP_SET_IDLE: "set_idle",
+    OP_SET_MAKING: "set_making",
+    OP_SET_FINISHED: "set_finished",
+}
+rx_frame = None  # bytearray while inside a frame
+rx_line = bytearray()
+
 def hex_to_rgb(hex_color):
     """Convert hex color to RGB tuple"""
     hex_color = hex_color.lstrip('#')
@@ -198,6 +232,10 @@ def handle_command(command_data):
             current_config.update(data)
             response["message"] = "LED set to finished mode"
             
+        elif command == "set_brightness":
+            current_config["brightness"] = data.get("brightness", current_config["brightness"])
+            response["message"] = "LED brightness set"
+            
         elif command == "turn_off":
             current_mode = "off"
             stop_animation()
@@ -227,6 +265,149 @@ def send_response(response):
     except Exception as e:
         print(f"Response send error: {e}")
 
+def crc16(data):
+    """CRC-16/CCITT-FALSE"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+    return crc
+
+def cobs_encode(data):
+    out = bytearray(1)
+    code_index = 0
+    code = 1
+    for byte in data:
+        if byte:
+            out.append(byte)
+            code += 1
+        if not byte or code == 0xFF:
+            out[code_index] = code
+            code_index = len(out)
+            code = 1
+            out.append(0)
+    out[code_index] = code
+    return out
+
+def cobs_decode(data):
+    out = bytearray()
+    index = 0
+    while index < len(data):
+        code = data[index]
+        if code == 0 or index + code > len(data):
+            return None
+        out.extend(data[index + 1:index + code])
+        index += code
+        if code < 0xFF and index < len(data):
+            out.append(0)
+    return out
+
+def send_frame(opcode, seq, body):
+    raw = bytearray((opcode, seq))
+    raw.extend(body)
+    crc = crc16(raw)
+    raw.append(crc >> 8)
+    raw.append(crc & 0xFF)
+    uart.write(b"\x00" + cobs_encode(raw) + b"\x00")
+
+def decode_frame_config(body):
+    """Mask + fields of OP_SET_* -> config dict as sent in the JSON commands; None if the body is too short"""
+    if not body:
+        return None
+    mask = body[0]
+    index = 1
+    config = {}
+    try:
+        if mask & 0x01:
+            config["color"] = "#%02x%02x%02x" % (body[index], body[index + 1], body[index + 2])
+            index += 3
+        if mask & 0x02:
+            config["brightness"] = round(body[index] * 100 / 255)
+            index += 1
+        if mask & 0x04:
+            if body[index] < len(PATTERNS):
+                config["pattern"] = PATTERNS[body[index]]
+            index += 1
+        if mask & 0x08:
+            config["blinking"] = bool(body[index])
+            index += 1
+        if mask & 0x10:
+            config["blinkSpeed"] = body[index] << 8 | body[index + 1]
+    except IndexError:
+        return None
+    return config
+
+def execute_frame(opcode, body):
+    """Run one binary command; returns (status, reply data)"""
+    if opcode == OP_HELLO:
+        return STATUS_OK, bytes((PROTOCOL_VERSION, FIRMWARE_ID, NUM_LEDS >> 8, NUM_LEDS & 0xFF)) + SUPPORTED_OPCODES
+    if opcode == OP_STATUS:
+        r, g, b = hex_to_rgb(current_config["color"])
+        brightness = min(255, round(current_config["brightness"] * 255 / 100))
+        return STATUS_OK, bytes((MODES.index(current_mode), r, g, b, brightness, NUM_LEDS >> 8, NUM_LEDS & 0xFF))
+    if opcode not in FRAME_COMMANDS:
+        return STATUS_UNKNOWN_OPCODE, b""
+    if opcode == OP_BRIGHT:
+        if len(body) != 1:
+            return STATUS_BAD_LENGTH, b""
+        data = {"brightness": round(body[0] * 100 / 255)}
+    elif opcode == OP_OFF:
+        data = {}
+    else:
+        data = decode_frame_config(body)
+        if data is None:
+            return STATUS_BAD_LENGTH, b""
+    # Same path as the JSON lines, so both protocols leave the LEDs in the same state
+    response = handle_command({"command": FRAME_COMMANDS[opcode], "data": data})
+    return (STATUS_OK if response.get("success") else STATUS_FAILED), b""
+
+def handle_frame(encoded):
+    """Decode, check and answer one binary frame (without the 0x00 delimiters)"""
+    raw = cobs_decode(encoded)
+    if raw is None or len(raw) < 4:
+        return
+    seq = raw[1]
+    if crc16(raw[:-2]) != (raw[-2] << 8 | raw[-1]):
+        send_frame(OP_ERROR, seq, bytes((STATUS_CRC,)))
+        return
+    status, data = execute_frame(raw[0], raw[2:-2])
+    send_frame(raw[0] | 0x80, seq, bytes((status,)) + data)
+
+def handle_json_line(line):
+    """Legacy JSON line protocol"""
+    try:
+        command_data = json.loads(line.decode().strip())
+        response = handle_command(command_data)
+        # Echo the request id so the Pi can match the response to its caller
+        if "id" in command_data:
+            response["id"] = command_data["id"]
+        send_response(response)
+    except ValueError as e:
+        send_response({"success": False, "error": f"JSON decode error: {str(e)}"})
+
+def read_input(data):
+    """Split received bytes into binary frames and JSON lines and handle both"""
+    global rx_frame, rx_line
+    for byte in data:
+        if byte == 0:
+            if rx_frame:
+                handle_frame(rx_frame)
+                rx_frame = None
+            else:
+                rx_frame = bytearray()  # start delimiter
+        elif rx_frame is not None:
+            rx_frame.append(byte)
+            if len(rx_frame) > MAX_FRAME:
+                rx_frame = None
+        elif byte == 0x0A:
+            line = bytes(rx_line)
+            rx_line = bytearray()
+            if line.strip():
+                handle_json_line(line)
+        else:
+            rx_line.append(byte)
+
 def main():
     """Main program loop"""
     print("Raspberry Pico 2 LED Controller started")
@@ -258,21 +439,7 @@ def main():
         try:
             # Check for incoming commands
             if uart.any():
-                line = uart.readline()
-                if line:
-                    try:
-                        command_data = json.loads(line.decode().strip())
-                        response = handle_command(command_data)
-                        send_response(response)
-                        
-                        # Restart animation with new config if needed
-                        if current_mode != "off":
-                            # Animation continues in background
-                            pass
-                            
-                    except json.JSONDecodeError as e:
-                        error_response = {"success": False, "error": f"JSON decode error: {str(e)}"}
-                        send_response(error_response)
+                read_input(uart.read())
             
             # Run one animation step
             if animation_running and current_mode != "off":
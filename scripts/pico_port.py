@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+pico_port.py — findet den seriellen Port des Pico ohne lange Suche
+
+Reihenfolge:
+  1. der zuletzt funktionierende Port aus dem Cache (PICO_PORT_CACHE,
+     liegt in /tmp und ist damit nach einem Neustart weg)
+  2. stabile /dev/serial/by-id-Pfade der Geräte mit der USB-ID des Pico
+     (Raspberry Pi VID 2e8a; PID optional per PICO_USB_ID=2e8a:0005)
+  3. erst zuletzt alle übrigen Kandidaten – gleichzeitig statt nacheinander
+
+Der Fund wird als by-id-Pfad gespeichert, der auch nach einer neuen
+Enumeration (ttyACM0 -> ttyACM1) stimmt. Die langsame Suche fällt damit
+einmal pro Boot an, nicht bei jedem Befehl.
+
+  python3 pico_port.py            # gefundenen Port ausgeben
+"""
+
+import glob
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+try:
+    from serial.tools import list_ports
+except ImportError:
+    list_ports = None
+
+PORT_CACHE_PATH = os.environ.get("PICO_PORT_CACHE", "/tmp/cocktailbot-pico-port")
+BY_ID_DIR = "/dev/serial/by-id"
+PICO_VID = 0x2E8A  # Raspberry Pi
+
+def _usb_id():
+    vid, _, pid = os.environ.get("PICO_USB_ID", "").partition(":")
+    return (int(vid, 16) if vid else PICO_VID), (int(pid, 16) if pid else None)
+
+def read_cache(cache_path: str = PORT_CACHE_PATH) -> Optional[str]:
+    try:
+        with open(cache_path, "r") as cache_file:
+            return cache_file.read().strip() or None
+    except OSError:
+        return None
+
+def write_cache(port: str, cache_path: str = PORT_CACHE_PATH) -> None:
+    # nur ein Beschleuniger – darf nie die Verbindung verhindern
+    try:
+        with open(cache_path, "w") as cache_file:
+            cache_file.write(port + "\n")
+    except OSError:
+        pass
+
+def forget_cache(cache_path: str = PORT_CACHE_PATH) -> None:
+    try:
+        os.remove(cache_path)
+    except OSError:
+        pass
+
+def stable_path(device: str) -> str:
+    """by-id-Symlink zu /dev/ttyACMx, sonst das Gerät selbst"""
+    target = os.path.realpath(device)
+    for link in sorted(glob.glob(os.path.join(BY_ID_DIR, "*"))):
+        if os.path.realpath(link) == target:
+            return link
+    return device
+
+def pico_ports() -> List[str]:
+    """Angeschlossene Pico laut USB VID:PID (aus sysfs, ohne Port zu öffnen)"""
+    if list_ports is None:
+        return []
+    vid, pid = _usb_id()
+    return [
+        stable_path(port.device)
+        for port in sorted(list_ports.comports(), key=lambda port: port.device)
+        if port.vid == vid and (pid is None or port.pid == pid)
+    ]
+
+def _safe(probe: Callable[[str], bool], port: str) -> bool:
+    try:
+        return bool(probe(port))
+    except Exception:
+        return False
+
+def find_port(candidates: Iterable[str], probe: Callable[[str], bool],
+              cache_path: str = PORT_CACHE_PATH) -> Optional[str]:
+    """Erster Port, für den ``probe(port)`` True liefert; der Fund landet im Cache"""
+    tried = set()
+
+    cached = read_cache(cache_path)
+    if cached and os.path.exists(cached):
+        tried.add(os.path.realpath(cached))
+        if _safe(probe, cached):
+            return cached
+    if cached:
+        forget_cache(cache_path)
+
+    for port in pico_ports():
+        if os.path.realpath(port) in tried:
+            continue
+        tried.add(os.path.realpath(port))
+        if _safe(probe, port):
+            write_cache(stable_path(port), cache_path)
+            return port
+
+    rest = []
+    for port in candidates:
+        if os.path.exists(port) and os.path.realpath(port) not in tried:
+            tried.add(os.path.realpath(port))
+            rest.append(port)
+    if not rest:
+        return None
+    # alle gleichzeitig prüfen; bei mehreren Treffern gewinnt die Reihenfolge der Kandidaten
+    pool = ThreadPoolExecutor(max_workers=len(rest))
+    try:
+        futures = [(port, pool.submit(_safe, probe, port)) for port in rest]
+        for port, future in futures:
+            if future.result():
+                write_cache(stable_path(port), cache_path)
+                return port
+        return None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == "__main__":
+    port = find_port([], lambda port: True)
+    if not port:
+        print("Kein Pico gefunden", file=sys.stderr)
+        sys.exit(1)
+    print(port)
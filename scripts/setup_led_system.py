@@ -84,7 +84,7 @@ Wants=network.target
 Type=simple
 User=pi
 WorkingDirectory=/home/pi/cocktail-app
-ExecStart=/usr/bin/python3 /home/pi/cocktail-app/scripts/led_controller.py
+ExecStart=/usr/bin/python3 /home/pi/cocktail-app/scripts/led_controller.py serve
 Restart=always
 RestartSec=5
 Environment=PYTHONPATH=/home/pi/cocktail-app
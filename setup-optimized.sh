@@ -82,7 +82,7 @@ print_success "System erfolgreich aktualisiert."
 
 # 2. Erforderliche Pakete installieren (ohne nodejs und npm)
 print_status "Installiere erforderliche Pakete..."
-apt install -y git python3-pip chromium-browser unclutter xdotool
+apt install -y git python3-pip python3-numpy chromium-browser unclutter xdotool
 if [ $? -ne 0 ]; then
     print_warning "Es gab Probleme bei der Installation einiger Pakete. Versuche fortzufahren..."
 fi
@@ -156,70 +156,11 @@ if [ $? -ne 0 ]; then
 fi
 print_success "Python-Abhängigkeiten installiert."
 
-# 6. Python-Steuerungsskript erstellen
-print_status "Erstelle Python-Steuerungsskript..."
-cat > /home/$CURRENT_USER/cocktailbot/pump_control.py << 'EOF'
-#!/usr/bin/env python3
-import RPi.GPIO as GPIO
-import sys
-import time
-
-# Setze den GPIO-Modus
-GPIO.setmode(GPIO.BCM)
-GPIO.setwarnings(False)
-
-def setup_pin(pin):
-    # Konfiguriere den Pin als Ausgang und setze ihn auf HIGH (Relais aus)
-    GPIO.setup(pin, GPIO.OUT)
-    GPIO.output(pin, GPIO.HIGH)
-
-def activate_pump(pin, duration_ms):
-    try:
-        # Setze den Pin auf LOW (Relais an)
-        GPIO.output(pin, GPIO.LOW)
-        print(f"Pumpe an Pin {pin} aktiviert für {duration_ms}ms")
-        
-        # Warte für die angegebene Dauer
-        time.sleep(duration_ms / 1000)
-        
-        # Setze den Pin zurück auf HIGH (Relais aus)
-        GPIO.output(pin, GPIO.HIGH)
-        print(f"Pumpe an Pin {pin} deaktiviert")
-        
-    except Exception as e:
-        print(f"Fehler: {e}")
-        # Stelle sicher, dass der Pin auf HIGH gesetzt wird, auch wenn ein Fehler auftritt
-        GPIO.output(pin, GPIO.HIGH)
-        GPIO.cleanup()
-        sys.exit(1)
-
-def main():
-    if len(sys.argv) != 4:
-        print("Verwendung: python3 pump_control.py <command> <pin> <duration_ms>")
-        sys.exit(1)
-    
-    command = sys.argv[1]
-    pin = int(sys.argv[2])
-    duration_ms = int(sys.argv[3])
-    
-    setup_pin(pin)
-    
-    if command == "activate":
-        activate_pump(pin, duration_ms)
-    else:
-        print(f"Unbekannter Befehl: {command}")
-        sys.exit(1)
-    
-    # Bereinige die GPIO-Pins
-    GPIO.cleanup()
-
-if __name__ == "__main__":
-    main()
-EOF
-
+# 6. Python-Steuerungsskript vorbereiten (pump_control.py kommt aus dem Repository)
+print_status "Bereite Python-Steuerungsskript vor..."
 chmod +x /home/$CURRENT_USER/cocktailbot/pump_control.py
 chown $CURRENT_USER:$CURRENT_USER /home/$CURRENT_USER/cocktailbot/pump_control.py
-print_success "Python-Steuerungsskript erfolgreich erstellt."
+print_success "Python-Steuerungsskript vorbereitet."
 
 print_warning "ÜBERSPRUNGEN: cocktail-machine.ts wird NICHT überschrieben (bleibt aktuell)"
 print_warning "ÜBERSPRUNGEN: custom-cocktails.json wird NICHT überschrieben (bleibt aktuell)"
@@ -256,8 +197,31 @@ SyslogIdentifier=cocktailbot
 WantedBy=multi-user.target
 EOF
 
+# Residenter Pump-Server: hält die GPIO-Pins offen, damit nicht jede Dosierung einen Python-Prozess startet
+cat > /etc/systemd/system/cocktailbot-pump.service << EOF
+[Unit]
+Description=CocktailBot Pump Server
+Before=cocktailbot.service
+
+[Service]
+Type=simple
+User=$CURRENT_USER
+WorkingDirectory=/home/$CURRENT_USER/cocktailbot
+ExecStart=/usr/bin/python3 /home/$CURRENT_USER/cocktailbot/pump_control.py serve
+Restart=on-failure
+RestartSec=2
+StandardOutput=syslog
+StandardError=syslog
+SyslogIdentifier=cocktailbot-pump
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
 print_status "Aktiviere und starte den Service..."
 systemctl daemon-reload
+systemctl enable cocktailbot-pump.service
+systemctl start cocktailbot-pump.service
 systemctl enable cocktailbot.service
 systemctl start cocktailbot.service
 if [ $? -ne 0 ]; then
@@ -11,6 +11,7 @@ export interface Cocktail {
     manual?: boolean // Legacy format from old recipes (equivalent to type: "manual")
     instruction?: string // Optional instruction for manual ingredients
     delayed?: boolean // Optional flag for delayed ingredient addition
+    pulse?: { onMs: number; offMs: number } // Optional on/off pulse train, e.g. for slow layering of grenadine
   }[]
   ingredients: string[] // Derived list for display purposes
   sizes?: number[] // Array of available sizes in ml for this specific cocktail